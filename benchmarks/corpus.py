@@ -0,0 +1,139 @@
+"""
+Generates synthetic NeXus corpora for the benchmarks. Files are laid out as they are on the archive,
+<root>/NDX<INSTRUMENT>/Instrument/data/<cycle>/<file>, and contain the datasets read by ingest and the instrument
+extracts
+"""
+
+from __future__ import annotations
+
+import typing
+
+import h5py  # type: ignore
+import numpy as np
+
+from rundetection.ingestion.filenames import get_scheme
+
+if typing.TYPE_CHECKING:
+    from collections.abc import Callable
+    from pathlib import Path
+    from typing import Any
+
+DEFAULT_CYCLE = "cycle_24_1"
+DEFAULT_TOF_CHANNELS = 2001
+
+
+def nexus_filename(instrument: str, run_number: int) -> str:
+    """
+    Given an instrument and run number, return the archive filename for the run
+    :param instrument: The instrument name
+    :param run_number: The run number
+    :return: The filename
+    """
+    return get_scheme(instrument).filename(run_number)
+
+
+def _write_string(group: Any, name: str, value: str) -> None:
+    group.create_dataset(name, data=np.array([value.encode("utf-8")]))
+
+
+def _write_common(entry: Any, instrument: str, run_number: int, title: str) -> None:
+    entry.create_dataset("run_number", data=np.array([run_number], dtype=np.int32))
+    _write_string(entry, "beamline", instrument.upper())
+    _write_string(entry, "title", title)
+    _write_string(entry, "start_time", "2024-05-01T09:00:00")
+    _write_string(entry, "end_time", "2024-05-01T10:00:00")
+    entry.create_dataset("raw_frames", data=np.array([374740], dtype=np.int32))
+    entry.create_dataset("good_frames", data=np.array([299728], dtype=np.int32))
+    _write_string(entry, "experiment_identifier", "2410000")
+    _write_string(entry.create_group("user_1"), "name", "Benchmark User")
+
+
+def _write_mari(entry: Any, _: int) -> None:
+    entry.create_dataset("ei", data=np.array([15.0], dtype=np.float32))
+    entry.create_dataset("sam_mass", data=np.array([10.0], dtype=np.float32))
+    entry.create_dataset("sam_rmm", data=np.array([50.0], dtype=np.float32))
+    entry.create_dataset("remove_bkg", data=np.array([1], dtype=np.int32))
+
+
+def _write_osiris(entry: Any, tof_channels: int) -> None:
+    # 50Hz spectroscopy phases with the time channels of analyser 2, so every rule passes
+    selog = entry.create_group("selog")
+    for name in ("freq6", "freq10"):
+        selog.create_group(name).create_group("value_log").create_dataset(
+            "value", data=np.full(258, 50.0, dtype=np.float32)
+        )
+    selog.create_group("phase6").create_dataset("value", data=np.array([8573.0], dtype=np.float32))
+    selog.create_group("phase10").create_dataset("value", data=np.array([14250.0], dtype=np.float32))
+    dae = entry.create_group("instrument").create_group("dae")
+    for name, (start, stop) in (("time_channels_1", (51500.0, 71500.0)), ("time_channels_2", (45900.0, 65900.0))):
+        dae.create_group(name).create_dataset(
+            "time_of_flight", data=np.linspace(start, stop, tof_channels, dtype=np.float32)
+        )
+
+
+_EXTRA_WRITERS: dict[str, Callable[[Any, int], None]] = {"MARI": _write_mari, "OSIRIS": _write_osiris}
+
+
+def write_nexus_file(
+    path: Path, instrument: str, run_number: int, title: str, tof_channels: int = DEFAULT_TOF_CHANNELS
+) -> None:
+    """
+    Write a synthetic NeXus file for the instrument
+    :param path: The path to write to
+    :param instrument: The instrument name
+    :param run_number: The run number
+    :param title: The run title
+    :param tof_channels: The number of time of flight channels, for instruments that read them
+    :return: None
+    """
+    with h5py.File(path, "w") as file:
+        entry = file.create_group("raw_data_1")
+        _write_common(entry, instrument, run_number, title)
+        writer = _EXTRA_WRITERS.get(instrument.upper())
+        if writer is not None:
+            writer(entry, tof_channels)
+
+
+def cycle_directory(root: Path, instrument: str, cycle: str = DEFAULT_CYCLE) -> Path:
+    """
+    Return the archive directory for the instrument and cycle under root, creating it if needed
+    :param root: The archive root
+    :param instrument: The instrument name
+    :param cycle: The cycle string
+    :return: The cycle directory
+    """
+    directory = root / f"NDX{instrument.upper()}" / "Instrument" / "data" / cycle
+    directory.mkdir(parents=True, exist_ok=True)
+    return directory
+
+
+def generate_corpus(
+    root: Path,
+    instrument: str,
+    runs: int,
+    series_length: int = 1,
+    first_run: int = 100000,
+    tof_channels: int = DEFAULT_TOF_CHANNELS,
+    cycle: str = DEFAULT_CYCLE,
+) -> list[Path]:
+    """
+    Generate consecutive runs for the instrument. Runs are grouped into series of series_length sharing a title, so
+    the stitch rules have previous runs to find
+    :param root: The archive root
+    :param instrument: The instrument name
+    :param runs: The number of runs to generate
+    :param series_length: The number of consecutive runs sharing a title
+    :param first_run: The first run number
+    :param tof_channels: The number of time of flight channels
+    :param cycle: The cycle string
+    :return: The generated paths, in run order
+    """
+    directory = cycle_directory(root, instrument, cycle)
+    paths = []
+    for index in range(runs):
+        run_number = first_run + index
+        path = directory / nexus_filename(instrument, run_number)
+        title = f"Benchmark sample series {index // series_length}"
+        write_nexus_file(path, instrument, run_number, title, tof_channels)
+        paths.append(path)
+    return paths
@@ -0,0 +1,184 @@
+"""
+Stitch lookback benchmark. For each stitching instrument and series length, builds a series of runs sharing a title
+and times a single verify of the instrument's stitch rule on the newest run, counting the HDF5 file opens and path
+probes it makes. Each verify is timed cold, walking the archive, and incrementally, after the previous run has been
+stitched. Runs on the local filesystem, and optionally again through a shim that adds latency to every open and probe
+to mimic the NFS mounted archive.
+
+Run from the repository root:
+
+    python -m benchmarks.stitch --lengths 1 10 100 1000 --latency-ms 2 --output stitch.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import sys
+import tempfile
+import time
+import typing
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+from unittest.mock import patch
+
+from benchmarks.corpus import DEFAULT_TOF_CHANNELS, generate_corpus
+from rundetection.ingestion import ingest as ingest_module
+from rundetection.ingestion.ingest import ingest
+from rundetection.ingestion.stat_cache import _stat_cache
+from rundetection.rules import mari_rules, osiris_rules, tosca_rules
+from rundetection.rules.mari_rules import MariStitchRule
+from rundetection.rules.osiris_rules import OsirisStitchRule
+from rundetection.rules.tosca_rules import ToscaStitchRule
+
+if typing.TYPE_CHECKING:
+    from collections.abc import Iterator
+
+    from rundetection.ingestion.run_series import RunSeriesTracker
+    from rundetection.rules.rule import Rule
+
+STITCH_RULES: dict[str, type[Rule[bool]]] = {
+    "mari": MariStitchRule,
+    "tosca": ToscaStitchRule,
+    "osiris": OsirisStitchRule,
+}
+
+RUN_SERIES: dict[str, RunSeriesTracker] = {
+    "mari": mari_rules._run_series,
+    "tosca": tosca_rules._run_series,
+    "osiris": osiris_rules._run_series,
+}
+
+
+@dataclass
+class FilesystemCounters:
+    """
+    Counts of the filesystem operations made while instrumented
+    """
+
+    opens: int = 0
+    probes: int = 0
+
+
+@contextmanager
+def instrumented_filesystem(latency: float) -> Iterator[FilesystemCounters]:
+    """
+    Count every HDF5 open made by ingest and every path stat, which existence checks are made with, sleeping for
+    latency seconds before each
+    :param latency: The latency to inject, in seconds
+    :return: The counters, updated while the context is open
+    """
+    counters = FilesystemCounters()
+    original_file = ingest_module.File
+    original_stat = Path.stat
+
+    def file(*args: Any, **kwargs: Any) -> Any:
+        counters.opens += 1
+        time.sleep(latency)
+        return original_file(*args, **kwargs)
+
+    def stat(path: Path, *args: Any, **kwargs: Any) -> Any:
+        counters.probes += 1
+        time.sleep(latency)
+        return original_stat(path, *args, **kwargs)
+
+    with patch.object(ingest_module, "File", file), patch.object(Path, "stat", stat):
+        yield counters
+
+
+def bench_series(
+    archive: Path, instrument: str, length: int, latency: float, tof_channels: int, incremental: bool
+) -> dict[str, Any]:
+    """
+    Generate a series and time verifying the stitch rule on its newest run
+    :param archive: The archive root to generate under
+    :param instrument: The instrument name
+    :param length: The series length
+    :param latency: The latency to inject, in seconds
+    :param tof_channels: The number of time of flight channels
+    :param incremental: Whether to stitch the previous run first, untimed, rather than starting cold
+    :return: The results
+    """
+    paths = generate_corpus(
+        archive / f"{instrument}-{length}", instrument, length, series_length=length, tof_channels=tof_channels
+    )
+    rule = STITCH_RULES[instrument](True)
+    RUN_SERIES[instrument].clear()
+    _stat_cache.clear()
+    if incremental and length > 1:
+        rule.verify(ingest(paths[-2]))
+    job_request = ingest(paths[-1])
+    hits, lookups = _stat_cache.hits + _stat_cache.negative_hits, _stat_cache.misses
+    with instrumented_filesystem(latency) as counters:
+        started = time.perf_counter()
+        rule.verify(job_request)
+        elapsed = time.perf_counter() - started
+    hits = _stat_cache.hits + _stat_cache.negative_hits - hits
+    lookups = hits + _stat_cache.misses - lookups
+    return {
+        "instrument": instrument,
+        "length": length,
+        "latency_ms": latency * 1000,
+        "incremental": incremental,
+        "seconds": elapsed,
+        "opens": counters.opens,
+        "probes": counters.probes,
+        "stat_cache_hit_rate": hits / lookups if lookups else 0.0,
+        "additional_requests": len(job_request.additional_requests),
+    }
+
+
+def chart(results: list[dict[str, Any]], width: int = 50) -> str:
+    """
+    Render the results as a text bar chart of verify time
+    :param results: The benchmark results
+    :param width: The width of the longest bar
+    :return: The chart
+    """
+    longest = max(result["seconds"] for result in results) or 1.0
+    lines = [f"{'instrument':<10} {'runs':>6} {'latency':>8} {'mode':>11} {'seconds':>10} {'opens':>6} {'probes':>6}"]
+    for result in results:
+        bar = "#" * max(1, round(result["seconds"] / longest * width))
+        mode = "incremental" if result["incremental"] else "cold"
+        lines.append(
+            f"{result['instrument']:<10} {result['length']:>6} {result['latency_ms']:>6.1f}ms {mode:>11} "
+            f"{result['seconds']:>10.4f} {result['opens']:>6} {result['probes']:>6} {bar}"
+        )
+    return "\n".join(lines)
+
+
+def main(argv: list[str] | None = None) -> None:
+    """
+    Entry point for the stitch benchmark
+    :param argv: The command line arguments, defaults to sys.argv
+    :return: None
+    """
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--instruments", nargs="+", default=list(STITCH_RULES), choices=list(STITCH_RULES))
+    parser.add_argument("--lengths", nargs="+", type=int, default=[1, 10, 100, 1000])
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Also run with this much latency injected")
+    parser.add_argument("--tof-channels", type=int, default=DEFAULT_TOF_CHANNELS)
+    parser.add_argument("--output", type=Path, help="Write the JSON results to this file")
+    args = parser.parse_args(argv)
+    logging.getLogger().setLevel(logging.WARNING)
+
+    latencies = [0.0] if args.latency_ms == 0 else [0.0, args.latency_ms / 1000]
+    with tempfile.TemporaryDirectory() as archive:
+        results = [
+            bench_series(Path(archive), instrument, length, latency, args.tof_channels, incremental)
+            for instrument in args.instruments
+            for length in args.lengths
+            for latency in latencies
+            for incremental in (False, True)
+        ]
+
+    sys.stdout.write(chart(results) + "\n")
+    if args.output is not None:
+        args.output.write_text(json.dumps({"benchmark": "stitch", "results": results}, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
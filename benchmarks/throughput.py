@@ -0,0 +1,155 @@
+"""
+End to end throughput benchmark. Generates a synthetic corpus and pushes every file through process_message, or
+through the full blocking pipeline over the in memory transport, reporting files per second, per message latency and
+peak RSS as JSON.
+
+Run from the repository root, as benchmarks is not part of the installed package:
+
+    python -m benchmarks.throughput --instruments mari osiris tosca --runs 200 --output results.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import platform
+import resource
+import statistics
+import sys
+import tempfile
+import time
+from importlib import metadata
+from pathlib import Path
+from queue import SimpleQueue
+from typing import Any
+
+from benchmarks.corpus import DEFAULT_TOF_CHANNELS, generate_corpus
+from rundetection.run_detection import Consumer, process_message
+from rundetection.transports.memory_transport import InMemoryTransport
+
+
+def percentile(values: list[float], percent: float) -> float:
+    """
+    Return the nearest rank percentile of the values
+    :param values: The values
+    :param percent: The percentile, between 0 and 100
+    :return: The percentile value
+    """
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(percent / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def peak_rss_kib() -> int:
+    """
+    Return the peak resident set size of this process in KiB
+    :return: The peak RSS
+    """
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def bench_process_message(paths: list[Path]) -> dict[str, Any]:
+    """
+    Process every path in turn, timing each call to process_message
+    :param paths: The nexus files
+    :return: The results
+    """
+    latencies = []
+    notification_queue: SimpleQueue[Any] = SimpleQueue()
+    started = time.perf_counter()
+    for path in paths:
+        message_started = time.perf_counter()
+        process_message(str(path), notification_queue)
+        latencies.append(time.perf_counter() - message_started)
+    elapsed = time.perf_counter() - started
+    notifications = 0
+    while not notification_queue.empty():
+        notification_queue.get()
+        notifications += 1
+    return {
+        "files": len(paths),
+        "notifications": notifications,
+        "seconds": elapsed,
+        "files_per_second": len(paths) / elapsed,
+        "latency_ms": {
+            "mean": statistics.fmean(latencies) * 1000,
+            "p50": percentile(latencies, 50) * 1000,
+            "p99": percentile(latencies, 99) * 1000,
+            "max": max(latencies) * 1000,
+        },
+    }
+
+
+def bench_pipeline(paths: list[Path], batch_size: int) -> dict[str, Any]:
+    """
+    Run every path through the blocking Consumer over an in memory transport
+    :param paths: The nexus files
+    :param batch_size: The consumer batch size
+    :return: The results
+    """
+    transport = InMemoryTransport()
+    for path in paths:
+        transport.put("watched-files", str(path).encode())
+    consumer = Consumer(transport, batch_size=batch_size, heartbeat_interval=3600)
+    transport.on_idle(consumer.stop)
+    started = time.perf_counter()
+    consumer.run()
+    elapsed = time.perf_counter() - started
+    return {
+        "files": len(paths),
+        "notifications": len(transport.queues["scheduled-jobs"]),
+        "seconds": elapsed,
+        "files_per_second": len(paths) / elapsed,
+    }
+
+
+def main(argv: list[str] | None = None) -> None:
+    """
+    Entry point for the throughput benchmark
+    :param argv: The command line arguments, defaults to sys.argv
+    :return: None
+    """
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--instruments", nargs="+", default=["mari", "osiris", "tosca"])
+    parser.add_argument("--runs", type=int, default=100, help="Runs generated per instrument")
+    parser.add_argument("--series-length", type=int, default=5, help="Consecutive runs sharing a title")
+    parser.add_argument("--tof-channels", type=int, default=DEFAULT_TOF_CHANNELS)
+    parser.add_argument("--pipeline", action="store_true", help="Run through the consumer and in memory transport")
+    parser.add_argument("--batch-size", type=int, default=1, help="Consumer batch size when using --pipeline")
+    parser.add_argument("--output", type=Path, help="Write the JSON results to this file rather than stdout")
+    args = parser.parse_args(argv)
+    logging.getLogger().setLevel(logging.WARNING)
+
+    results: dict[str, Any] = {
+        "benchmark": "pipeline" if args.pipeline else "process_message",
+        "version": metadata.version("run-detection"),
+        "python": platform.python_version(),
+        "parameters": {
+            "runs": args.runs,
+            "series_length": args.series_length,
+            "tof_channels": args.tof_channels,
+            "batch_size": args.batch_size,
+        },
+        "instruments": {},
+    }
+    with tempfile.TemporaryDirectory() as archive:
+        for instrument in args.instruments:
+            paths = generate_corpus(
+                Path(archive), instrument, args.runs, args.series_length, tof_channels=args.tof_channels
+            )
+            if args.pipeline:
+                results["instruments"][instrument] = bench_pipeline(paths, args.batch_size)
+            else:
+                results["instruments"][instrument] = bench_process_message(paths)
+    results["peak_rss_kib"] = peak_rss_kib()
+
+    output = json.dumps(results, indent=2)
+    if args.output is None:
+        sys.stdout.write(output + "\n")
+    else:
+        args.output.write_text(output, encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+"""
+Asyncio engine for run detection. Consuming, ingesting and publishing run as concurrent tasks on one event loop, with
+the blocking ingestion offloaded to a pool of worker processes, so a slow file does not hold up the messages behind it.
+Processes rather than threads are used as h5py serialises every call in a process behind its global lock
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import time
+import typing
+from concurrent.futures.process import BrokenProcessPool
+
+from pika.adapters.asyncio_connection import AsyncioConnection  # type: ignore
+from pika.exceptions import AMQPConnectionError  # type: ignore
+from pika.spec import Basic  # type: ignore
+
+from rundetection.exceptions import NotificationError, ReductionMetadataError
+from rundetection.run_detection import (
+    EGRESS_QUEUE_NAME,
+    HEARTBEAT_INTERVAL_SECONDS,
+    INGRESS_PREFETCH_COUNT,
+    INGRESS_QUEUE_NAME,
+    NackBackoff,
+    create_ingest_executor,
+    detect,
+    write_readiness_probe_file,
+)
+from rundetection.specifications import load_specifications
+from rundetection.transports.pika_transport import get_connection_parameters
+
+if typing.TYPE_CHECKING:
+    from collections.abc import Callable
+    from concurrent.futures import Executor
+    from typing import Any
+
+    from pika.channel import Channel  # type: ignore
+    from pika.frame import Method  # type: ignore
+    from pika.spec import BasicProperties
+
+logger = logging.getLogger(__name__)
+
+ASYNC_INGEST_WORKERS = int(os.environ.get("ASYNC_INGEST_WORKERS", "4"))
+
+
+class AsyncRunDetection:
+    """
+    Consumes the ingress queue and publishes to the egress queue over a single asyncio connection. Each message is
+    handled by its own task, and is only acked once the broker has confirmed every notification it produced
+    """
+
+    def __init__(
+        self,
+        executor: Executor,
+        prefetch_count: int = INGRESS_PREFETCH_COUNT,
+        heartbeat_interval: float = HEARTBEAT_INTERVAL_SECONDS,
+    ) -> None:
+        self._executor = executor
+        self._prefetch_count = prefetch_count
+        self._heartbeat_interval = heartbeat_interval
+        self._publish_channel: Channel
+        self._closed: asyncio.Future[None]
+        self._publish_count = 0
+        self._confirms: dict[int, asyncio.Future[None]] = {}
+        self._tasks: set[asyncio.Task[None]] = set()
+        self._backoff = NackBackoff()
+
+    async def _wait(self, future: asyncio.Future[Any]) -> Any:
+        """
+        Wait for the future, failing if the connection closes first
+        :param future: The future to wait for
+        :return: The result of the future
+        """
+        await asyncio.wait({future, self._closed}, return_when=asyncio.FIRST_COMPLETED)
+        if not future.done():
+            future.cancel()
+            self._closed.result()  # raises the reason for closing
+            raise AMQPConnectionError("Connection closed")
+        return future.result()
+
+    async def _await_callback(self, operation: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """
+        Invoke a callback style pika operation and wait for its callback
+        :param operation: The pika operation
+        :return: The value passed to the callback
+        """
+        future = asyncio.get_running_loop().create_future()
+        operation(*args, callback=future.set_result, **kwargs)
+        return await self._wait(future)
+
+    async def _connect(self) -> AsyncioConnection:
+        loop = asyncio.get_running_loop()
+        opened: asyncio.Future[AsyncioConnection] = loop.create_future()
+
+        def on_open_error(_: AsyncioConnection, exc: BaseException | str) -> None:
+            opened.set_exception(exc if isinstance(exc, BaseException) else AMQPConnectionError(exc))
+
+        AsyncioConnection(
+            get_connection_parameters(),
+            on_open_callback=opened.set_result,
+            on_open_error_callback=on_open_error,
+            on_close_callback=self._on_closed,
+            custom_ioloop=loop,
+        )
+        return await opened
+
+    async def _open_channel(self, connection: AsyncioConnection, queue_name: str) -> Channel:
+        future = asyncio.get_running_loop().create_future()
+        connection.channel(on_open_callback=future.set_result)
+        channel: Channel = await self._wait(future)
+        channel.add_on_close_callback(self._on_closed)
+        await self._await_callback(channel.exchange_declare, queue_name, exchange_type="direct", durable=True)
+        await self._await_callback(
+            channel.queue_declare, queue_name, durable=True, arguments={"x-queue-type": "quorum"}
+        )
+        await self._await_callback(channel.queue_bind, queue_name, queue_name, routing_key="")
+        return channel
+
+    def _on_closed(self, _: Any, exc: BaseException) -> None:
+        """
+        Called when the connection or either channel closes. Fails any outstanding publishes and stops the engine
+        :param _: The closed connection or channel
+        :param exc: The reason for closing
+        :return: None
+        """
+        logger.warning("Asyncio engine connection closed: %s", exc)
+        for future in self._confirms.values():
+            if not future.done():
+                future.set_exception(NotificationError(f"Connection closed before publish was confirmed: {exc}"))
+        self._confirms.clear()
+        if not self._closed.done():
+            self._closed.set_exception(exc if isinstance(exc, BaseException) else AMQPConnectionError(exc))
+
+    def _on_confirm(self, frame: Method) -> None:
+        """
+        Resolve the publish futures covered by a publisher confirm
+        :param frame: The Basic.Ack or Basic.Nack frame
+        :return: None
+        """
+        method = frame.method
+        if method.multiple:
+            tags = [tag for tag in self._confirms if tag <= method.delivery_tag]
+        else:
+            tags = [method.delivery_tag]
+        for tag in tags:
+            future = self._confirms.pop(tag, None)
+            if future is None or future.done():
+                continue
+            if isinstance(method, Basic.Ack):
+                future.set_result(None)
+            else:
+                future.set_exception(NotificationError(f"Broker nacked published notification {tag}"))
+
+    def publish(self, body: bytes) -> asyncio.Future[None]:
+        """
+        Publish the body to the egress queue
+        :param body: The message body
+        :return: A future resolved when the broker confirms the publish
+        """
+        future: asyncio.Future[None] = asyncio.get_running_loop().create_future()
+        self._publish_count += 1
+        self._confirms[self._publish_count] = future
+        self._publish_channel.basic_publish(EGRESS_QUEUE_NAME, "", body)
+        return future
+
+    def _on_message(self, channel: Channel, method_frame: Basic.Deliver, _: BasicProperties, body: bytes) -> None:
+        task = asyncio.ensure_future(self.handle_message(channel, method_frame.delivery_tag, body))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def handle_message(self, channel: Channel, delivery_tag: int, body: bytes) -> None:
+        """
+        Process one message in the executor, publish its notifications and wait for their confirms, then ack it. A
+        message that fails again is only nacked after its backoff
+        :param channel: The channel the message was delivered on
+        :param delivery_tag: The delivery tag of the message
+        :param body: The message body
+        :return: None
+        """
+        loop = asyncio.get_running_loop()
+        try:
+            job_requests = await loop.run_in_executor(self._executor, detect, body.decode())
+            for job_request in job_requests:
+                logger.info("Sending notification for run: %s", job_request.run_number)
+            await asyncio.gather(*(self.publish(request.to_json_string().encode()) for request in job_requests))
+        except BrokenProcessPool as exc:
+            # An ingest worker died, so every later message would fail too. Stop the engine so it restarts with a new
+            # pool, leaving the message unacked to be redelivered
+            logger.exception("Ingest worker pool is broken, stopping the engine", exc_info=exc)
+            if not self._closed.done():
+                self._closed.set_exception(exc)
+            return
+        except ReductionMetadataError as exc:
+            logger.exception("Problem with metadata, cannot reduce, skipping message", exc_info=exc)
+        except Exception as exc:
+            logger.exception("Problem processing message: %s", body, exc_info=exc)
+            delay = self._backoff.failed(body)
+            if delay > 0:
+                logger.info("Nacking message %s in %s seconds", delivery_tag, delay)
+                await asyncio.sleep(delay)
+            if channel.is_open:
+                logger.info("Nacking message %s", delivery_tag)
+                channel.basic_nack(delivery_tag)
+            return
+        self._backoff.succeeded(body)
+        if channel.is_open:
+            logger.info("Acking message %s", delivery_tag)
+            channel.basic_ack(delivery_tag)
+
+    async def _heartbeat(self) -> None:
+        while True:
+            write_readiness_probe_file()
+            await asyncio.sleep(self._heartbeat_interval)
+
+    async def run(self) -> None:
+        """
+        Connect, then consume until the connection or one of its channels is closed
+        :return: None
+        """
+        self._closed = asyncio.get_running_loop().create_future()
+        logger.info("Connecting asyncio engine...")
+        connection = await self._connect()
+        heartbeat = asyncio.ensure_future(self._heartbeat())
+        try:
+            self._publish_channel = await self._open_channel(connection, EGRESS_QUEUE_NAME)
+            await self._await_callback(self._publish_channel.confirm_delivery, self._on_confirm)
+            consume_channel = await self._open_channel(connection, INGRESS_QUEUE_NAME)
+            await self._await_callback(consume_channel.basic_qos, prefetch_count=self._prefetch_count)
+            consume_channel.basic_consume(INGRESS_QUEUE_NAME, self._on_message)
+            logger.info("Asyncio engine consuming from %s", INGRESS_QUEUE_NAME)
+            await self._closed
+        finally:
+            heartbeat.cancel()
+            for task in list(self._tasks):
+                task.cancel()
+            if connection.is_open:
+                connection.close()
+
+
+def start_async_run_detection() -> None:
+    """
+    Run the asyncio engine, restarting it with a new ingest worker pool after 30 seconds if it stops
+    :return: None
+    """
+    logger.info("Starting Run Detection with the asyncio engine")
+    load_specifications()
+    while True:
+        try:
+            with create_ingest_executor(ASYNC_INGEST_WORKERS) as executor:
+                asyncio.run(AsyncRunDetection(executor).run())
+        except Exception:
+            logger.exception("Uncaught error occurred in asyncio engine. Restarting in 30 seconds...")
+        time.sleep(30)
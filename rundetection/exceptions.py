@@ -19,3 +19,15 @@ class RuleViolationError(Exception):
     """
     When a rule violation happens making reduction impossible
     """
+
+
+class NotificationError(Exception):
+    """
+    When the queue server does not confirm that a notification has been published
+    """
+
+
+class SpecificationError(Exception):
+    """
+    When one or more instrument specifications cannot be compiled
+    """
@@ -0,0 +1,217 @@
+"""
+Background index of the nexus files in the current cycle directory of each configured instrument, so the stitch rules
+and sibling lookups can be answered from memory rather than by probing the archive mount
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import re
+import threading
+import typing
+from pathlib import Path
+
+if typing.TYPE_CHECKING:
+    from collections.abc import Callable
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_INDEX_DIRS = [Path(directory) for directory in os.environ.get("ARCHIVE_INDEX_DIRS", "").split(",") if directory]
+ARCHIVE_INDEX_INTERVAL_SECONDS = float(os.environ.get("ARCHIVE_INDEX_INTERVAL_SECONDS", "10"))
+
+CYCLE_PATTERN = re.compile(r"cycle_(\d{2})_(\d+)")
+
+
+def _cycle_key(name: str) -> tuple[int, int]:
+    """
+    Return a sort key for a cycle directory name, e.g. cycle_24_1, placing cycles from the 1990s before the 2000s
+    :param name: The directory name
+    :return: The (year, cycle) sort key
+    """
+    match = CYCLE_PATTERN.fullmatch(name)
+    if match is None:
+        return -1, -1
+    year = int(match.group(1))
+    return year + (1900 if year >= 80 else 2000), int(match.group(2))  # noqa: PLR2004
+
+
+def current_cycle_directory(data_directory: Path) -> Path | None:
+    """
+    Return the latest cycle directory within the instrument's data directory
+    :param data_directory: The instrument data directory, e.g. /archive/NDXMARI/Instrument/data
+    :return: The current cycle directory, or None if there is none
+    """
+    with os.scandir(data_directory) as entries:
+        cycles = [entry.name for entry in entries if CYCLE_PATTERN.fullmatch(entry.name) and entry.is_dir()]
+    return data_directory / max(cycles, key=_cycle_key) if cycles else None
+
+
+class ArchiveIndex:
+    """
+    Polls the current cycle directory of each instrument data directory with os.scandir, recording the nexus files in
+    each and reading their titles in the background, newest first. inotify is not used as it does not report changes
+    made on other hosts of a network mount such as the archive. The index may lag the archive by up to the polling
+    interval, so a file missing from it must still be checked on the filesystem, and a directory whose mtime has
+    changed since it was scanned must be listed again
+    """
+
+    def __init__(
+        self,
+        data_directories: list[Path],
+        read_title: Callable[[Path], str],
+        interval: float = ARCHIVE_INDEX_INTERVAL_SECONDS,
+    ) -> None:
+        self._data_directories = data_directories
+        self._read_title = read_title
+        self._interval = interval
+        self._lock = threading.Lock()
+        self._directories: dict[Path, dict[Path, str | None]] = {}
+        # The mtime of each directory when it was scanned
+        self._mtimes: dict[Path, int] = {}
+        self._stopped = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def scan(self) -> None:
+        """
+        Update the indexed files to match the current cycle directories, keeping the titles already read
+        :return: None
+        """
+        directories = {}
+        mtimes = {}
+        for data_directory in self._data_directories:
+            try:
+                cycle_directory = current_cycle_directory(data_directory)
+                if cycle_directory is None:
+                    continue
+                # Taken before listing, so a file written during the listing marks the directory as changed
+                mtimes[cycle_directory] = cycle_directory.stat().st_mtime_ns
+                with os.scandir(cycle_directory) as entries:
+                    paths = [cycle_directory / entry.name for entry in entries if entry.name.endswith(".nxs")]
+            except OSError:
+                logger.exception("Could not index %s", data_directory)
+                continue
+            with self._lock:
+                titles = self._directories.get(cycle_directory, {})
+            directories[cycle_directory] = {path: titles.get(path) for path in paths}
+        with self._lock:
+            self._directories = directories
+            self._mtimes = mtimes
+
+    def read_titles(self) -> None:
+        """
+        Read the titles of the indexed files that do not have one yet, newest first, until done or stopped
+        :return: None
+        """
+        with self._lock:
+            paths = sorted(
+                (path for files in self._directories.values() for path, title in files.items() if title is None),
+                reverse=True,
+            )
+        for path in paths:
+            if self._stopped.is_set():
+                return
+            try:
+                title = self._read_title(path)
+            except Exception:  # the file may still be being written, it is retried on the next pass
+                logger.debug("Could not read the title of %s", path, exc_info=True)
+                continue
+            with self._lock:
+                files = self._directories.get(path.parent)
+                if files is not None and path in files:
+                    files[path] = title
+
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            self.read_titles()
+            if self._stopped.wait(self._interval):
+                return
+            self.scan()
+
+    def start(self) -> None:
+        """
+        Index the current cycle directories, then keep the index up to date on a daemon thread
+        :return: None
+        """
+        logger.info("Indexing archive directories %s", self._data_directories)
+        self.scan()
+        self._thread = threading.Thread(target=self._run, name="archive-index", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """
+        Stop the background thread
+        :return: None
+        """
+        self._stopped.set()
+
+    @property
+    def is_running(self) -> bool:
+        """
+        Whether the index is being kept up to date. The thread does not survive a fork, so this is False in forked
+        worker processes
+        """
+        return self._thread is not None and self._thread.is_alive()
+
+    def is_indexed(self, path: Path) -> bool:
+        """
+        Whether the file is in the index
+        :param path: The path of the nexus file
+        :return: True if indexed
+        """
+        with self._lock:
+            return path in self._directories.get(path.parent, {})
+
+    def get_title(self, path: Path) -> str | None:
+        """
+        Return the indexed title of the file
+        :param path: The path of the nexus file
+        :return: The title, or None if it has not been read
+        """
+        with self._lock:
+            return self._directories.get(path.parent, {}).get(path)
+
+    def get_sibling_nexus_files(self, path: Path) -> list[Path] | None:
+        """
+        Return the other indexed nexus files in the file's directory, provided it has not changed since it was scanned.
+        Checking costs a stat of the directory, which is much cheaper than listing it on the archive
+        :param path: The path of the nexus file
+        :return: The sibling files, or None if the directory is not indexed or has changed since it was scanned
+        """
+        with self._lock:
+            files = self._directories.get(path.parent)
+            scanned_mtime_ns = self._mtimes.get(path.parent)
+        if files is None:
+            return None
+        try:
+            if path.parent.stat().st_mtime_ns != scanned_mtime_ns:
+                return None
+        except OSError:
+            return None
+        return [sibling for sibling in files if sibling != path]
+
+
+_archive_index: ArchiveIndex | None = None
+
+
+def start_archive_index(read_title: Callable[[Path], str]) -> None:
+    """
+    Start the process wide archive index if ARCHIVE_INDEX_DIRS is set and it is not already running
+    :param read_title: The function used to read the title of a nexus file
+    :return: None
+    """
+    global _archive_index  # noqa: PLW0603
+    if not ARCHIVE_INDEX_DIRS or (_archive_index is not None and _archive_index.is_running):
+        return
+    _archive_index = ArchiveIndex(ARCHIVE_INDEX_DIRS, read_title)
+    _archive_index.start()
+
+
+def get_archive_index() -> ArchiveIndex | None:
+    """
+    Return the process wide archive index, if it is running in this process
+    :return: The archive index
+    """
+    if _archive_index is not None and _archive_index.is_running:
+        return _archive_index
+    return None
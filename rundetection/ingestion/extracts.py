@@ -7,6 +7,7 @@ import re
 import typing
 
 from rundetection.exceptions import IngestError, ReductionMetadataError
+from rundetection.ingestion.read_plan import Field, ReadPlan, bounds, first_bool
 
 if typing.TYPE_CHECKING:
     from collections.abc import Callable
@@ -18,6 +19,42 @@ if typing.TYPE_CHECKING:
 logger = logging.getLogger(__name__)
 
 
+def _decode_ei(dataset: Any) -> float | list[float] | str:
+    """
+    Decode the incident energy, which is a single energy, several energies, or auto if none were set
+    :param dataset: The ei dataset
+    :return: The incident energy
+    """
+    energies = [float(value) for value in dataset]
+    if len(energies) == 1:
+        return energies[0]
+    return energies if energies else "'auto'"
+
+
+MARI_PLAN = ReadPlan(
+    [
+        Field("ei", "ei", _decode_ei, default="'auto'"),
+        Field("sam_mass", "sam_mass", default=0.0),
+        Field("sam_rmm", "sam_rmm", default=0.0),
+        Field("remove_bkg", "remove_bkg", first_bool, default=False),
+    ]
+)
+
+OSIRIS_PLAN = ReadPlan(
+    [
+        Field("freq6", "selog/freq6/value_log/value"),
+        Field("freq10", "selog/freq10/value_log/value"),
+        Field("phase6", "selog/phase6/value"),
+        Field("phase10", "selog/phase10/value"),
+        Field("tcb_detector", "instrument/dae/time_channels_1/time_of_flight", bounds),
+        Field("tcb_monitor", "instrument/dae/time_channels_2/time_of_flight", bounds),
+    ]
+)
+
+# Instruments whose extracted values need no further processing, added to the additional values as read
+EXTRACTION_PLANS: dict[str, ReadPlan] = {}
+
+
 def skip_extract(job_request: JobRequest, _: Any) -> JobRequest:
     """
     Skips the extraction of additional metadata for a given JobRequest instance and dataset, when the extraction of
@@ -55,8 +92,9 @@ def osiris_extract(job_request: JobRequest, dataset: Any) -> JobRequest:
     """
     job_request.additional_values["cycle_string"] = get_cycle_string_from_path(job_request.filepath)
 
-    freq_6 = float(dataset.get("selog").get("freq6").get("value_log").get("value")[0])
-    freq_10 = float(dataset.get("selog").get("freq10").get("value_log").get("value")[0])
+    values = OSIRIS_PLAN.read(dataset)
+    freq_6 = values["freq6"]
+    freq_10 = values["freq10"]
 
     # Accounting for floating point errors
     max_value = max(freq_6, freq_10)
@@ -72,13 +110,11 @@ def osiris_extract(job_request: JobRequest, dataset: Any) -> JobRequest:
     job_request.additional_values["freq6"] = freq_6
     job_request.additional_values["freq10"] = freq_10
 
-    job_request.additional_values["phase6"] = float(dataset.get("selog").get("phase6").get("value")[0])
-    job_request.additional_values["phase10"] = float(dataset.get("selog").get("phase10").get("value")[0])
+    job_request.additional_values["phase6"] = values["phase6"]
+    job_request.additional_values["phase10"] = values["phase10"]
 
-    tcb_detector_min = float(min(dataset.get("instrument").get("dae").get("time_channels_1").get("time_of_flight")))
-    tcb_detector_max = float(max(dataset.get("instrument").get("dae").get("time_channels_1").get("time_of_flight")))
-    tcb_monitor_min = float(min(dataset.get("instrument").get("dae").get("time_channels_2").get("time_of_flight")))
-    tcb_monitor_max = float(max(dataset.get("instrument").get("dae").get("time_channels_2").get("time_of_flight")))
+    tcb_detector_min, tcb_detector_max = values["tcb_detector"]
+    tcb_monitor_min, tcb_monitor_max = values["tcb_monitor"]
     job_request.additional_values["tcb_detector_min"] = tcb_detector_min
     job_request.additional_values["tcb_detector_max"] = tcb_detector_max
     job_request.additional_values["tcb_monitor_min"] = tcb_monitor_min
@@ -101,17 +137,11 @@ def mari_extract(job_request: JobRequest, dataset: Any) -> JobRequest:
     (remove_bkg). The extracted metadata is stored in the additional_values attribute of the JobRequest instance.
     """
 
-    ei = dataset.get("ei")
-    if ei and len(ei) == 1:
-        ei = float(ei[0])
-    elif ei and len(ei) > 1:
-        ei = [float(val) for val in ei]
-    else:
-        ei = "'auto'"
-
-    sam_mass = float(dataset.get("sam_mass")[0]) if dataset.get("sam_mass") is not None else 0.0
-    sam_rmm = float(dataset.get("sam_rmm")[0]) if dataset.get("sam_rmm") is not None else 0.0
-    remove_bkg = bool(dataset.get("remove_bkg")[0]) if dataset.get("remove_bkg") is not None else False
+    values = MARI_PLAN.read(dataset)
+    ei = values["ei"]
+    sam_mass = values["sam_mass"]
+    sam_rmm = values["sam_rmm"]
+    remove_bkg = values["remove_bkg"]
 
     job_request.additional_values["ei"] = ei
     job_request.additional_values["sam_mass"] = sam_mass
@@ -137,10 +167,28 @@ def get_extraction_function(instrument: str) -> Callable[[JobRequest, Any], JobR
             return tosca_extract
         case "osiris":
             return osiris_extract
+        case name if name in EXTRACTION_PLANS:
+            return _plan_extract(EXTRACTION_PLANS[name])
         case _:
             return skip_extract
 
 
+def _plan_extract(plan: ReadPlan) -> Callable[[JobRequest, Any], JobRequest]:
+    """
+    Return an extraction function adding every value read by the plan to the additional values
+    :param plan: The read plan
+    :return: The extraction function
+    """
+
+    def plan_extract(job_request: JobRequest, dataset: Any) -> JobRequest:
+        values = plan.read(dataset)
+        for field in plan.fields:
+            job_request.additional_values[field.name] = values[field.name]
+        return job_request
+
+    return plan_extract
+
+
 def get_cycle_string_from_path(nexus_path: Path) -> str:
     """
     Given the path of a nexus file, get the cycle string for that nexus file.
@@ -0,0 +1,132 @@
+"""
+The nexus filename scheme of each instrument, so run numbers can be turned into archive paths, and archive paths parsed
+back into their instrument, run number and cycle, with string operations rather than globbing or opening files
+"""
+
+from __future__ import annotations
+
+import typing
+from dataclasses import dataclass
+
+if typing.TYPE_CHECKING:
+    from pathlib import Path
+
+NEXUS_EXTENSION = ".nxs"
+ARCHIVE_DIRECTORY_PREFIX = "NDX"
+CYCLE_DIRECTORY_PREFIX = "cycle_"
+DEFAULT_PADDING = 8
+
+
+@dataclass(frozen=True)
+class FilenameScheme:
+    """
+    How an instrument names its nexus files, e.g. OSIRIS00012345.nxs
+    :param instrument: The upper case instrument name
+    :param prefix: The filename prefix preceding the run number
+    :param padding: The width the run number is zero padded to, 0 if it is not padded
+    :param extension: The file extension
+    """
+
+    instrument: str
+    prefix: str
+    padding: int = DEFAULT_PADDING
+    extension: str = NEXUS_EXTENSION
+
+    def filename(self, run_number: int) -> str:
+        """
+        Return the filename of the run
+        :param run_number: The run number
+        :return: The filename
+        """
+        return f"{self.prefix}{run_number:0{self.padding}d}{self.extension}"
+
+    def run_path(self, directory: Path, run_number: int) -> Path:
+        """
+        Return the path of the run within the directory
+        :param directory: The cycle directory
+        :param run_number: The run number
+        :return: The path of the run's nexus file
+        """
+        return directory / self.filename(run_number)
+
+
+# The schemes confirmed from archive files, e.g. ALF82301.nxs and OSIRIS00108538.nxs. Any other instrument is assumed,
+# without having been checked, to be named <INSTRUMENT><8 digit run number>.nxs. Parsed paths keep the file's own
+# prefix and padding, so only run numbers turned into paths from scratch rely on the assumption
+SCHEMES: dict[str, FilenameScheme] = {
+    "ALF": FilenameScheme("ALF", "ALF", padding=0),
+    "ENGINX": FilenameScheme("ENGINX", "ENGINX"),
+    "IMAT": FilenameScheme("IMAT", "IMAT"),
+    "MARI": FilenameScheme("MARI", "MAR", padding=0),
+    "OSIRIS": FilenameScheme("OSIRIS", "OSIRIS"),
+    "TOSCA": FilenameScheme("TOSCA", "TSC", padding=0),
+}
+
+# Both the scheme prefix and the instrument name are recognised, as older files may be named after either
+_PREFIXES: dict[str, FilenameScheme] = {scheme.instrument: scheme for scheme in SCHEMES.values()} | {
+    scheme.prefix: scheme for scheme in SCHEMES.values()
+}
+
+
+def get_scheme(instrument: str) -> FilenameScheme:
+    """
+    Return the instrument's filename scheme, assuming the instrument name and 8 digit run numbers if it is not known
+    :param instrument: The instrument name
+    :return: The filename scheme
+    """
+    instrument = instrument.upper()
+    scheme = SCHEMES.get(instrument)
+    return FilenameScheme(instrument, instrument) if scheme is None else scheme
+
+
+@dataclass(frozen=True)
+class NexusPath:
+    """
+    The run a nexus file path names
+    :param instrument: The upper case instrument name
+    :param run_number: The run number
+    :param cycle: The cycle directory, e.g. cycle_24_1, or None if the path is not within one
+    :param scheme: How the file itself is named, which may differ from the instrument's scheme for older files
+    """
+
+    instrument: str
+    run_number: int
+    cycle: str | None
+    scheme: FilenameScheme
+
+
+def archive_instrument(path: Path) -> str | None:
+    """
+    Return the instrument named by the path's archive directory, e.g. NDXMARI. A directory named after a filename
+    prefix, e.g. NDXMAR, is mapped to its instrument
+    :param path: The path
+    :return: The upper case instrument name, or None if the path is not within an archive directory
+    """
+    for part in path.parts[:-1]:
+        instrument = part[len(ARCHIVE_DIRECTORY_PREFIX) :].upper()
+        if instrument and part[: len(ARCHIVE_DIRECTORY_PREFIX)].upper() == ARCHIVE_DIRECTORY_PREFIX:
+            known = _PREFIXES.get(instrument)
+            return instrument if known is None else known.instrument
+    return None
+
+
+def parse_nexus_path(path: Path) -> NexusPath | None:
+    """
+    Parse the instrument, run number and cycle from a nexus file path without opening the file. The instrument is
+    taken from the archive directory, e.g. NDXMARI, or else the filename prefix
+    :param path: The path of the nexus file
+    :return: The parsed path, or None if the filename does not name a run
+    """
+    stem = path.name.removesuffix(NEXUS_EXTENSION)
+    prefix = stem.rstrip("0123456789")
+    if stem == path.name or not prefix or prefix == stem:
+        return None
+    digits = stem[len(prefix) :]
+    instrument = archive_instrument(path)
+    if instrument is None:
+        known = _PREFIXES.get(prefix.upper())
+        instrument = prefix.upper() if known is None else known.instrument
+    # A leading zero, or the instrument's padded width, shows the run number is padded to the width of its digits
+    padding = len(digits) if digits[0] == "0" or len(digits) == get_scheme(instrument).padding else 0
+    cycle = next((part for part in path.parts[:-1] if part.startswith(CYCLE_DIRECTORY_PREFIX)), None)
+    return NexusPath(instrument, int(digits), cycle, FilenameScheme(instrument, prefix, padding))
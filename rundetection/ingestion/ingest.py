@@ -3,17 +3,39 @@
 from __future__ import annotations
 
 import logging
+import typing
+from contextlib import contextmanager
 from pathlib import Path
 from typing import Any
 
 from h5py import File  # type: ignore
 
+from rundetection.ingestion.archive_index import get_archive_index
 from rundetection.ingestion.extracts import get_extraction_function
+from rundetection.ingestion.filenames import archive_instrument, parse_nexus_path
+from rundetection.ingestion.metadata_cache import get_memory_metadata_cache, get_metadata_cache
+from rundetection.ingestion.read_plan import Field, ReadPlan, first_int, first_str
+from rundetection.ingestion.stat_cache import get_stat_cache, path_exists
 from rundetection.job_requests import JobRequest
 
+if typing.TYPE_CHECKING:
+    import os
+    from collections.abc import Iterator
+
 logger = logging.getLogger(__name__)
 
 
+def instrument_from_path(path: Path) -> str | None:
+    """
+    Derive the instrument of a nexus file from its archive directory, e.g. NDXMARI, or else its filename prefix, e.g.
+    MAR25581.nxs, without opening it
+    :param path: The path of the nexus file
+    :return: The upper case instrument name, or None if it cannot be derived
+    """
+    parsed = parse_nexus_path(path)
+    return archive_instrument(path) if parsed is None else parsed.instrument
+
+
 def _check_if_nexus_file(path: Path) -> None:
     """
     Check if a given path is a nexus file, if not raise ValueError
@@ -24,17 +46,33 @@ def _check_if_nexus_file(path: Path) -> None:
         raise ValueError(f"File: {path} is not a nexus file")
 
 
-def _load_h5py_dataset(path: Path) -> Any:
+@contextmanager
+def _open_h5py_dataset(path: Path) -> Iterator[Any]:
     """
-    Load the nexus file into a h5py dataset
+    Open the nexus file and yield its h5py dataset. The file is closed when the context exits, so everything needed
+    from the dataset must be read inside it
     :param path: the path of the nexus file
     :return: (Any) The h5py dataset
     """
     try:
         logger.info("loading dataset for %s", path)
-        file = File(path)
+        file = File(path, "r")
+    except FileNotFoundError:
+        logger.error("Nexus file could not be found: %s", path)
+        raise
+    with file:
         key = next(iter(file.keys()))  # same as: list(file.keys())[0] without the cast cost
-        return file[key]
+        yield file[key]
+
+
+def _stat_nexus_file(path: Path) -> os.stat_result:
+    """
+    Stat the nexus file, logging if it is missing
+    :param path: the path of the nexus file
+    :return: The stat result
+    """
+    try:
+        return path.stat()
     except FileNotFoundError:
         logger.error("Nexus file could not be found: %s", path)
         raise
@@ -42,21 +80,53 @@ def _load_h5py_dataset(path: Path) -> Any:
 
 def ingest(path: Path) -> JobRequest:
     """
-    Given the path of a nexus file, Create and return a JobRequest
+    Given the path of a nexus file, Create and return a JobRequest. If the file is unchanged since it was last
+    ingested, a copy of the cached JobRequest is returned instead of reading the file
     :param path: The path of the nexus file
     :return: The JobRequest built from the given nexus file
     """
     logger.info("Ingesting file: %s", path)
     _check_if_nexus_file(path)
-    dataset = _load_h5py_dataset(path)
-    job_request = _build_initial_job_request(dataset, path)
-    logger.info("Extracting instrument specific metadata...")
-    additional_extraction_function = get_extraction_function(job_request.instrument)
-    job_request = additional_extraction_function(job_request, dataset)
+    memory_cache = get_memory_metadata_cache()
+    metadata_cache = get_metadata_cache()
+    if memory_cache is not None or metadata_cache is not None:
+        stat = _stat_nexus_file(path)
+        cached = memory_cache.get(path, stat) if memory_cache is not None else None
+        if cached is None and metadata_cache is not None:
+            cached = metadata_cache.get(path, stat)
+            if cached is not None and memory_cache is not None:
+                memory_cache.put(path, stat, cached)
+        if cached is not None:
+            logger.info("Using cached JobRequest: %s", cached)
+            return cached
+    with _open_h5py_dataset(path) as dataset:
+        job_request = _build_initial_job_request(dataset, path)
+        logger.info("Extracting instrument specific metadata...")
+        additional_extraction_function = get_extraction_function(job_request.instrument)
+        job_request = additional_extraction_function(job_request, dataset)
     logger.info("Created JobRequest: %s", job_request)
+    if memory_cache is not None:
+        memory_cache.put(path, stat, job_request)
+    if metadata_cache is not None:
+        metadata_cache.put(path, stat, job_request)
     return job_request
 
 
+COMMON_PLAN = ReadPlan(
+    [
+        Field("run_number", "run_number", first_int),
+        Field("instrument", "beamline", first_str),
+        Field("experiment_title", "title", first_str),
+        Field("run_start", "start_time", first_str),
+        Field("run_end", "end_time", first_str),
+        Field("raw_frames", "raw_frames", first_int),
+        Field("good_frames", "good_frames", first_int),
+        Field("users", "user_1/name", first_str),
+        Field("experiment_number", "experiment_identifier", first_str),
+    ]
+)
+
+
 def _build_initial_job_request(dataset: Any, path: Path) -> JobRequest:
     """
     Build the initial job request from the given h5py job request
@@ -64,18 +134,8 @@ def _build_initial_job_request(dataset: Any, path: Path) -> JobRequest:
     :return: the new jobrequest
     """
     logger.info("Extracting common metadata...")
-    return JobRequest(
-        run_number=int(dataset.get("run_number")[0]),  # cast to int as i32 is not json serializable
-        instrument=dataset.get("beamline")[0].decode("utf-8"),
-        experiment_title=dataset.get("title")[0].decode("utf-8"),
-        run_start=dataset.get("start_time")[0].decode("utf-8"),
-        run_end=dataset.get("end_time")[0].decode("utf-8"),
-        raw_frames=int(dataset.get("raw_frames")[0]),
-        good_frames=int(dataset.get("good_frames")[0]),
-        users=dataset.get("user_1").get("name")[0].decode("utf-8"),
-        experiment_number=dataset.get("experiment_identifier")[0].decode("utf-8"),
-        filepath=path,
-    )
+    values = COMMON_PLAN.read(dataset)
+    return JobRequest(**{field.name: values[field.name] for field in COMMON_PLAN.fields}, filepath=path)
 
 
 def get_sibling_nexus_files(nexus_path: Path) -> list[Path]:
@@ -84,7 +144,16 @@ def get_sibling_nexus_files(nexus_path: Path) -> list[Path]:
     :param nexus_path: The nexus file for which directory to search
     :return: List of sibling nexus files
     """
-    return [Path(file) for file in nexus_path.parents[0].glob("*.nxs") if Path(file) != nexus_path]
+    archive_index = get_archive_index()
+    if archive_index is not None:
+        siblings = archive_index.get_sibling_nexus_files(nexus_path)
+        if siblings is not None:
+            return siblings
+    siblings = [Path(file) for file in nexus_path.parents[0].glob("*.nxs") if Path(file) != nexus_path]
+    stat_cache = get_stat_cache()
+    if stat_cache is not None:
+        stat_cache.add_listed(siblings)
+    return siblings
 
 
 def get_sibling_runs(nexus_path: Path) -> list[JobRequest]:
@@ -102,4 +171,22 @@ def get_run_title(nexus_path: Path) -> str:
     :param nexus_path: Path - the nexus file path
     :return: str - The title of the files run
     """
+    archive_index = get_archive_index()
+    if archive_index is not None:
+        title = archive_index.get_title(nexus_path)
+        if title is not None:
+            return title
     return ingest(nexus_path).experiment_title
+
+
+def nexus_file_exists(nexus_path: Path) -> bool:
+    """
+    Given the path of a nexus file, return whether it exists, checking the archive index and stat cache before the
+    filesystem
+    :param nexus_path: Path - the nexus file path
+    :return: bool - True if the file exists
+    """
+    archive_index = get_archive_index()
+    if archive_index is not None and archive_index.is_indexed(nexus_path):
+        return True
+    return path_exists(nexus_path)
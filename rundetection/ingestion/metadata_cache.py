@@ -0,0 +1,178 @@
+"""
+Caches of the metadata ingested from nexus files, so that files reread by the stitch rules do not have to be opened
+again. An in memory LRU sits in front of an optional persistent SQLite cache. Entries in both are keyed by path and are
+only returned while the file's size and mtime are unchanged
+"""
+
+from __future__ import annotations
+
+import copy
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+from rundetection.job_requests import JobRequest
+
+logger = logging.getLogger(__name__)
+
+METADATA_CACHE_DIR = os.environ.get("METADATA_CACHE_DIR", "")
+METADATA_CACHE_FILENAME = "metadata-cache.sqlite3"
+INGEST_CACHE_SIZE = int(os.environ.get("INGEST_CACHE_SIZE", "1024"))
+INGEST_CACHE_TTL_SECONDS = float(os.environ.get("INGEST_CACHE_TTL_SECONDS", "300"))
+
+
+class MetadataCache:
+    """
+    SQLite backed cache of ingested JobRequests. One connection is shared by the threads of a process, and a new one
+    is opened if the cache is used after a fork. Concurrent processes share the database through SQLite's locking
+    """
+
+    def __init__(self, directory: Path) -> None:
+        self._path = directory / METADATA_CACHE_FILENAME
+        self._lock = threading.Lock()
+        self._connection: sqlite3.Connection | None = None
+        self._pid = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        """
+        Return this process's connection, opening it and creating the table if needed. Must be called holding the lock
+        :return: The connection
+        """
+        if self._connection is None or self._pid != os.getpid():
+            self._path.parent.mkdir(parents=True, exist_ok=True)
+            connection = sqlite3.connect(self._path, timeout=30, check_same_thread=False, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS metadata "
+                "(path TEXT PRIMARY KEY, size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL, job_request TEXT NOT NULL)"
+            )
+            self._connection = connection
+            self._pid = os.getpid()
+        return self._connection
+
+    def get(self, path: Path, stat: os.stat_result) -> JobRequest | None:
+        """
+        Get the cached JobRequest for the file, if it has not changed since it was cached
+        :param path: The path of the nexus file
+        :param stat: The current stat of the nexus file
+        :return: A new JobRequest built from the cached metadata, or None on a miss
+        """
+        with self._lock:
+            row = (
+                self._connect()
+                .execute("SELECT size, mtime_ns, job_request FROM metadata WHERE path = ?", (str(path),))
+                .fetchone()
+            )
+        if row is None or row[0] != stat.st_size or row[1] != stat.st_mtime_ns:
+            return None
+        fields = json.loads(row[2])
+        fields["filepath"] = path
+        return JobRequest(**fields)
+
+    def put(self, path: Path, stat: os.stat_result, job_request: JobRequest) -> None:
+        """
+        Cache the JobRequest ingested from the file, replacing any stale entry
+        :param path: The path of the nexus file
+        :param stat: The stat of the nexus file taken before it was ingested
+        :param job_request: The ingested JobRequest
+        :return: None
+        """
+        with self._lock:
+            self._connect().execute(
+                "INSERT OR REPLACE INTO metadata (path, size, mtime_ns, job_request) VALUES (?, ?, ?, ?)",
+                (str(path), stat.st_size, stat.st_mtime_ns, job_request.to_json_string()),
+            )
+
+
+class MemoryMetadataCache:
+    """
+    Bounded, thread safe LRU of ingested JobRequests. Entries expire after the TTL, and the least recently used entry is
+    evicted once the cache is full. JobRequests are copied in and out, as the rules mutate the JobRequests they verify
+    """
+
+    def __init__(self, max_size: int, ttl: float) -> None:
+        self._max_size = max_size
+        self._ttl = ttl
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[Path, tuple[int, int, float, JobRequest]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, path: Path, stat: os.stat_result) -> JobRequest | None:
+        """
+        Get a copy of the cached JobRequest for the file, if it has not changed or expired since it was cached
+        :param path: The path of the nexus file
+        :param stat: The current stat of the nexus file
+        :return: The JobRequest, or None on a miss
+        """
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is None:
+                self.misses += 1
+                return None
+            size, mtime_ns, expires, job_request = entry
+            if size != stat.st_size or mtime_ns != stat.st_mtime_ns or expires <= time.monotonic():
+                del self._entries[path]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(path)
+            self.hits += 1
+        return copy.deepcopy(job_request)
+
+    def put(self, path: Path, stat: os.stat_result, job_request: JobRequest) -> None:
+        """
+        Cache a copy of the JobRequest ingested from the file, evicting the least recently used entry if full
+        :param path: The path of the nexus file
+        :param stat: The stat of the nexus file taken before it was ingested
+        :param job_request: The ingested JobRequest
+        :return: None
+        """
+        entry = (stat.st_size, stat.st_mtime_ns, time.monotonic() + self._ttl, copy.deepcopy(job_request))
+        with self._lock:
+            self._entries[path] = entry
+            self._entries.move_to_end(path)
+            while len(self._entries) > self._max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """
+        Remove every entry and reset the counters
+        :return: None
+        """
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+_memory_metadata_cache = MemoryMetadataCache(INGEST_CACHE_SIZE, INGEST_CACHE_TTL_SECONDS)
+_metadata_cache: MetadataCache | None = None
+
+
+def get_memory_metadata_cache() -> MemoryMetadataCache | None:
+    """
+    Return the process wide in memory metadata cache, or None if INGEST_CACHE_SIZE is 0
+    :return: The in memory metadata cache
+    """
+    return _memory_metadata_cache if INGEST_CACHE_SIZE > 0 else None
+
+
+def get_metadata_cache() -> MetadataCache | None:
+    """
+    Return the process wide metadata cache, or None if METADATA_CACHE_DIR is not set
+    :return: The metadata cache
+    """
+    global _metadata_cache  # noqa: PLW0603
+    if _metadata_cache is None and METADATA_CACHE_DIR:
+        logger.info("Caching ingested metadata in %s", METADATA_CACHE_DIR)
+        _metadata_cache = MetadataCache(Path(METADATA_CACHE_DIR))
+    return _metadata_cache
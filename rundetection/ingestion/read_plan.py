@@ -0,0 +1,134 @@
+"""
+Declarative extraction of metadata from nexus files. Fields are described by their path within the nexus entry and a
+decoder, and compiled into a read plan that resolves each group on those paths once and reads every field in one pass
+"""
+
+from __future__ import annotations
+
+import typing
+from dataclasses import dataclass, field
+from typing import Any
+
+import numpy as np
+
+from rundetection.exceptions import IngestError
+
+if typing.TYPE_CHECKING:
+    from collections.abc import Callable, Iterator, Mapping
+
+
+class _Required:
+    def __repr__(self) -> str:
+        return "REQUIRED"
+
+
+REQUIRED: Any = _Required()
+
+
+def first_int(dataset: Any) -> int:
+    """Decode the first value as an int, as numpy ints are not json serializable"""
+    return int(dataset[0])
+
+
+def first_float(dataset: Any) -> float:
+    """Decode the first value as a float"""
+    return float(dataset[0])
+
+
+def first_bool(dataset: Any) -> bool:
+    """Decode the first value as a bool"""
+    return bool(dataset[0])
+
+
+def first_str(dataset: Any) -> str:
+    """Decode the first value as a utf-8 string"""
+    return str(dataset[0].decode("utf-8"))
+
+
+def bounds(dataset: Any) -> tuple[float, float]:
+    """Decode the minimum and maximum of the values, reading the dataset into memory in a single read"""
+    values = np.asarray(dataset)
+    return float(values.min()), float(values.max())
+
+
+@dataclass(frozen=True)
+class Field:
+    """
+    A value to extract from a nexus entry
+    :param name: The name of the extracted value
+    :param path: The path of the dataset, relative to the entry, e.g. selog/freq6/value_log/value
+    :param decode: The function decoding the value from the dataset
+    :param default: The value used if the dataset is missing, if REQUIRED using the value raises an IngestError
+    """
+
+    name: str
+    path: str
+    decode: Callable[[Any], Any] = first_float
+    default: Any = REQUIRED
+
+
+@dataclass
+class _Node:
+    children: dict[str, _Node] = field(default_factory=dict)
+    fields: list[Field] = field(default_factory=list)
+
+    def all_fields(self) -> Iterator[Field]:
+        yield from self.fields
+        for child in self.children.values():
+            yield from child.all_fields()
+
+
+class ExtractedValues(dict[str, Any]):
+    """
+    The values read by a plan. A required value whose dataset was missing raises an IngestError when it is used, so
+    errors surface where the value is needed as they would when reading the file field by field
+    """
+
+    def __init__(self, missing: Mapping[str, str]) -> None:
+        super().__init__()
+        self.missing = missing
+
+    def __missing__(self, key: str) -> Any:
+        if key in self.missing:
+            raise IngestError(f"Nexus file is missing required dataset: {self.missing[key]}")
+        raise KeyError(key)
+
+
+class ReadPlan:
+    """
+    A compiled set of fields, read from a nexus entry by walking the tree of their paths once
+    """
+
+    def __init__(self, fields: list[Field]) -> None:
+        self.fields = fields
+        self._root = _Node()
+        for field_ in fields:
+            node = self._root
+            for part in field_.path.split("/"):
+                node = node.children.setdefault(part, _Node())
+            node.fields.append(field_)
+
+    def read(self, entry: Any) -> ExtractedValues:
+        """
+        Read every field from the entry
+        :param entry: The nexus entry, a h5py group or any mapping with the same get API
+        :return: The extracted values by field name
+        """
+        missing: dict[str, str] = {}
+        values = ExtractedValues(missing)
+        stack = [(entry, self._root)]
+        while stack:
+            group, node = stack.pop()
+            for field_ in node.fields:
+                values[field_.name] = field_.decode(group)
+            for name, child in node.children.items():
+                item = group.get(name)
+                if item is not None:
+                    stack.append((item, child))
+                    continue
+                for field_ in child.all_fields():
+                    if field_.default is REQUIRED:
+                        missing[field_.name] = field_.path
+                    else:
+                        values[field_.name] = field_.default
+        return values
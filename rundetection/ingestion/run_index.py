@@ -0,0 +1,113 @@
+"""
+Incremental index of the runs in each archive directory, grouped by a key derived from their JobRequests, so that
+finding a run's related runs is a dictionary lookup rather than an ingest of every sibling file
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+import typing
+from collections import OrderedDict
+from dataclasses import dataclass, field
+
+from rundetection.ingestion.ingest import get_sibling_nexus_files, ingest
+
+if typing.TYPE_CHECKING:
+    from collections.abc import Callable
+    from pathlib import Path
+
+    from rundetection.job_requests import JobRequest
+
+logger = logging.getLogger(__name__)
+
+MAX_INDEXED_DIRECTORIES = 64
+
+
+@dataclass
+class DirectoryIndex:
+    """
+    The indexed runs of one directory, as of the directory mtime it was last scanned at
+    """
+
+    mtime_ns: int | None = None
+    groups: dict[str, set[Path]] = field(default_factory=dict)
+    run_groups: dict[Path, str] = field(default_factory=dict)
+
+    def add(self, path: Path, group: str) -> None:
+        """
+        Add the run to its group
+        :param path: The path of the nexus file
+        :param group: The run group
+        :return: None
+        """
+        self.run_groups[path] = group
+        self.groups.setdefault(group, set()).add(path)
+
+    def remove(self, path: Path) -> None:
+        """
+        Remove the run from its group
+        :param path: The path of the nexus file
+        :return: None
+        """
+        group = self.run_groups.pop(path)
+        self.groups[group].discard(path)
+        if not self.groups[group]:
+            del self.groups[group]
+
+
+class RunIndex:
+    """
+    Index of the nexus files in each directory by run group. A directory is rescanned when its mtime changes, and only
+    the files added since the last scan are ingested. Directories are listed through get_sibling_nexus_files, so from
+    the archive index when it is current. The most recently used directories are kept
+    """
+
+    def __init__(self, run_group: Callable[[JobRequest], str], max_directories: int = MAX_INDEXED_DIRECTORIES) -> None:
+        self._run_group = run_group
+        self._max_directories = max_directories
+        self._lock = threading.Lock()
+        self._directories: OrderedDict[Path, DirectoryIndex] = OrderedDict()
+
+    def _scan(self, path: Path, index: DirectoryIndex) -> None:
+        """
+        Bring the index of the file's directory up to date with the nexus files currently in it
+        :param path: The path of a nexus file in the directory
+        :param index: The directory's index
+        :return: None
+        """
+        directory = path.parent
+        mtime_ns = directory.stat().st_mtime_ns
+        if mtime_ns == index.mtime_ns:
+            return
+        current = {path, *get_sibling_nexus_files(path)}
+        removed = index.run_groups.keys() - current
+        added = sorted(current - index.run_groups.keys())
+        logger.info("Indexing %s: %s added, %s removed", directory, len(added), len(removed))
+        groups = [(path, self._run_group(ingest(path))) for path in added]
+        for path in removed:
+            index.remove(path)
+        for path, group in groups:
+            index.add(path, group)
+        index.mtime_ns = mtime_ns
+
+    def get_related_runs(self, job_request: JobRequest) -> list[Path]:
+        """
+        Return the other nexus files in the job request's directory that are in the same run group
+        :param job_request: The job request
+        :return: The related nexus files, sorted by path
+        """
+        path = job_request.filepath
+        directory = path.parent
+        group = self._run_group(job_request)
+        with self._lock:
+            index = self._directories.pop(directory, None) or DirectoryIndex()
+            self._directories[directory] = index
+            while len(self._directories) > self._max_directories:
+                self._directories.popitem(last=False)
+            self._scan(path, index)
+            if index.run_groups.get(path) != group:
+                if path in index.run_groups:
+                    index.remove(path)
+                index.add(path, group)
+            return sorted(run for run in index.groups[group] if run != path)
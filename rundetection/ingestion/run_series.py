@@ -0,0 +1,186 @@
+"""
+Incremental tracking of the open run series in each archive directory, shared by the stitch rules, so that stitching
+the next run of a series reuses the titles read for the previous run rather than walking the archive back again
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import typing
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+from rundetection.ingestion.filenames import parse_nexus_path
+from rundetection.ingestion.ingest import get_run_title, nexus_file_exists
+
+if typing.TYPE_CHECKING:
+    from collections.abc import Callable, Generator
+    from concurrent.futures import Future
+    from pathlib import Path
+
+    from rundetection.ingestion.filenames import FilenameScheme
+
+logger = logging.getLogger(__name__)
+
+MAX_TRACKED_DIRECTORIES = 64
+STITCH_PREFETCH = int(os.environ.get("STITCH_PREFETCH", "4"))
+STITCH_MAX_LOOKBACK = int(os.environ.get("STITCH_MAX_LOOKBACK", "1000"))
+
+_executor: ThreadPoolExecutor | None = None
+_executor_pid = 0
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    """
+    Return this process's executor for prefetching titles, creating it if needed, as threads do not survive a fork
+    :return: The executor
+    """
+    global _executor, _executor_pid  # noqa: PLW0603
+    with _executor_lock:
+        if _executor is None or _executor_pid != os.getpid():
+            _executor = ThreadPoolExecutor(max_workers=max(STITCH_PREFETCH, 1), thread_name_prefix="stitch-prefetch")
+            _executor_pid = os.getpid()
+        return _executor
+
+
+@dataclass
+class OpenSeries:
+    """
+    The latest run stitched in a directory, and the titles read walking back from it. titles[i] is the title of run
+    latest - i, or None if it had no nexus file, and the last title is the one that ended the series
+    """
+
+    latest: int
+    titles: list[str | None] = field(default_factory=list)
+
+
+class RunSeriesTracker:
+    """
+    Finds the runs to stitch with a run by walking back from it while each earlier run's title belongs to the same
+    series as the run's title. The walk for each directory is kept, so when the next run arrives the titles of the
+    runs before it are already known and only the new run, and a boundary run that had no file, are read from the
+    archive. A cold start, or a gap in the run numbers, falls back to walking the archive. Titles are compared again
+    for every run, as similarity is not transitive, but that is done in memory.
+
+    When walking the archive, the titles of the next prefetch runs are read concurrently, as each read is an
+    independent round trip to the archive. Reads past the end of the series are discarded, along with any errors they
+    raised. The walk stops after max_lookback runs, so a directory of similarly titled runs cannot stall a message
+    """
+
+    def __init__(
+        self,
+        scheme: FilenameScheme,
+        is_same_series: Callable[[str, str], bool],
+        max_directories: int = MAX_TRACKED_DIRECTORIES,
+        prefetch: int = STITCH_PREFETCH,
+        max_lookback: int = STITCH_MAX_LOOKBACK,
+    ) -> None:
+        """
+        :param scheme: The instrument's filename scheme, used for runs whose own filename cannot be parsed
+        :param is_same_series: Given an earlier run's title and the run's title, whether they are in the same series
+        :param max_directories: The number of most recently used directories to keep series for
+        :param prefetch: The number of titles to read concurrently when walking the archive, 1 reads them in turn
+        :param max_lookback: The maximum number of runs in a series
+        """
+        self._scheme = scheme
+        self._is_same_series = is_same_series
+        self._max_directories = max_directories
+        self._prefetch = prefetch
+        self._max_lookback = max_lookback
+        self._lock = threading.Lock()
+        self._series: OrderedDict[Path, OpenSeries] = OrderedDict()
+
+    @staticmethod
+    def _read_title(path: Path) -> str | None:
+        return get_run_title(path) if nexus_file_exists(path) else None
+
+    def clear(self) -> None:
+        """
+        Forget every open series
+        :return: None
+        """
+        with self._lock:
+            self._series.clear()
+
+    def _titles(
+        self, run_path: Path, run_number: int, known: list[str | None], scheme: FilenameScheme
+    ) -> Generator[tuple[int, str | None], None, None]:
+        """
+        Yield the title of the run, then of each run before it, up to max_lookback runs
+        :param run_path: The path of the run's nexus file
+        :param run_number: The run number
+        :param known: The titles of the runs before the run, as read for the previous run
+        :param scheme: The filename scheme of the runs
+        :return: The run numbers and their titles, None if the run has no file
+        """
+        lowest = run_number - self._max_lookback + 1
+        prefetched: dict[int, Future[str | None]] = {}
+
+        def is_known(number: int) -> bool:
+            # known[0] is the title of the run before this one
+            return 0 <= run_number - 1 - number < len(known)
+
+        def path_of(number: int) -> Path:
+            return run_path if number == run_number else scheme.run_path(run_path.parent, number)
+
+        try:
+            for number in range(run_number, lowest - 1, -1):
+                if is_known(number) and known[run_number - 1 - number] is not None:
+                    yield number, known[run_number - 1 - number]
+                elif is_known(number) or self._prefetch <= 1:
+                    # A run that had no file is read again, it may since have been written
+                    yield number, self._read_title(path_of(number))
+                else:
+                    # Keep the reads of this run and the prefetch - 1 unknown runs before it in flight
+                    executor = _get_executor()
+                    for ahead in range(number, max(number - self._prefetch, lowest - 1), -1):
+                        if ahead not in prefetched and not is_known(ahead):
+                            prefetched[ahead] = executor.submit(self._read_title, path_of(ahead))
+                    yield number, prefetched.pop(number).result()
+        finally:
+            for future in prefetched.values():
+                future.cancel()
+
+    def get_runs_to_stitch(self, run_path: Path, run_number: int, run_title: str) -> list[int]:
+        """
+        Return the run numbers of the series ending at the run, newest first
+        :param run_path: The path of the run's nexus file
+        :param run_number: The run number
+        :param run_title: The run title
+        :return: The run numbers, including the run's own if its file exists
+        """
+        directory = run_path.parent
+        # Earlier runs are named as this run is, so older files named after the instrument are walked correctly
+        parsed = parse_nexus_path(run_path)
+        scheme = self._scheme if parsed is None else parsed.scheme
+        with self._lock:
+            previous = self._series.get(directory)
+        known = previous.titles if previous is not None and previous.latest == run_number - 1 else []
+        if not known:
+            logger.info("Walking %s back from run %s", directory, run_number)
+
+        series = OpenSeries(run_number)
+        run_numbers = []
+        titles = self._titles(run_path, run_number, known, scheme)
+        try:
+            for number, title in titles:
+                series.titles.append(title)
+                if title is None or not self._is_same_series(title, run_title):
+                    break
+                run_numbers.append(number)
+            else:
+                logger.warning("Stopped stitching run %s after the maximum of %s runs", run_number, self._max_lookback)
+        finally:
+            titles.close()
+
+        with self._lock:
+            self._series.pop(directory, None)
+            self._series[directory] = series
+            while len(self._series) > self._max_directories:
+                self._series.popitem(last=False)
+        logger.info("Series ending at run %s: %s", run_number, run_numbers)
+        return run_numbers
@@ -0,0 +1,169 @@
+"""
+Cache of the stats of archive paths, so the stitch rules probing for earlier runs do not repeat lookups on the network
+mounted archive. Negative lookups are the slowest on the mount, and always end a stitch walk, so missing paths are
+cached too, for a shorter time and only while their directory is unchanged
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+import typing
+from collections import OrderedDict
+
+if typing.TYPE_CHECKING:
+    from collections.abc import Iterable
+    from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+STAT_CACHE_SIZE = int(os.environ.get("STAT_CACHE_SIZE", "4096"))
+STAT_CACHE_TTL_SECONDS = float(os.environ.get("STAT_CACHE_TTL_SECONDS", "60"))
+STAT_CACHE_NEGATIVE_TTL_SECONDS = float(os.environ.get("STAT_CACHE_NEGATIVE_TTL_SECONDS", "5"))
+
+# The stat of a path known to exist from a directory listing, without having been stat'd itself
+LISTED: typing.Final = "listed"
+
+
+def _stat(path: Path) -> os.stat_result | None:
+    try:
+        return path.stat()
+    except (FileNotFoundError, NotADirectoryError):
+        return None
+
+
+def _mtime_ns(path: Path) -> int | None:
+    stat = _stat(path)
+    return None if stat is None else stat.st_mtime_ns
+
+
+class StatCache:
+    """
+    Bounded, thread safe LRU of path stats. Paths that exist are cached for the TTL. Missing paths are cached for the
+    negative TTL along with their directory's mtime, and are only trusted while the directory's mtime is unchanged, so
+    a run written since is never missed. Checking a missing path therefore still stats its directory, which on the
+    archive is much cheaper than the failed lookup. The negative TTL bounds how long a run written within the
+    directory's mtime granularity of the lookup, or while it was made, can be missed
+    """
+
+    def __init__(self, max_size: int, ttl: float, negative_ttl: float) -> None:
+        self._max_size = max_size
+        self._ttl = ttl
+        self._negative_ttl = negative_ttl
+        self._lock = threading.Lock()
+        # path -> (stat, LISTED, or None if missing; the directory mtime if missing; expiry)
+        self._entries: OrderedDict[Path, tuple[os.stat_result | str | None, int | None, float]] = OrderedDict()
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def hit_rate(self) -> float:
+        """
+        The fraction of lookups answered from the cache, positive or negative
+        """
+        lookups = self.hits + self.negative_hits + self.misses
+        return (self.hits + self.negative_hits) / lookups if lookups else 0.0
+
+    def _put(self, path: Path, stat: os.stat_result | str | None, directory_mtime_ns: int | None) -> None:
+        expires = time.monotonic() + (self._negative_ttl if stat is None else self._ttl)
+        with self._lock:
+            self._entries[path] = (stat, directory_mtime_ns, expires)
+            self._entries.move_to_end(path)
+            while len(self._entries) > self._max_size:
+                self._entries.popitem(last=False)
+
+    def _lookup(self, path: Path, need_stat: bool) -> os.stat_result | str | None:
+        """
+        Return the path's stat from the cache if it is still valid, otherwise from the filesystem
+        :param path: The path
+        :param need_stat: Whether a path known to exist only from a listing must be stat'd
+        :return: The stat, LISTED, or None if the path does not exist
+        """
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry[2] <= time.monotonic():
+                del self._entries[path]
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(path)
+        if entry is not None:
+            stat, directory_mtime_ns, _ = entry
+            if stat is not None and not (need_stat and stat == LISTED):
+                with self._lock:
+                    self.hits += 1
+                return stat
+            if stat is None and _mtime_ns(path.parent) == directory_mtime_ns:
+                with self._lock:
+                    self.negative_hits += 1
+                return None
+        with self._lock:
+            self.misses += 1
+        stat = _stat(path)
+        # Only missing paths need their directory's mtime. A run written between the two lookups is missed for at most
+        # the negative TTL
+        self._put(path, stat, _mtime_ns(path.parent) if stat is None else None)
+        return stat
+
+    def stat(self, path: Path) -> os.stat_result | None:
+        """
+        Return the stat of the path
+        :param path: The path
+        :return: The stat, or None if the path does not exist
+        """
+        stat = self._lookup(path, need_stat=True)
+        return stat if not isinstance(stat, str) else None
+
+    def exists(self, path: Path) -> bool:
+        """
+        Whether the path exists
+        :param path: The path
+        :return: True if the path exists
+        """
+        return self._lookup(path, need_stat=False) is not None
+
+    def add_listed(self, paths: Iterable[Path]) -> None:
+        """
+        Record paths found listing their directory as existing, without stat'ing them
+        :param paths: The listed paths
+        :return: None
+        """
+        for path in paths:
+            self._put(path, LISTED, None)
+
+    def clear(self) -> None:
+        """
+        Remove every entry and reset the counters
+        :return: None
+        """
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.negative_hits = 0
+            self.misses = 0
+
+
+_stat_cache = StatCache(STAT_CACHE_SIZE, STAT_CACHE_TTL_SECONDS, STAT_CACHE_NEGATIVE_TTL_SECONDS)
+
+
+def get_stat_cache() -> StatCache | None:
+    """
+    Return the process wide stat cache, or None if STAT_CACHE_SIZE is 0
+    :return: The stat cache
+    """
+    return _stat_cache if STAT_CACHE_SIZE > 0 else None
+
+
+def path_exists(path: Path) -> bool:
+    """
+    Whether the path exists, checking the stat cache if it is enabled
+    :param path: The path
+    :return: True if the path exists
+    """
+    stat_cache = get_stat_cache()
+    return path.exists() if stat_cache is None else stat_cache.exists(path)
@@ -2,9 +2,9 @@
 Module for inter specific rules
 """
 
-from rundetection.ingestion.ingest import get_sibling_runs
+from rundetection.ingestion.run_index import RunIndex
 from rundetection.job_requests import JobRequest
-from rundetection.rules.rule import Rule
+from rundetection.rules.rule import ARCHIVE_IO, Rule
 
 
 class InterStitchRule(Rule[bool]):
@@ -12,6 +12,9 @@ class InterStitchRule(Rule[bool]):
     Rule for collecting each related inter run and including them into the additional values
     """
 
+    cost = ARCHIVE_IO
+    provides = frozenset({"additional_files"})
+
     @staticmethod
     def _get_run_group(job_request: JobRequest) -> str:
         """
@@ -23,7 +26,8 @@ class InterStitchRule(Rule[bool]):
         return job_request.experiment_title[0:index]
 
     def verify(self, job_request: JobRequest) -> None:
-        sibling_runs = get_sibling_runs(job_request.filepath)
-        run_group = self._get_run_group(job_request)
-        additional_files = [str(run_.filepath) for run_ in sibling_runs if self._get_run_group(run_) == run_group]
-        job_request.additional_values["additional_files"] = additional_files
+        related_runs = _run_index.get_related_runs(job_request)
+        job_request.additional_values["additional_files"] = [str(path) for path in related_runs]
+
+
+_run_index = RunIndex(InterStitchRule._get_run_group)
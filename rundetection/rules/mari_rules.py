@@ -5,12 +5,14 @@ Mari Rules
 import json
 import logging
 from copy import deepcopy
+from importlib import resources
 from pathlib import Path
 from typing import Any
 
-from rundetection.ingestion.ingest import get_run_title
+from rundetection.ingestion.filenames import get_scheme
+from rundetection.ingestion.run_series import RunSeriesTracker
 from rundetection.job_requests import JobRequest
-from rundetection.rules.rule import Rule
+from rundetection.rules.rule import ARCHIVE_IO, Rule
 
 logger = logging.getLogger(__name__)
 
@@ -20,20 +22,17 @@ class MariStitchRule(Rule[bool]):
     The MariStitchRule is the rule that applies
     """
 
+    cost = ARCHIVE_IO
+    provides = frozenset({"runno", "sum_runs", "mask_file_link", "wbvan"})
+    copies_request = True
+
     def __init__(self, value: bool) -> None:
         super().__init__(value)
         self._spec_values = self._load_mari_spec()
 
     @staticmethod
     def _get_runs_to_stitch(run_path: Path, run_number: int, run_title: str) -> list[int]:
-        run_numbers = []
-        while run_path.exists():
-            if get_run_title(run_path) != run_title:
-                break
-            run_numbers.append(run_number)
-            run_number -= 1
-            run_path = Path(run_path.parent, f"MAR{run_number}.nxs")
-        return run_numbers
+        return _run_series.get_runs_to_stitch(run_path, run_number, run_title)
 
     @staticmethod
     def _load_mari_spec() -> Any:
@@ -42,7 +41,7 @@ class MariStitchRule(Rule[bool]):
         :return: Mari spec as dict
         """
         try:
-            path = Path("rundetection/specifications/mari_specification.json")
+            path = resources.files("rundetection") / "specifications" / "mari_specification.json"
             with path.open(encoding="utf-8") as spec_file:
                 return json.load(spec_file)
         except FileNotFoundError as exc:
@@ -67,11 +66,16 @@ class MariStitchRule(Rule[bool]):
             job_request.additional_requests.append(additional_request)
 
 
+_run_series = RunSeriesTracker(get_scheme("MARI"), str.__eq__)
+
+
 class MariMaskFileRule(Rule[str]):
     """
     Adds the permalink of the maskfile to the additional outputs
     """
 
+    provides = frozenset({"mask_file_link"})
+
     def verify(self, job_request: JobRequest) -> None:
         job_request.additional_values["mask_file_link"] = self._value
 
@@ -82,5 +86,7 @@ class MariWBVANRule(Rule[int]):
     once per cycle.
     """
 
+    provides = frozenset({"wbvan"})
+
     def verify(self, job_request: JobRequest) -> None:
         job_request.additional_values["wbvan"] = self._value
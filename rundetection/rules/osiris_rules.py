@@ -7,15 +7,21 @@ from __future__ import annotations
 import logging
 import typing
 from copy import deepcopy
-from pathlib import Path
+
+import numpy as np
 
 from rundetection.exceptions import RuleViolationError
-from rundetection.ingestion.ingest import get_run_title
-from rundetection.rules.rule import Rule
+from rundetection.ingestion.filenames import get_scheme
+from rundetection.ingestion.run_series import RunSeriesTracker
+from rundetection.rules.rule import ARCHIVE_IO, COMPUTE, Rule
 
 if typing.TYPE_CHECKING:
+    from collections.abc import Sequence
+    from pathlib import Path
     from typing import ClassVar, Literal
 
+    from numpy.typing import ArrayLike, NDArray
+
     from rundetection.job_requests import JobRequest
 
 logger = logging.getLogger(__name__)
@@ -32,11 +38,45 @@ def is_y_within_5_percent_of_x(x: int | float, y: int | float) -> bool:
     return (y * 0.95 <= x <= y * 1.05) if y >= 0 else (y * 0.95 >= x >= y * 1.05)
 
 
+class ToleranceTable:
+    """
+    A table of reference rows, precompiled into the bounds each value must fall within to be within 5% of the
+    reference, as is_y_within_5_percent_of_x. Matching a run, or a batch of runs, is then a vectorised comparison
+    against every row at once
+    """
+
+    def __init__(self, rows: Sequence[Sequence[float]]) -> None:
+        references = np.asarray(rows, dtype=np.float64)
+        self._lower = np.minimum(references * 0.95, references * 1.05)
+        self._upper = np.maximum(references * 0.95, references * 1.05)
+
+    def matches(self, values: ArrayLike) -> NDArray[np.bool_]:
+        """
+        Match values against every row
+        :param values: One run's values, in the order of the row columns, or a batch of runs with one run per row
+        :return: Whether each row matches, with a leading batch dimension if a batch was given
+        """
+        values = np.asarray(values, dtype=np.float64)[..., np.newaxis, :]
+        return np.all((self._lower <= values) & (values <= self._upper), axis=-1)  # type: ignore[no-any-return]
+
+    def first_match(self, values: ArrayLike) -> NDArray[np.intp]:
+        """
+        Find the first matching row
+        :param values: One run's values, or a batch of runs
+        :return: The index of the first matching row, or -1 if none match, for each run
+        """
+        matches = self.matches(values)
+        return np.where(matches.any(axis=-1), matches.argmax(axis=-1), -1)
+
+
 class OsirisReductionModeRule(Rule[bool]):
     """
     Determines the type of reduction to produce (spectroscopy or diffraction)
     """
 
+    cost = COMPUTE
+    provides = frozenset({"mode", "sum_runs"})
+
     # The spec phase tuples are (<phase6>, <phase10>) for the next 2 arrays Based on the PDF available here:
     # https://www.isis.stfc.ac.uk/Pages/osiris-user-guide.pdf.
     SPECTROSCOPY_PHASES: ClassVar[list[tuple[int, int]]] = [
@@ -66,19 +106,16 @@ class OsirisReductionModeRule(Rule[bool]):
         (32144, 13367),
     ]
 
+    SPECTROSCOPY_TABLE: ClassVar[ToleranceTable] = ToleranceTable(SPECTROSCOPY_PHASES)
+    DIFFRACTION_TABLE: ClassVar[ToleranceTable] = ToleranceTable(DIFFRACTION_PHASES)
+
     def _is_spec_phase(self, phase10: float, phase6: float) -> bool:
-        for phases in self.SPECTROSCOPY_PHASES:
-            # if the runs phase 6 and phase 10 are within 5% of the valid spec phases, return True
-            if is_y_within_5_percent_of_x(phase6, phases[0]) and is_y_within_5_percent_of_x(phase10, phases[1]):
-                return True
-        return False
+        # if the runs phase 6 and phase 10 are within 5% of any valid spec phases, return True
+        return bool(self.SPECTROSCOPY_TABLE.matches((phase6, phase10)).any())
 
     def _is_diff_phase(self, phase10: float, phase6: float) -> bool:
-        for phases in self.DIFFRACTION_PHASES:
-            # if the runs phase 6 and phase 10 are within 5% of the valid spec phases, return True
-            if is_y_within_5_percent_of_x(phase6, phases[0]) and is_y_within_5_percent_of_x(phase10, phases[1]):
-                return True
-        return False
+        # if the runs phase 6 and phase 10 are within 5% of any valid diffraction phases, return True
+        return bool(self.DIFFRACTION_TABLE.matches((phase6, phase10)).any())
 
     def _determine_mode(
         self, phase10: float, phase6: float, freq: int, detector_tcb_min: float, detector_tcb_max: float
@@ -129,6 +166,10 @@ class OsirisAnalyserRule(Rule[bool]):
     Determines the analyser
     """
 
+    cost = COMPUTE
+    requires = frozenset({"mode"})
+    provides = frozenset({"analyser"})
+
     # This map is based on the Appendix 1 - Quasi / inelastic settings pdf. It is reduced as the values for
     # frequency < 50 are removed as they default to analyser 2
     # available here https://www.isis.stfc.ac.uk/Pages/osiris-user-guide.pdf
@@ -142,18 +183,26 @@ class OsirisAnalyserRule(Rule[bool]):
         (20500.0, 40500.0, 16700.0, 36700.0): 4,
     }
 
+    ANALYSER_TABLE: ClassVar[ToleranceTable] = ToleranceTable(list(REDUCED_ANALYSER_TIME_CHANNEL_MAP))
+    ANALYSERS: ClassVar[NDArray[np.int_]] = np.array([*REDUCED_ANALYSER_TIME_CHANNEL_MAP.values(), 0])
+
+    @classmethod
+    def determine_analysers(cls, tcb_values: ArrayLike) -> NDArray[np.int_]:
+        """
+        Determine the analysers of a batch of runs from their time channel boundaries
+        :param tcb_values: One row per run of detector min, detector max, monitor min and monitor max
+        :return: The analyser of each run, or 0 where it cannot be determined
+        """
+        # -1 for no match indexes the trailing 0
+        return cls.ANALYSERS[cls.ANALYSER_TABLE.first_match(tcb_values)]
+
     def _determine_analyser_from_tcb_values(
         self, tcb_detector_min: float, tcb_detector_max: float, tcb_monitor_min: float, tcb_monitor_max: float
     ) -> int:
-        for bounds, analyser in self.REDUCED_ANALYSER_TIME_CHANNEL_MAP.items():
-            if (
-                is_y_within_5_percent_of_x(tcb_detector_min, bounds[0])
-                and is_y_within_5_percent_of_x(tcb_detector_max, bounds[1])
-                and is_y_within_5_percent_of_x(tcb_monitor_min, bounds[2])
-                and is_y_within_5_percent_of_x(tcb_monitor_max, bounds[3])
-            ):
-                return analyser
-        raise RuleViolationError("Analyser cannot be determined")
+        analyser = int(self.determine_analysers((tcb_detector_min, tcb_detector_max, tcb_monitor_min, tcb_monitor_max)))
+        if analyser == 0:
+            raise RuleViolationError("Analyser cannot be determined")
+        return analyser
 
     def verify(self, job_request: JobRequest) -> None:
         if not self._value:
@@ -179,6 +228,8 @@ class OsirisPanadiumRule(Rule[int]):
     Inserts the cycles panadium number into the request. This value is manually calcuated once per cycle
     """
 
+    provides = frozenset({"panadium"})
+
     def verify(self, job_request: JobRequest) -> None:
         job_request.additional_values["panadium"] = self._value
 
@@ -188,6 +239,11 @@ class OsirisStitchRule(Rule[bool]):
     Enables Osiris Run stitching
     """
 
+    cost = ARCHIVE_IO
+    requires = frozenset({"mode"})
+    provides = frozenset({"input_runs", "sum_runs"})
+    copies_request = True
+
     @staticmethod
     def _is_title_similar(title: str, other_title: str) -> bool:
         """
@@ -207,19 +263,7 @@ class OsirisStitchRule(Rule[bool]):
         return False
 
     def _get_runs_to_stitch(self, run_path: Path, run_number: int, run_title: str) -> list[int]:
-        run_numbers = []
-        while run_path.exists():
-            logger.info("run path exists %s", run_path)
-            if not self._is_title_similar(get_run_title(run_path), run_title):
-                logger.info("titles not similar")
-                break
-            logger.info("titles are similar appending run number %s", run_number)
-            run_numbers.append(run_number)
-            run_number -= 1
-            run_path = Path(run_path.parent, f"OSIRIS{run_number:08d}.nxs")
-        logger.info("Run path %s does not exist", run_path)
-        logger.info("Returning run numbers %s", run_numbers)
-        return run_numbers
+        return _run_series.get_runs_to_stitch(run_path, run_number, run_title)
 
     def verify(self, job_request: JobRequest) -> None:
         if not self._value:  # if the stitch rule is set to false, skip
@@ -245,10 +289,15 @@ class OsirisStitchRule(Rule[bool]):
             job_request.additional_requests.append(additional_request)
 
 
+_run_series = RunSeriesTracker(get_scheme("OSIRIS"), OsirisStitchRule._is_title_similar)
+
+
 class OsirisCalibrationRule(Rule[str]):
     """
     Sets the calibration file path
     """
 
+    provides = frozenset({"calibration_file_path"})
+
     def verify(self, job_request: JobRequest) -> None:
         job_request.additional_values["calibration_file_path"] = self._value
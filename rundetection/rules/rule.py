@@ -3,21 +3,38 @@ Module containing the abstract base Rule class and MissingRuleError
 """
 
 from abc import ABC, abstractmethod
-from typing import Generic, TypeVar
+from typing import ClassVar, Generic, TypeVar
 
 from rundetection.job_requests import JobRequest
 
 T = TypeVar("T")
 
 
+# Relative costs, used to run cheap rules that may veto a run before expensive ones
+CHEAP = 0
+COMPUTE = 1
+ARCHIVE_IO = 100
+
+
 class Rule(Generic[T], ABC):
     """
-    Abstract Rule, implement to define a rule that must be followed to allow a reduction to be run on a nexus file
+    Abstract Rule, implement to define a rule that must be followed to allow a reduction to be run on a nexus file.
+    Subclasses declare their relative cost, the additional values they read and write, and whether they copy the job
+    request, which the specification uses to order its rules
     """
 
+    cost: ClassVar[int] = CHEAP
+    requires: ClassVar[frozenset[str]] = frozenset()
+    provides: ClassVar[frozenset[str]] = frozenset()
+    # Rules that copy the job request into additional requests must run after every rule that provides a value
+    copies_request: ClassVar[bool] = False
+
     def __init__(self, value: T):
         self._value: T = value
 
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self._value!r})"
+
     @abstractmethod
     def verify(self, job_request: JobRequest) -> None:
         """
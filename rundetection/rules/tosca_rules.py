@@ -4,9 +4,10 @@ import logging
 from copy import deepcopy
 from pathlib import Path
 
-from rundetection.ingestion.ingest import get_run_title
+from rundetection.ingestion.filenames import get_scheme
+from rundetection.ingestion.run_series import RunSeriesTracker
 from rundetection.job_requests import JobRequest
-from rundetection.rules.rule import Rule
+from rundetection.rules.rule import ARCHIVE_IO, Rule
 
 logger = logging.getLogger(__name__)
 
@@ -16,6 +17,10 @@ class ToscaStitchRule(Rule[bool]):
     Rule for stitching TOSCA Runs
     """
 
+    cost = ARCHIVE_IO
+    provides = frozenset({"input_runs"})
+    copies_request = True
+
     @staticmethod
     def _is_title_similar(title: str, other_title: str) -> bool:
         """
@@ -31,15 +36,7 @@ class ToscaStitchRule(Rule[bool]):
         return False
 
     def _get_runs_to_stitch(self, run_path: Path, run_number: int, run_title: str) -> list[int]:
-        run_numbers = []
-        while run_path.exists():
-            if not self._is_title_similar(get_run_title(run_path), run_title):
-                logger.info("titles not similar")
-                break
-            run_numbers.append(run_number)
-            run_number -= 1
-            run_path = Path(run_path.parent, f"TSC{run_number}.nxs")
-        return run_numbers
+        return _run_series.get_runs_to_stitch(run_path, run_number, run_title)
 
     def verify(self, job_request: JobRequest) -> None:
         if not self._value:  # if the stitch rule is set to false, skip
@@ -54,3 +51,6 @@ class ToscaStitchRule(Rule[bool]):
             additional_request = deepcopy(job_request)
             additional_request.additional_values["input_runs"] = run_numbers
             job_request.additional_requests.append(additional_request)
+
+
+_run_series = RunSeriesTracker(get_scheme("TOSCA"), ToscaStitchRule._is_title_similar)
@@ -4,28 +4,39 @@ Main module for run detection
 
 from __future__ import annotations
 
+import argparse
 import logging
+import multiprocessing
 import os
 import sys
 import time
 import typing
-from contextlib import contextmanager
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from functools import partial
 from pathlib import Path
 from queue import SimpleQueue
 
-from pika import BlockingConnection, ConnectionParameters, PlainCredentials  # type: ignore
-
 from rundetection.exceptions import ReductionMetadataError
-from rundetection.ingestion.ingest import ingest
-from rundetection.specifications import InstrumentSpecification
+from rundetection.ingestion.archive_index import start_archive_index
+from rundetection.ingestion.ingest import get_run_title, ingest, instrument_from_path
+from rundetection.ingestion.stat_cache import path_exists
+from rundetection.specifications import (
+    get_reload_generation,
+    get_specification,
+    is_instrument_enabled,
+    load_specifications,
+    share_reload_generation,
+)
+from rundetection.transports.pika_transport import PikaTransport
 
 if typing.TYPE_CHECKING:
-    from collections.abc import Generator
-    from typing import Any
-
-    from pika.adapters.blocking_connection import BlockingChannel  # type: ignore
+    import ctypes
+    from collections.abc import Callable
+    from concurrent.futures import Executor
 
     from rundetection.job_requests import JobRequest
+    from rundetection.transports.transport import Transport
 
 file_handler = logging.FileHandler(filename="run-detection.log")
 stdout_handler = logging.StreamHandler(stream=sys.stdout)
@@ -39,56 +50,59 @@ logging.getLogger("pika").setLevel(logging.WARNING)
 
 INGRESS_QUEUE_NAME = os.environ.get("INGRESS_QUEUE_NAME", "watched-files")
 EGRESS_QUEUE_NAME = os.environ.get("EGRESS_QUEUE_NAME", "scheduled-jobs")
+INGRESS_PREFETCH_COUNT = int(os.environ.get("INGRESS_PREFETCH_COUNT", "0"))
+INGRESS_BATCH_SIZE = int(os.environ.get("INGRESS_BATCH_SIZE", "1"))
+HEARTBEAT_INTERVAL_SECONDS = float(os.environ.get("HEARTBEAT_INTERVAL_SECONDS", "5"))
+INGEST_WORKERS = int(os.environ.get("INGEST_WORKERS", "0"))
+NACK_BACKOFF_SECONDS = float(os.environ.get("NACK_BACKOFF_SECONDS", "0.5"))
+NACK_BACKOFF_MAX_SECONDS = float(os.environ.get("NACK_BACKOFF_MAX_SECONDS", "30"))
+MAX_TRACKED_FAILURES = 1024
 
 
-def get_channel(exchange_name: str, queue_name: str) -> BlockingChannel:
+def _init_ingest_worker(reload_generation: ctypes.c_int) -> None:
     """
-    Given an exchange and queue name, return a blocking channel to the exchange and queue
-    :param exchange_name: The exchange name
-    :param queue_name: The queue name
-    :return: The Blocking Channel
+    Set up an ingest worker process
+    :param reload_generation: The consumer's specification reload generation
+    :return: None
     """
-    credentials = PlainCredentials(
-        username=os.environ.get("QUEUE_USER", "guest"), password=os.environ.get("QUEUE_PASSWORD", "guest")
-    )
-    connection_parameters = ConnectionParameters(
-        os.environ.get("QUEUE_HOST", "localhost"), 5672, credentials=credentials
-    )
-    connection = BlockingConnection(connection_parameters)
-    channel = connection.channel()
-    channel.exchange_declare(exchange_name, exchange_type="direct", durable=True)
-    channel.queue_declare(queue_name, durable=True, arguments={"x-queue-type": "quorum"})
-    channel.queue_bind(queue_name, exchange_name, routing_key="")
-    return channel
+    share_reload_generation(reload_generation)
+    start_archive_index(get_run_title)
 
 
-@contextmanager
-def producer() -> Generator[BlockingChannel | BlockingChannel, Any, None]:
+def create_ingest_executor(max_workers: int) -> ProcessPoolExecutor:
     """
-    Return a context managed pika producer channel
-    :return: BlockingChannel
+    Return a pool of ingest worker processes, each running its own archive index as the consumer's is not shared with
+    them, and reloading its specifications whenever the consumer does. The workers are spawned rather than forked from
+    the consumer, as a worker forked while another thread, such as the archive index, holds h5py's global lock would
+    deadlock. A forkserver is not used as it cannot be shared with the prefork consumers
+    :param max_workers: The number of worker processes
+    :return: The executor
     """
-    logger.info("Creating producer...")
-    channel = get_channel("scheduled-jobs", "scheduled-jobs")
-    yield channel
-    logger.info("Closing producer channel and connection...")
-    channel.close()
-    channel.connection.close()
-    logger.info("Producer closed.")
+    return ProcessPoolExecutor(
+        max_workers=max_workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_ingest_worker,
+        initargs=(get_reload_generation(),),
+    )
 
 
 def process_message(message: str, notification_queue: SimpleQueue[JobRequest]) -> None:
     """
     Process the incoming message. If the message should result in an upstream notification, it will put the message on
-    the given notification queue
+    the given notification queue. Files for disabled instruments, recognised by their path, are skipped without being
+    opened
     :param message: The message to process
     :param notification_queue: The notification queue to update
     :return: None
     """
     logger.info("Proccessing message: %s", message)
     data_path = Path(message)
+    instrument = instrument_from_path(data_path)
+    if instrument is not None and is_instrument_enabled(instrument) is False:
+        logger.info("Instrument %s is not enabled, skipping file: %s", instrument, data_path)
+        return
     run = ingest(data_path)
-    specification = InstrumentSpecification(run.instrument)
+    specification = get_specification(run.instrument)
     specification.verify(run)
     if run.will_reduce:
         logger.info("specification met for run: %s", run)
@@ -99,96 +113,315 @@ def process_message(message: str, notification_queue: SimpleQueue[JobRequest]) -
         logger.info("Specification not met, skipping run: %s", run)
 
 
-def process_messages(channel: BlockingChannel, notification_queue: SimpleQueue[JobRequest]) -> None:
+def detect(message: str) -> list[JobRequest]:
     """
-    Given a list of messages and the notification queue, process each message, adding those which meet specifications to
-    the notification queue
-    :param channel: The channel for consuming from
-    :param notification_queue: The notification queue
+    Run process_message for one message and return the job requests it produced. This is the unit of work handed to
+    an executor, so it must stay a picklable module level function
+    :param message: The message to process
+    :return: The job requests to publish
+    """
+    notification_queue: SimpleQueue[JobRequest] = SimpleQueue()
+    process_message(message, notification_queue)
+    job_requests = []
+    while not notification_queue.empty():
+        job_requests.append(notification_queue.get())
+    return job_requests
+
+
+def ack_messages(transport: Transport, delivery_tag: int | None) -> None:
+    """
+    Ack every outstanding message up to and including the given delivery tag
+    :param transport: The transport the messages were consumed from
+    :param delivery_tag: The delivery tag to ack up to, if None nothing is acked
     :return: None
     """
-    for method_frame, _, body in channel.consume(INGRESS_QUEUE_NAME, inactivity_timeout=5):
-        try:
-            process_message(body.decode(), notification_queue)
-            logger.info("Acking message %s", method_frame.delivery_tag)
-            channel.basic_ack(method_frame.delivery_tag)
-        except ReductionMetadataError as exc:
-            logger.exception("Problem with metadata, cannot reduce, skipping message", exc_info=exc)
-            channel.basic_ack(method_frame.delivery_tag)
-        except AttributeError:  # If the message frame or body is missing attributes required e.g. the delivery tag
-            pass
-        except Exception as exc:
-            logger.exception("Problem processing message: %s", body, exc_info=exc)
-            logger.info("Nacking message %s", method_frame.delivery_tag)
-            channel.basic_nack(method_frame.delivery_tag)
-        break
-
-
-def process_notifications(notification_queue: SimpleQueue[JobRequest]) -> None:
+    if delivery_tag is None:
+        return
+    logger.info("Acking messages up to %s", delivery_tag)
+    transport.ack(delivery_tag, multiple=True)
+
+
+def process_notifications(notification_queue: SimpleQueue[JobRequest], transport: Transport) -> None:
     """
     Produce messages until the notification queue is empty
     :param notification_queue: The notification queue
+    :param transport: The transport to publish with
     :return: None
     """
     logger.info("Checking notification queue...")
     while not notification_queue.empty():
         detected_run = notification_queue.get()
         logger.info("Sending notification for run: %s", detected_run.run_number)
-
-        with producer() as channel:
-            channel.basic_publish(EGRESS_QUEUE_NAME, "", detected_run.to_json_string().encode())
+        transport.publish(EGRESS_QUEUE_NAME, detected_run.to_json_string().encode())
     logger.info("Notification queue empty. Continuing...")
 
 
+class NackBackoff:
+    """
+    Counts how many times in a row each message has failed. A failed message is nacked and requeued, so a message
+    that always fails, e.g. for a file not yet fully written, would otherwise be redelivered straight away in a tight
+    loop. The first failure is nacked at once. After that the nack is delayed by a backoff that doubles with each
+    failure, up to a maximum
+    """
+
+    def __init__(
+        self,
+        initial: float = NACK_BACKOFF_SECONDS,
+        maximum: float = NACK_BACKOFF_MAX_SECONDS,
+        max_tracked: int = MAX_TRACKED_FAILURES,
+    ) -> None:
+        self._initial = initial
+        self._maximum = maximum
+        self._max_tracked = max_tracked
+        self._failures: OrderedDict[bytes, int] = OrderedDict()
+
+    def failed(self, body: bytes) -> float:
+        """
+        Record that the message failed
+        :param body: The message body
+        :return: The number of seconds to wait before nacking it
+        """
+        failures = self._failures.pop(body, 0) + 1
+        self._failures[body] = failures
+        while len(self._failures) > self._max_tracked:
+            self._failures.popitem(last=False)
+        if failures == 1:
+            return 0.0
+        # The exponent is capped so a message that has failed many times cannot overflow the float
+        return min(self._initial * 2.0 ** min(failures - 2, 32), self._maximum)
+
+    def succeeded(self, body: bytes) -> None:
+        """
+        Forget the failures of a message that has been handled
+        :param body: The message body
+        :return: None
+        """
+        self._failures.pop(body, None)
+
+
 def write_readiness_probe_file() -> None:
     """
-    Write the file with the timestamp for the readinessprobe
+    Write the file with the timestamp for the readinessprobe. The path is read from READINESS_PROBE_FILE on each write
+    so that prefork children can each be given their own file
     :return: None
     """
-    path = Path("/tmp/heartbeat")  # noqa: S108
+    path = Path(os.environ.get("READINESS_PROBE_FILE", "/tmp/heartbeat"))  # noqa: S108
     with path.open("w", encoding="utf-8") as file:
         file.write(time.strftime("%Y-%m-%d %H:%M:%S"))
 
 
+class Consumer:
+    """
+    Event driven consumer. Messages are detected as soon as they are delivered, either inline or on an ingest worker
+    pool. Results are handled in delivery order, so that once a batch is full, or the transport has dispatched
+    everything it has received, the notifications can be published and the batch acked up to its last delivery tag.
+    While a failed message is waiting out its backoff to be nacked, the batch is acked message by message instead, so
+    the failed message is not acked with it. The readiness probe is written from a timer so an idle consumer does not
+    need to wake up.
+    """
+
+    def __init__(
+        self,
+        transport: Transport,
+        batch_size: int = INGRESS_BATCH_SIZE,
+        heartbeat_interval: float = HEARTBEAT_INTERVAL_SECONDS,
+        executor: Executor | None = None,
+    ) -> None:
+        self._transport = transport
+        self._batch_size = batch_size
+        self._heartbeat_interval = heartbeat_interval
+        self._executor = executor
+        self._in_flight: deque[tuple[int, bytes, Future[list[JobRequest]]]] = deque()
+        self._notification_queue: SimpleQueue[JobRequest] = SimpleQueue()
+        self._last_delivery_tag: int | None = None
+        self._batch_delivery_tags: list[int] = []
+        self._batch_count = 0
+        self._backoff = NackBackoff()
+        self._pending_nacks: set[int] = set()
+        self._running = False
+
+    def on_message(self, delivery_tag: int, body: bytes) -> None:
+        """
+        Start detection for a delivered message. Without an executor the message is detected straight away, otherwise
+        it is submitted to the worker pool and handled when the worker finishes
+        :param delivery_tag: The delivery tag of the message
+        :param body: The message body
+        :return: None
+        """
+        future: Future[list[JobRequest]]
+        if self._executor is None:
+            future = Future()
+            try:
+                future.set_result(detect(body.decode()))
+            except Exception as exc:
+                future.set_exception(exc)
+        else:
+            future = self._executor.submit(detect, body.decode())
+            future.add_done_callback(self._on_detected)
+        self._in_flight.append((delivery_tag, body, future))
+        self._handle_results()
+
+    def _on_detected(self, _: Future[list[JobRequest]]) -> None:
+        # Called from the executor's thread, so hand back to the transport's thread
+        self._transport.call_threadsafe(self._handle_results)
+
+    def _handle_results(self) -> None:
+        """
+        Handle finished detections in delivery order, stopping at the first that is still running. Failed messages are
+        nacked after their backoff, the others are acked with the rest of their batch once its notifications are
+        published
+        :return: None
+        """
+        while self._in_flight and self._in_flight[0][2].done():
+            delivery_tag, body, future = self._in_flight.popleft()
+            try:
+                for job_request in future.result():
+                    self._notification_queue.put(job_request)
+                self._add_to_batch(delivery_tag, body)
+            except ReductionMetadataError as exc:
+                logger.exception("Problem with metadata, cannot reduce, skipping message", exc_info=exc)
+                self._add_to_batch(delivery_tag, body)
+            except Exception as exc:
+                logger.exception("Problem processing message: %s", body, exc_info=exc)
+                delay = self._backoff.failed(body)
+                if delay > 0:
+                    logger.info("Nacking message %s in %s seconds", delivery_tag, delay)
+                    self._pending_nacks.add(delivery_tag)
+                    self._transport.call_later(delay, partial(self._nack, delivery_tag))
+                else:
+                    self._nack(delivery_tag)
+            self._batch_count += 1
+            if self._batch_count >= self._batch_size:
+                self.flush()
+
+    def _add_to_batch(self, delivery_tag: int, body: bytes) -> None:
+        self._backoff.succeeded(body)
+        self._last_delivery_tag = delivery_tag
+        self._batch_delivery_tags.append(delivery_tag)
+
+    def _nack(self, delivery_tag: int) -> None:
+        logger.info("Nacking message %s", delivery_tag)
+        self._pending_nacks.discard(delivery_tag)
+        self._transport.nack(delivery_tag)
+
+    def flush(self) -> None:
+        """
+        Publish the notifications for the current batch, then ack it
+        :return: None
+        """
+        if self._batch_count == 0:
+            return
+        process_notifications(self._notification_queue, self._transport)
+        if self._pending_nacks:
+            for delivery_tag in self._batch_delivery_tags:
+                self._transport.ack(delivery_tag)
+        else:
+            ack_messages(self._transport, self._last_delivery_tag)
+        self._last_delivery_tag = None
+        self._batch_delivery_tags = []
+        self._batch_count = 0
+
+    def _heartbeat(self) -> None:
+        write_readiness_probe_file()
+        self._transport.call_later(self._heartbeat_interval, self._heartbeat)
+
+    def run(self) -> None:
+        """
+        Consume from the ingress queue until stopped, blocking until the transport has events to dispatch
+        :return: None
+        """
+        self._transport.consume(INGRESS_QUEUE_NAME, self.on_message)
+        self._heartbeat()
+        self._running = True
+        while self._running:
+            self._transport.process_events()
+            self.flush()
+
+    def stop(self) -> None:
+        """
+        Stop the consumer once the events currently being dispatched have been handled
+        :return: None
+        """
+        self._running = False
+
+
 def start_run_detection() -> None:
     """
-    Main Coroutine starts the producer and consumer in a loop
+    Start the event driven consumer on a pika transport
     :return: None
     """
 
     logger.info("Starting Run Detection")
-    logger.info("Creating consumer...")
-    consumer_channel = get_channel(INGRESS_QUEUE_NAME, INGRESS_QUEUE_NAME)
-    logger.info("Consumer created")
-    notification_queue: SimpleQueue[JobRequest] = SimpleQueue()
-    logger.info("Starting loop...")
+    load_specifications()
+    executor = None
+    if INGEST_WORKERS > 0:
+        executor = create_ingest_executor(INGEST_WORKERS)
+    else:
+        start_archive_index(get_run_title)
+    transport = PikaTransport(INGRESS_QUEUE_NAME, INGRESS_PREFETCH_COUNT)
+    logger.info("Starting consumer...")
     try:
-        while True:
-            process_messages(consumer_channel, notification_queue)
-            process_notifications(notification_queue)
-            write_readiness_probe_file()
-            time.sleep(0.1)
+        Consumer(transport, executor=executor).run()
     except Exception:
         logger.exception("Uncaught error occurred in main loop. Restarting in 30 seconds...")
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+        transport.close()
         time.sleep(30)
         start_run_detection()
 
 
 def verify_archive_access() -> None:
     """Log archive access"""
-    if Path("/archive", "NDXALF").exists():
+    if path_exists(Path("/archive", "NDXALF")):
         logger.info("The archive has been mounted correctly, and can be accessed.")
     else:
         logger.error("The archive has not been mounted correctly, and cannot be accessed.")
 
 
-def main() -> None:
+def main(argv: list[str] | None = None) -> None:
     """
     Entry point for run detection
+    :param argv: The command line arguments, defaults to sys.argv
     :return: None
     """
+    parser = argparse.ArgumentParser(prog="run-detection")
+    parser.add_argument(
+        "--engine",
+        choices=["blocking", "asyncio"],
+        default=os.environ.get("RUN_DETECTION_ENGINE", "blocking"),
+        help="The consumer engine to run",
+    )
+    parser.add_argument(
+        "--processes",
+        type=int,
+        default=int(os.environ.get("RUN_DETECTION_PROCESSES", "1")),
+        help="The number of consumer processes to fork and supervise",
+    )
+    parser.add_argument(
+        "--check-specifications",
+        action="store_true",
+        help="Validate every instrument specification, then exit",
+    )
+    args = parser.parse_args(argv)
+    # Fails before any consumer is started if a specification is invalid
+    load_specifications()
+    if args.check_specifications:
+        logger.info("Instrument specifications are valid")
+        return
     verify_archive_access()
-    start_run_detection()
+    start: Callable[[], None] = start_run_detection
+    if args.engine == "asyncio":
+        # Imported here as the asyncio engine builds on this module
+        from rundetection.async_engine import start_async_run_detection
+
+        start = start_async_run_detection
+    if args.processes > 1:
+        from rundetection.supervisor import Supervisor
+
+        Supervisor(args.processes, start).run()
+    else:
+        start()
 
 
 if __name__ == "__main__":
@@ -2,22 +2,76 @@
 Contains the InstrumentSpecification class, the abstract Rule Class and Rule Implementations
 """
 
+from __future__ import annotations
+
+import ctypes
+import heapq
 import json
 import logging
+import multiprocessing
+import signal
+import threading
 import typing
+from importlib import resources
 from pathlib import Path
+from types import MappingProxyType
 
-from rundetection.exceptions import RuleViolationError
-from rundetection.job_requests import JobRequest
+from rundetection.exceptions import RuleViolationError, SpecificationError
 from rundetection.rules.factory import rule_factory
+from rundetection.rules.rule import MissingRuleError
 
 if typing.TYPE_CHECKING:
+    from types import FrameType
     from typing import Any
 
+    from rundetection.job_requests import JobRequest
     from rundetection.rules.rule import Rule
 
 logger = logging.getLogger(__name__)
 
+# Loaded as package data, so specifications do not depend on the working directory
+SPECIFICATIONS_DIRECTORY = Path(str(resources.files("rundetection") / "specifications"))
+
+# The number of reloads requested. It is shared with the ingest worker processes, which do not receive SIGHUP, so their
+# registries reload along with the consumer's
+_reload_generation = multiprocessing.RawValue(ctypes.c_int, 0)
+
+
+def order_rules(rules: list[Rule[Any]]) -> tuple[Rule[Any], ...]:
+    """
+    Order the rules cheapest first, keeping the specification's order between rules of equal cost, while running every
+    rule after the rules providing the values it requires, and rules copying the job request after every rule that
+    provides a value
+    :param rules: The rules in specification order
+    :return: The ordered rules
+    :raises SpecificationError: If the dependencies are cyclic
+    """
+    predecessors: list[set[int]] = [set() for _ in rules]
+    for index, rule in enumerate(rules):
+        for other_index, other in enumerate(rules):
+            if other_index == index or not other.provides:
+                continue
+            if other.provides & rule.requires or (rule.copies_request and not other.copies_request):
+                predecessors[index].add(other_index)
+    ready = [(rule.cost, index) for index, rule in enumerate(rules) if not predecessors[index]]
+    heapq.heapify(ready)
+    ordered: list[Rule[Any]] = []
+    while ready:
+        _, index = heapq.heappop(ready)
+        ordered.append(rules[index])
+        for other_index, other_predecessors in enumerate(predecessors):
+            if index in other_predecessors:
+                other_predecessors.remove(index)
+                if not other_predecessors:
+                    heapq.heappush(ready, (rules[other_index].cost, other_index))
+    if len(ordered) != len(rules):
+        raise SpecificationError(f"Rules have cyclic dependencies: {[rule for rule in rules if rule not in ordered]}")
+    return tuple(ordered)
+
+
+def _specification_path(instrument: str) -> Path:
+    return SPECIFICATIONS_DIRECTORY / f"{instrument.lower()}_specification.json"
+
 
 class InstrumentSpecification:
     """
@@ -28,19 +82,30 @@ class InstrumentSpecification:
     def __init__(self, instrument: str) -> None:
         logger.info("Loading instrument specification for: %s", instrument)
         self._instrument = instrument
-        self._rules: list[Rule[Any]] = []
+        self._rules: tuple[Rule[Any], ...] = ()
+        self.enabled = False
         self._load_rules()
 
     def _load_rules(self) -> None:
         try:
-            path = Path(f"rundetection/specifications/{self._instrument.lower()}_specification.json")
+            path = _specification_path(self._instrument)
             with path.open(encoding="utf-8") as spec_file:
                 spec: dict[str, Any] = json.load(spec_file)
-                self._rules = [rule_factory(key, value) for key, value in spec.items()]
+                self._rules = order_rules([rule_factory(key, value) for key, value in spec.items()])
+                logger.info("Rule order for %s: %s", self._instrument, self._rules)
+                # An empty specification, or one with enabled set to false, can never be met
+                self.enabled = len(spec) > 0 and spec.get("enabled") is not False
         except FileNotFoundError:
             logger.error("No specification for file: %s", self._instrument)
             raise
 
+    @property
+    def rules(self) -> tuple[Rule[Any], ...]:
+        """
+        The rules in the order they are verified
+        """
+        return tuple(self._rules)
+
     def verify(self, job_request: JobRequest) -> None:
         """
         Verify that every rule for the JobRequest is met, and that the specification contains at least one rule.
@@ -60,3 +125,150 @@ class InstrumentSpecification:
             if job_request.will_reduce is False:
                 logger.info("Rule %s not met for run %s", rule, job_request)
                 break  # Stop processing as soon as one rule is not met.
+
+
+class SpecificationRegistry:
+    """
+    The compiled specification of every instrument, held in a read only mapping that is replaced rather than mutated.
+    A specification is recompiled when its file's mtime changes, and every specification is recompiled once a reload
+    is requested, e.g. on SIGHUP, in this process or the process sharing its reload generation. If recompiling fails
+    the previous specifications are kept. The specifications are shared by every message, so rules must not keep state
+    between verifications
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._specifications: MappingProxyType[str, tuple[int, InstrumentSpecification]] = MappingProxyType({})
+        # The reload generation the specifications were last loaded at
+        self._generation = 0
+
+    @staticmethod
+    def _compile(instrument: str) -> tuple[int, InstrumentSpecification]:
+        """
+        Compile the instrument's specification
+        :param instrument: The instrument name
+        :return: The mtime of the specification file when compiled, and the specification
+        """
+        mtime_ns = _specification_path(instrument).stat().st_mtime_ns
+        return mtime_ns, InstrumentSpecification(instrument)
+
+    def load(self) -> None:
+        """
+        Compile the specification of every instrument in the specifications directory, collecting every error
+        :return: None
+        :raises SpecificationError: If any specification could not be compiled, listing every failure
+        """
+        generation = _reload_generation.value
+        specifications = {}
+        errors = []
+        for path in sorted(SPECIFICATIONS_DIRECTORY.glob("*_specification.json")):
+            instrument = path.name.removesuffix("_specification.json")
+            try:
+                specifications[instrument] = self._compile(instrument)
+            except Exception as exc:  # every failure is collected and reported together
+                errors.append(f"{path.name}: {exc!r}")
+        with self._lock:
+            self._generation = generation
+            if errors:
+                raise SpecificationError("Invalid instrument specifications:\n" + "\n".join(errors))
+            self._specifications = MappingProxyType(specifications)
+        logger.info("Loaded %s instrument specifications", len(specifications))
+
+    def request_reload(self) -> None:
+        """
+        Recompile every specification before the next one is returned, in this process and every process sharing its
+        reload generation. Safe to call from a signal handler
+        :return: None
+        """
+        _reload_generation.value += 1
+
+    def get(self, instrument: str) -> InstrumentSpecification:
+        """
+        Return the instrument's specification, compiling it if its file has changed since it was last compiled
+        :param instrument: The instrument name
+        :return: The instrument specification
+        """
+        if self._generation != _reload_generation.value:
+            logger.info("Reloading instrument specifications")
+            try:
+                self.load()
+            except SpecificationError:
+                logger.exception("Keeping the previous instrument specifications")
+        key = instrument.lower()
+        try:
+            mtime_ns = _specification_path(key).stat().st_mtime_ns
+        except FileNotFoundError:
+            logger.error("No specification for file: %s", instrument)
+            raise
+        cached = self._specifications.get(key)
+        if cached is not None and cached[0] == mtime_ns:
+            return cached[1]
+        try:
+            compiled = self._compile(instrument)
+        except (ValueError, SpecificationError, MissingRuleError):
+            if cached is None:
+                raise
+            logger.exception("Keeping the previous specification for %s", instrument)
+            return cached[1]
+        with self._lock:
+            self._specifications = MappingProxyType({**self._specifications, key: compiled})
+        return compiled[1]
+
+
+_registry = SpecificationRegistry()
+
+
+def get_specification(instrument: str) -> InstrumentSpecification:
+    """
+    Return the instrument's specification from the process wide registry
+    :param instrument: The instrument name
+    :return: The instrument specification
+    """
+    return _registry.get(instrument)
+
+
+def is_instrument_enabled(instrument: str) -> bool | None:
+    """
+    Whether the instrument's specification could ever be met
+    :param instrument: The instrument name
+    :return: Whether the instrument is enabled, or None if it has no specification
+    """
+    # Checked first, as getting a missing specification logs an error and this is asked of every message
+    if not _specification_path(instrument).exists():
+        return None
+    try:
+        return _registry.get(instrument).enabled
+    except FileNotFoundError:
+        return None
+
+
+def get_reload_generation() -> ctypes.c_int:
+    """
+    Return the shared reload generation, to pass to the ingest worker processes
+    :return: The reload generation
+    """
+    return _reload_generation
+
+
+def share_reload_generation(generation: ctypes.c_int) -> None:
+    """
+    Reload the specifications whenever the process that owns the given reload generation does
+    :param generation: The reload generation of the consumer process
+    :return: None
+    """
+    global _reload_generation  # noqa: PLW0603
+    _reload_generation = generation
+
+
+def _on_sighup(_: int, __: FrameType | None) -> None:
+    _registry.request_reload()
+
+
+def load_specifications() -> None:
+    """
+    Compile every specification up front, and reload them all on SIGHUP. Must be called from the main thread
+    :return: None
+    :raises SpecificationError: If any specification is invalid, so a bad deployment fails on startup
+    """
+    _registry.load()
+    signal.signal(signal.SIGHUP, _on_sighup)
@@ -0,0 +1,130 @@
+"""
+Prefork supervisor. Forks a number of independent consumer processes sharing the ingress queue, restarts any that die
+and only reports the pod ready while every child is writing its own readiness probe
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import signal
+import time
+import typing
+from multiprocessing import Process
+from multiprocessing.connection import wait
+from pathlib import Path
+
+from rundetection.run_detection import HEARTBEAT_INTERVAL_SECONDS, write_readiness_probe_file
+
+if typing.TYPE_CHECKING:
+    from collections.abc import Callable
+    from types import FrameType
+
+logger = logging.getLogger(__name__)
+
+RESTART_DELAY_SECONDS = 5.0
+
+
+def child_probe_path(index: int) -> Path:
+    """
+    Given a child index, return the path of that child's readiness probe file
+    :param index: The child index
+    :return: The probe file path
+    """
+    return Path(f"/tmp/heartbeat-{index}")  # noqa: S108
+
+
+def _run_child(index: int, target: Callable[[], None]) -> None:
+    """
+    Entry point of a forked child. Points the readiness probe at the child's own file, then runs the consumer
+    :param index: The child index
+    :param target: The consumer entry point
+    :return: None
+    """
+    os.environ["READINESS_PROBE_FILE"] = str(child_probe_path(index))
+    target()
+
+
+class Supervisor:
+    """
+    Forks and supervises the consumer processes
+    """
+
+    def __init__(
+        self, processes: int, target: Callable[[], None], heartbeat_interval: float = HEARTBEAT_INTERVAL_SECONDS
+    ) -> None:
+        self._target = target
+        self._heartbeat_interval = heartbeat_interval
+        self._children: list[Process | None] = [None] * processes
+        self._started_at: list[float] = [0.0] * processes
+
+    def _start_child(self, index: int) -> None:
+        # Not a daemon, as a daemon may not start the ingest worker processes. run() terminates the children instead
+        child = Process(target=_run_child, args=(index, self._target), name=f"run-detection-{index}")
+        child.start()
+        logger.info("Started consumer process %s with pid %s", index, child.pid)
+        self._children[index] = child
+        self._started_at[index] = time.monotonic()
+
+    def restart_dead_children(self) -> None:
+        """
+        Start any child that has exited, waiting RESTART_DELAY_SECONDS after its last start so a child that crashes
+        on startup cannot spin
+        :return: None
+        """
+        for index, child in enumerate(self._children):
+            if child is not None and child.is_alive():
+                continue
+            if child is not None:
+                if time.monotonic() - self._started_at[index] < RESTART_DELAY_SECONDS:
+                    continue
+                logger.warning("Consumer process %s exited with code %s, restarting", index, child.exitcode)
+                child.close()
+            self._start_child(index)
+
+    def children_ready(self) -> bool:
+        """
+        Check every child has written its readiness probe recently
+        :return: True if every child is ready
+        """
+        stale_before = time.time() - 3 * self._heartbeat_interval
+        for index in range(len(self._children)):
+            try:
+                if child_probe_path(index).stat().st_mtime < stale_before:
+                    return False
+            except FileNotFoundError:
+                return False
+        return True
+
+    def _stop(self, signum: int, _: FrameType | None) -> None:
+        raise SystemExit(128 + signum)
+
+    def _forward(self, signum: int, _: FrameType | None) -> None:
+        for child in self._children:
+            if child is not None and child.pid is not None and child.is_alive():
+                os.kill(child.pid, signum)
+
+    def run(self) -> None:
+        """
+        Start the children, then restart them as they die and aggregate their health into the readiness probe until
+        the supervisor is terminated
+        :return: None
+        """
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGHUP, self._forward)
+        logger.info("Starting %s consumer processes", len(self._children))
+        try:
+            while True:
+                self.restart_dead_children()
+                if self.children_ready():
+                    write_readiness_probe_file()
+                # Wakes as soon as a running child exits, or after the heartbeat interval to refresh the probe
+                running = [child.sentinel for child in self._children if child is not None and child.is_alive()]
+                wait(running, self._heartbeat_interval)
+        finally:
+            for child in self._children:
+                if child is not None and child.is_alive():
+                    child.terminate()
+            for child in self._children:
+                if child is not None:
+                    child.join()
@@ -0,0 +1,133 @@
+"""
+In memory transport, for running the whole pipeline without a queue server in tests and benchmarks
+"""
+
+from __future__ import annotations
+
+import heapq
+import itertools
+import threading
+import time
+import typing
+from collections import defaultdict, deque
+from functools import partial
+
+from rundetection.transports.transport import Transport
+
+if typing.TYPE_CHECKING:
+    from collections.abc import Callable
+
+
+class InMemoryTransport(Transport):
+    """
+    A transport holding its queues in memory. Publishing to an exchange appends to the queue of the same name, as the
+    pika transport binds each queue to an exchange of its own name. Nacked deliveries are returned to the front of
+    their queue. Deliveries respect the prefetch count, with 0 meaning no limit
+    """
+
+    def __init__(self, prefetch_count: int = 0) -> None:
+        self._prefetch_count = prefetch_count
+        self._condition = threading.Condition()
+        self.queues: defaultdict[str, deque[bytes]] = defaultdict(deque)
+        self.unacked: dict[int, tuple[str, bytes]] = {}
+        self._consumers: dict[str, Callable[[int, bytes], None]] = {}
+        self._delivery_tags = itertools.count(1)
+        self._timer_ids = itertools.count()
+        self._timers: list[tuple[float, int, Callable[[], None]]] = []
+        self._threadsafe_callbacks: deque[Callable[[], None]] = deque()
+        self._idle_callbacks: list[Callable[[], None]] = []
+
+    def put(self, queue_name: str, body: bytes) -> None:
+        """
+        Add a message to the queue, as if another service had published it
+        :param queue_name: The queue name
+        :param body: The message body
+        :return: None
+        """
+        with self._condition:
+            self.queues[queue_name].append(body)
+            self._condition.notify()
+
+    def on_idle(self, callback: Callable[[], None]) -> None:
+        """
+        Dispatch the callback once every consumed queue is empty and every delivery has been acked or nacked, e.g. to
+        stop a consumer once a benchmark corpus has been processed
+        :param callback: The callback
+        :return: None
+        """
+        with self._condition:
+            self._idle_callbacks.append(callback)
+            self._condition.notify()
+
+    def consume(self, queue_name: str, on_message: Callable[[int, bytes], None]) -> None:
+        with self._condition:
+            self._consumers[queue_name] = on_message
+            self._condition.notify()
+
+    def ack(self, delivery_tag: int, multiple: bool = False) -> None:
+        with self._condition:
+            tags = [tag for tag in self.unacked if tag <= delivery_tag] if multiple else [delivery_tag]
+            for tag in tags:
+                del self.unacked[tag]
+            self._condition.notify()
+
+    def nack(self, delivery_tag: int) -> None:
+        with self._condition:
+            queue_name, body = self.unacked.pop(delivery_tag)
+            self.queues[queue_name].appendleft(body)
+            self._condition.notify()
+
+    def publish(self, exchange_name: str, body: bytes) -> None:
+        self.put(exchange_name, body)
+
+    def call_later(self, delay: float, callback: Callable[[], None]) -> None:
+        with self._condition:
+            heapq.heappush(self._timers, (time.monotonic() + delay, next(self._timer_ids), callback))
+            self._condition.notify()
+
+    def call_threadsafe(self, callback: Callable[[], None]) -> None:
+        with self._condition:
+            self._threadsafe_callbacks.append(callback)
+            self._condition.notify()
+
+    def _is_idle(self) -> bool:
+        return not self.unacked and not any(self.queues[queue_name] for queue_name in self._consumers)
+
+    def _collect_ready(self) -> list[Callable[[], None]]:
+        """
+        Collect every event ready to dispatch. Must be called holding the condition
+        :return: The ready events
+        """
+        ready = list(self._threadsafe_callbacks)
+        self._threadsafe_callbacks.clear()
+        now = time.monotonic()
+        while self._timers and self._timers[0][0] <= now:
+            ready.append(heapq.heappop(self._timers)[2])
+        for queue_name, on_message in self._consumers.items():
+            queue = self.queues[queue_name]
+            while queue and (self._prefetch_count == 0 or len(self.unacked) < self._prefetch_count):
+                delivery_tag = next(self._delivery_tags)
+                body = queue.popleft()
+                self.unacked[delivery_tag] = (queue_name, body)
+                ready.append(partial(on_message, delivery_tag, body))
+        if not ready and self._idle_callbacks and self._is_idle():
+            ready = self._idle_callbacks
+            self._idle_callbacks = []
+        return ready
+
+    def process_events(self) -> None:
+        with self._condition:
+            ready = self._collect_ready()
+            while not ready:
+                timeout = self._timers[0][0] - time.monotonic() if self._timers else None
+                self._condition.wait(timeout)
+                ready = self._collect_ready()
+        for callback in ready:
+            callback()
+
+    def close(self) -> None:
+        with self._condition:
+            for delivery_tag in sorted(self.unacked, reverse=True):
+                queue_name, body = self.unacked.pop(delivery_tag)
+                self.queues[queue_name].appendleft(body)
+            self._consumers.clear()
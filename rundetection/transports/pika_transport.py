@@ -0,0 +1,188 @@
+"""
+Transport backed by a RabbitMQ queue server through pika
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import typing
+from queue import Queue
+
+from pika import BlockingConnection, ConnectionParameters, PlainCredentials  # type: ignore
+from pika.exceptions import AMQPError  # type: ignore
+
+from rundetection.transports.transport import Transport
+
+if typing.TYPE_CHECKING:
+    from collections.abc import Callable
+
+    from pika.adapters.blocking_connection import BlockingChannel  # type: ignore
+    from pika.spec import Basic, BasicProperties  # type: ignore
+
+logger = logging.getLogger(__name__)
+
+PRODUCER_POOL_SIZE = int(os.environ.get("PRODUCER_POOL_SIZE", "1"))
+
+
+def get_connection_parameters() -> ConnectionParameters:
+    """
+    Build the queue server connection parameters from the environment
+    :return: The connection parameters
+    """
+    credentials = PlainCredentials(
+        username=os.environ.get("QUEUE_USER", "guest"), password=os.environ.get("QUEUE_PASSWORD", "guest")
+    )
+    return ConnectionParameters(os.environ.get("QUEUE_HOST", "localhost"), 5672, credentials=credentials)
+
+
+def _open_channel() -> BlockingChannel:
+    """
+    Open a new connection to the queue server and return a channel on it
+    :return: The Blocking Channel
+    """
+    connection = BlockingConnection(get_connection_parameters())
+    return connection.channel()
+
+
+def _declare(channel: BlockingChannel, exchange_name: str, queue_name: str) -> None:
+    """
+    Declare the exchange and quorum queue, and bind the queue to the exchange
+    :param channel: The channel to declare on
+    :param exchange_name: The exchange name
+    :param queue_name: The queue name
+    :return: None
+    """
+    channel.exchange_declare(exchange_name, exchange_type="direct", durable=True)
+    channel.queue_declare(queue_name, durable=True, arguments={"x-queue-type": "quorum"})
+    channel.queue_bind(queue_name, exchange_name, routing_key="")
+
+
+def get_channel(exchange_name: str, queue_name: str) -> BlockingChannel:
+    """
+    Given an exchange and queue name, return a blocking channel to the exchange and queue
+    :param exchange_name: The exchange name
+    :param queue_name: The queue name
+    :return: The Blocking Channel
+    """
+    channel = _open_channel()
+    _declare(channel, exchange_name, queue_name)
+    return channel
+
+
+def _close_quietly(channel: BlockingChannel | None) -> None:
+    """
+    Close the channel and its connection, ignoring errors from a channel that is already broken
+    :param channel: The channel to close
+    :return: None
+    """
+    if channel is None:
+        return
+    try:
+        if channel.is_open:
+            channel.close()
+        if channel.connection.is_open:
+            channel.connection.close()
+    except AMQPError:
+        logger.debug("Ignoring error while closing channel", exc_info=True)
+
+
+class Producer:
+    """
+    A long-lived producer holding a small pool of open channels. Channels are opened lazily, reopened if the
+    connection is lost, and each exchange is only declared once per connection, so a publish is a single basic_publish
+    """
+
+    _MAX_ATTEMPTS = 2
+
+    def __init__(self, pool_size: int = PRODUCER_POOL_SIZE) -> None:
+        self._pool: Queue[BlockingChannel | None] = Queue()
+        for _ in range(pool_size):
+            self._pool.put(None)
+        self._declared: set[str] = set()
+
+    def _ensure_open(self, channel: BlockingChannel | None) -> BlockingChannel:
+        if channel is not None and channel.is_open and channel.connection.is_open:
+            return channel
+        logger.info("Opening producer channel...")
+        self._declared.clear()  # The broker may have restarted, so declarations must be repeated on the new connection
+        return _open_channel()
+
+    def publish(self, exchange_name: str, body: bytes) -> None:
+        """
+        Publish the body to the given exchange using a pooled channel, reconnecting once if the channel has failed
+        :param exchange_name: The exchange (and queue) name to publish to
+        :param body: The message body
+        :return: None
+        """
+        channel = self._pool.get()
+        try:
+            for attempt in range(1, self._MAX_ATTEMPTS + 1):
+                try:
+                    channel = self._ensure_open(channel)
+                    if exchange_name not in self._declared:
+                        _declare(channel, exchange_name, exchange_name)
+                        self._declared.add(exchange_name)
+                    channel.basic_publish(exchange_name, "", body)
+                    return
+                except AMQPError:
+                    _close_quietly(channel)
+                    channel = None
+                    if attempt == self._MAX_ATTEMPTS:
+                        raise
+                    logger.warning("Producer channel failed, reconnecting...", exc_info=True)
+        finally:
+            self._pool.put(channel)
+
+    def close(self) -> None:
+        """
+        Close every pooled channel and its connection
+        :return: None
+        """
+        logger.info("Closing producer channels and connections...")
+        for _ in range(self._pool.qsize()):
+            channel = self._pool.get()
+            _close_quietly(channel)
+            self._pool.put(None)
+        logger.info("Producer closed.")
+
+
+class PikaTransport(Transport):
+    """
+    Consumes on a dedicated blocking channel, and publishes through a pooled Producer
+    """
+
+    def __init__(self, queue_name: str, prefetch_count: int, producer: Producer | None = None) -> None:
+        logger.info("Creating consumer...")
+        self._channel = get_channel(queue_name, queue_name)
+        self._channel.basic_qos(prefetch_count=prefetch_count)
+        logger.info("Consumer created")
+        self._producer = producer if producer is not None else Producer()
+
+    def consume(self, queue_name: str, on_message: Callable[[int, bytes], None]) -> None:
+        def on_delivery(_: BlockingChannel, method_frame: Basic.Deliver, __: BasicProperties, body: bytes) -> None:
+            on_message(method_frame.delivery_tag, body)
+
+        self._channel.basic_consume(queue_name, on_delivery)
+
+    def ack(self, delivery_tag: int, multiple: bool = False) -> None:
+        self._channel.basic_ack(delivery_tag, multiple=multiple)
+
+    def nack(self, delivery_tag: int) -> None:
+        self._channel.basic_nack(delivery_tag)
+
+    def publish(self, exchange_name: str, body: bytes) -> None:
+        self._producer.publish(exchange_name, body)
+
+    def call_later(self, delay: float, callback: Callable[[], None]) -> None:
+        self._channel.connection.call_later(delay, callback)
+
+    def call_threadsafe(self, callback: Callable[[], None]) -> None:
+        self._channel.connection.add_callback_threadsafe(callback)
+
+    def process_events(self) -> None:
+        self._channel.connection.process_data_events(time_limit=None)
+
+    def close(self) -> None:
+        self._producer.close()
+        _close_quietly(self._channel)  # Release the unacked messages so they are redelivered
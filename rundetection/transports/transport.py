@@ -0,0 +1,85 @@
+"""
+Module containing the abstract base Transport class
+"""
+
+from __future__ import annotations
+
+import typing
+from abc import ABC, abstractmethod
+
+if typing.TYPE_CHECKING:
+    from collections.abc import Callable
+
+
+class Transport(ABC):
+    """
+    Abstract message transport. The blocking engine only consumes, acks and publishes through a transport, so it can
+    run against a queue server or entirely in memory. Callbacks are only ever dispatched from process_events, on the
+    thread calling it
+    """
+
+    @abstractmethod
+    def consume(self, queue_name: str, on_message: Callable[[int, bytes], None]) -> None:
+        """
+        Start consuming from the queue, dispatching each delivery to the callback
+        :param queue_name: The queue to consume from
+        :param on_message: Callback taking the delivery tag and the message body
+        :return: None
+        """
+
+    @abstractmethod
+    def ack(self, delivery_tag: int, multiple: bool = False) -> None:
+        """
+        Ack the delivery, or with multiple, every outstanding delivery up to and including it
+        :param delivery_tag: The delivery tag
+        :param multiple: Whether to ack every earlier outstanding delivery too
+        :return: None
+        """
+
+    @abstractmethod
+    def nack(self, delivery_tag: int) -> None:
+        """
+        Nack the delivery, returning it to its queue
+        :param delivery_tag: The delivery tag
+        :return: None
+        """
+
+    @abstractmethod
+    def publish(self, exchange_name: str, body: bytes) -> None:
+        """
+        Publish the body to the exchange
+        :param exchange_name: The exchange to publish to
+        :param body: The message body
+        :return: None
+        """
+
+    @abstractmethod
+    def call_later(self, delay: float, callback: Callable[[], None]) -> None:
+        """
+        Dispatch the callback after delay seconds
+        :param delay: The delay in seconds
+        :param callback: The callback
+        :return: None
+        """
+
+    @abstractmethod
+    def call_threadsafe(self, callback: Callable[[], None]) -> None:
+        """
+        Dispatch the callback as soon as possible. This is the only method that may be called from another thread
+        :param callback: The callback
+        :return: None
+        """
+
+    @abstractmethod
+    def process_events(self) -> None:
+        """
+        Block until there is at least one event, then dispatch every ready event
+        :return: None
+        """
+
+    @abstractmethod
+    def close(self) -> None:
+        """
+        Close the transport, returning any unacked deliveries to their queues
+        :return: None
+        """
@@ -0,0 +1,29 @@
+"""
+Shared test fixtures
+"""
+
+import pytest
+
+from rundetection.ingestion.metadata_cache import _memory_metadata_cache
+from rundetection.ingestion.stat_cache import _stat_cache
+from rundetection.rules import mari_rules, osiris_rules, tosca_rules
+
+
+@pytest.fixture(autouse=True)
+def _clear_memory_metadata_cache() -> None:
+    """
+    Start each test with empty in memory metadata and stat caches, so tests that patch the nexus file reads see them
+    :return: None
+    """
+    _memory_metadata_cache.clear()
+    _stat_cache.clear()
+
+
+@pytest.fixture(autouse=True)
+def _clear_run_series() -> None:
+    """
+    Start each test without the open run series of the stitch rules, so each test walks the runs it patches
+    :return: None
+    """
+    for module in (mari_rules, osiris_rules, tosca_rules):
+        module._run_series.clear()
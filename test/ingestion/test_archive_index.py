@@ -0,0 +1,168 @@
+"""
+Archive index tests
+"""
+
+import os
+from pathlib import Path
+from unittest.mock import Mock, patch
+
+import pytest
+
+from rundetection.ingestion.archive_index import (
+    ArchiveIndex,
+    current_cycle_directory,
+    get_archive_index,
+    start_archive_index,
+)
+
+
+@pytest.fixture()
+def data_directory(tmp_path: Path) -> Path:
+    for cycle in ("cycle_98_1", "cycle_23_5", "cycle_24_1", "cycle_24_2"):
+        (tmp_path / cycle).mkdir()
+    (tmp_path / "cycle_24_3.txt").touch()
+    return tmp_path
+
+
+def _touch(directory: Path, *names: str) -> list[Path]:
+    paths = [directory / name for name in names]
+    for path in paths:
+        path.touch()
+    return paths
+
+
+def test_current_cycle_directory(data_directory: Path) -> None:
+    """
+    Test the latest cycle directory is found, ordering cycles by year then cycle
+    :return: None
+    """
+    assert current_cycle_directory(data_directory) == data_directory / "cycle_24_2"
+
+
+def test_current_cycle_directory_none(tmp_path: Path) -> None:
+    """
+    Test None is returned when there are no cycle directories
+    :return: None
+    """
+    assert current_cycle_directory(tmp_path) is None
+
+
+def test_scan_indexes_current_cycle(data_directory: Path) -> None:
+    """
+    Test the nexus files in the current cycle are indexed, and those in older cycles are not
+    :return: None
+    """
+    first, second = _touch(data_directory / "cycle_24_2", "MAR1.nxs", "MAR2.nxs")
+    (old,) = _touch(data_directory / "cycle_24_1", "MAR0.nxs")
+    index = ArchiveIndex([data_directory], Mock())
+
+    index.scan()
+
+    assert index.is_indexed(first)
+    assert not index.is_indexed(old)
+    assert index.get_sibling_nexus_files(first) == [second]
+    assert index.get_sibling_nexus_files(old) is None
+
+
+def test_siblings_not_returned_once_directory_changes(data_directory: Path) -> None:
+    """
+    Test the siblings of a directory changed since it was scanned are left to be listed from the filesystem
+    :return: None
+    """
+    cycle_directory = data_directory / "cycle_24_2"
+    (path,) = _touch(cycle_directory, "MAR1.nxs")
+    os.utime(cycle_directory, ns=(0, 0))
+    index = ArchiveIndex([data_directory], Mock())
+    index.scan()
+    assert index.get_sibling_nexus_files(path) == []
+
+    _touch(cycle_directory, "MAR2.nxs")
+
+    assert index.get_sibling_nexus_files(path) is None
+
+
+def test_read_titles_newest_first(data_directory: Path) -> None:
+    """
+    Test titles are read newest first, and are kept across scans
+    :return: None
+    """
+    paths = _touch(data_directory / "cycle_24_2", "MAR1.nxs", "MAR2.nxs")
+    read_title = Mock(side_effect=lambda path: path.stem)
+    index = ArchiveIndex([data_directory], read_title)
+    index.scan()
+
+    index.read_titles()
+    index.scan()
+    index.read_titles()
+
+    assert [call.args[0] for call in read_title.call_args_list] == paths[::-1]
+    assert index.get_title(paths[0]) == "MAR1"
+
+
+def test_read_titles_retries_failures(data_directory: Path) -> None:
+    """
+    Test a title that could not be read is retried on the next pass
+    :return: None
+    """
+    (path,) = _touch(data_directory / "cycle_24_2", "MAR1.nxs")
+    index = ArchiveIndex([data_directory], Mock(side_effect=[OSError, "title"]))
+    index.scan()
+
+    index.read_titles()
+    assert index.get_title(path) is None
+    index.read_titles()
+    assert index.get_title(path) == "title"
+
+
+def test_scan_drops_removed_files(data_directory: Path) -> None:
+    """
+    Test files removed from the archive are dropped from the index
+    :return: None
+    """
+    (path,) = _touch(data_directory / "cycle_24_2", "MAR1.nxs")
+    index = ArchiveIndex([data_directory], Mock())
+    index.scan()
+    path.unlink()
+
+    index.scan()
+
+    assert not index.is_indexed(path)
+
+
+def test_scan_skips_missing_directory(tmp_path: Path) -> None:
+    """
+    Test a data directory that cannot be read does not stop the others being indexed
+    :return: None
+    """
+    index = ArchiveIndex([tmp_path / "missing"], Mock())
+    index.scan()
+
+    assert not index.is_indexed(tmp_path / "missing" / "cycle_24_1" / "MAR1.nxs")
+
+
+def test_start_warms_index(data_directory: Path) -> None:
+    """
+    Test the index is populated before start returns, and runs until stopped
+    :return: None
+    """
+    (path,) = _touch(data_directory / "cycle_24_2", "MAR1.nxs")
+    index = ArchiveIndex([data_directory], Mock(return_value="title"), interval=60)
+
+    index.start()
+    try:
+        assert index.is_indexed(path)
+        assert index.is_running
+    finally:
+        index.stop()
+
+
+@patch("rundetection.ingestion.archive_index.ARCHIVE_INDEX_DIRS", [])
+@patch("rundetection.ingestion.archive_index._archive_index", None)
+def test_archive_index_disabled_by_default() -> None:
+    """
+    Test no index is started unless directories are configured
+    :return: None
+    """
+    start_archive_index(Mock())
+
+    assert get_archive_index() is None
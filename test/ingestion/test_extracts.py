@@ -16,6 +16,7 @@ from rundetection.ingestion.extracts import (
     skip_extract,
     tosca_extract,
 )
+from rundetection.ingestion.read_plan import Field, ReadPlan
 from rundetection.job_requests import JobRequest
 
 
@@ -236,6 +237,21 @@ def test_osiris_extract_raises_on_bad_frequencies(job_request):
         osiris_extract(job_request, dataset)
 
 
+def test_get_extraction_function_from_plan(job_request):
+    """
+    Test instruments with a read plan get an extraction function adding its values to the additional values
+    :param job_request: job request fixture
+    :return: None
+    """
+    plans = {"inst": ReadPlan([Field("temperature", "selog/temp/value"), Field("field", "field", default=0.0)])}
+    with patch("rundetection.ingestion.extracts.EXTRACTION_PLANS", plans):
+        extract = get_extraction_function("INST")
+
+    extract(job_request, {"selog": {"temp": {"value": (4.2,)}}})
+
+    assert job_request.additional_values == {"temperature": 4.2, "field": 0.0}
+
+
 def test_get_cycle_string_from_path_valid():
     """
     Test get cycle string returns correct string
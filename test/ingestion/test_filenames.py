@@ -0,0 +1,77 @@
+"""
+Filename scheme tests
+"""
+
+from pathlib import Path
+
+import pytest
+
+from rundetection.ingestion.filenames import (
+    SCHEMES,
+    FilenameScheme,
+    get_scheme,
+    parse_nexus_path,
+)
+
+
+@pytest.mark.parametrize(
+    ("instrument", "run_number", "filename"),
+    [
+        ("ALF", 82301, "ALF82301.nxs"),
+        ("MARI", 25581, "MAR25581.nxs"),
+        ("tosca", 25234, "TSC25234.nxs"),
+        ("OSIRIS", 12345, "OSIRIS00012345.nxs"),
+        ("UNKNOWN", 1, "UNKNOWN00000001.nxs"),
+    ],
+)
+def test_get_scheme_filename(instrument, run_number, filename):
+    """
+    Test run numbers are formatted with each instrument's prefix and padding
+    :return: None
+    """
+    assert get_scheme(instrument).filename(run_number) == filename
+
+
+def test_schemes_are_keyed_by_instrument():
+    """
+    Test each scheme is registered under its own instrument
+    :return: None
+    """
+    assert all(instrument == scheme.instrument for instrument, scheme in SCHEMES.items())
+
+
+@pytest.mark.parametrize(
+    ("path", "instrument", "run_number", "cycle"),
+    [
+        ("/archive/NDXOSIRIS/Instrument/data/cycle_24_1/OSIRIS00012345.nxs", "OSIRIS", 12345, "cycle_24_1"),
+        ("/archive/NDXMARI/Instrument/data/cycle_19_2/MAR25581.nxs", "MARI", 25581, "cycle_19_2"),
+        ("/some/dir/MARI25581.nxs", "MARI", 25581, None),
+        ("/some/dir/TSC25234.nxs", "TOSCA", 25234, None),
+        ("/some/dir/EMMA-A123.nxs", "EMMA-A", 123, None),
+    ],
+)
+def test_parse_nexus_path(path, instrument, run_number, cycle):
+    """
+    Test the instrument, run number and cycle are parsed from the path
+    :return: None
+    """
+    parsed = parse_nexus_path(Path(path))
+    assert parsed is not None
+    assert (parsed.instrument, parsed.run_number, parsed.cycle) == (instrument, run_number, cycle)
+
+
+@pytest.mark.parametrize("path", ["/some/dir/nexus.nxs", "/some/dir/12345.nxs", "/some/dir/MAR25581.log"])
+def test_parse_nexus_path_returns_none_when_not_a_run(path):
+    """
+    Test filenames that are not a prefix followed by a run number are not parsed
+    :return: None
+    """
+    assert parse_nexus_path(Path(path)) is None
+
+
+def test_filename_scheme_run_path():
+    """
+    Test the run path is within the directory
+    :return: None
+    """
+    assert FilenameScheme("X", "X", padding=3).run_path(Path("/dir"), 7) == Path("/dir/X007.nxs")
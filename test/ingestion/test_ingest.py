@@ -9,6 +9,7 @@ from unittest.mock import Mock, patch
 
 import pytest
 from _pytest.logging import LogCaptureFixture
+from h5py import File  # type: ignore
 
 from rundetection.exceptions import IngestError
 from rundetection.ingestion.extracts import get_cycle_string_from_path
@@ -18,7 +19,10 @@ from rundetection.ingestion.ingest import (
     get_sibling_nexus_files,
     get_sibling_runs,
     ingest,
+    instrument_from_path,
+    nexus_file_exists,
 )
+from rundetection.ingestion.stat_cache import _stat_cache
 
 # Allows test to be run via pycharm play button or from project root
 TEST_DATA_PATH = Path("../test_data") if Path("../test_data").exists() else Path("test", "test_data")
@@ -117,6 +121,45 @@ def test_ingest_raises_exception_non_nexus_file() -> None:
         ingest(Path("25581.log"))
 
 
+def test_ingest_closes_nexus_file() -> None:
+    """
+    Test the nexus file is closed once ingested
+    :return: None
+    """
+    opened = []
+
+    def open_file(*args, **kwargs):
+        opened.append(File(*args, **kwargs))
+        return opened[-1]
+
+    with patch("rundetection.ingestion.ingest.File", side_effect=open_file):
+        ingest(TEST_DATA_PATH / "e2e_data/1510111/ENGINX00241391.nxs")
+
+    assert len(opened) == 1
+    assert not opened[0].id.valid
+
+
+def test_ingest_closes_nexus_file_when_extraction_fails() -> None:
+    """
+    Test the nexus file is closed when an extraction function raises
+    :return: None
+    """
+    opened = []
+
+    def open_file(*args, **kwargs):
+        opened.append(File(*args, **kwargs))
+        return opened[-1]
+
+    with (
+        patch("rundetection.ingestion.ingest.File", side_effect=open_file),
+        patch("rundetection.ingestion.ingest.get_extraction_function", return_value=Mock(side_effect=IngestError)),
+        pytest.raises(IngestError),
+    ):
+        ingest(TEST_DATA_PATH / "e2e_data/1510111/ENGINX00241391.nxs")
+
+    assert not opened[0].id.valid
+
+
 @patch("rundetection.ingestion.ingest.ingest")
 def test_get_sibling_runs(mock_ingest: Mock):
     """
@@ -158,6 +201,65 @@ def test_get_run_title(mock_ingest):
     mock_ingest.assert_called_once_with(Path("/dir/file.nxs"))
 
 
+@patch("rundetection.ingestion.ingest.get_archive_index")
+def test_get_run_title_from_archive_index(mock_get_archive_index):
+    """
+    Test the title is taken from the archive index without ingesting the file
+    :param mock_get_archive_index: Mock archive index getter
+    :return: None
+    """
+    mock_get_archive_index.return_value.get_title.return_value = "indexed title"
+    with patch("rundetection.ingestion.ingest.ingest") as mock_ingest:
+        assert get_run_title(Path("/dir/file.nxs")) == "indexed title"
+    mock_ingest.assert_not_called()
+
+
+@patch("rundetection.ingestion.ingest.get_archive_index")
+def test_nexus_file_exists_from_archive_index(mock_get_archive_index):
+    """
+    Test indexed files are reported as existing without probing the filesystem, and unindexed files are probed
+    :param mock_get_archive_index: Mock archive index getter
+    :return: None
+    """
+    mock_get_archive_index.return_value.is_indexed.side_effect = lambda path: path.name == "indexed.nxs"
+    assert nexus_file_exists(Path("/missing/indexed.nxs"))
+    assert not nexus_file_exists(Path("/missing/unindexed.nxs"))
+
+
+@patch("rundetection.ingestion.ingest.get_archive_index")
+def test_get_sibling_nexus_files_from_archive_index(mock_get_archive_index):
+    """
+    Test siblings are taken from the archive index when the directory is indexed
+    :param mock_get_archive_index: Mock archive index getter
+    :return: None
+    """
+    mock_get_archive_index.return_value.get_sibling_nexus_files.return_value = [Path("/dir/2.nxs")]
+    assert get_sibling_nexus_files(Path("/dir/1.nxs")) == [Path("/dir/2.nxs")]
+
+
+@pytest.mark.parametrize(
+    ("path", "instrument"),
+    [
+        ("/archive/NDXALF/Instrument/data/cycle_24_1/ALF82301.nxs", "ALF"),
+        ("/archive/NDXMAR/Instrument/data/cycle_19_4/MAR27030.nxs", "MARI"),
+        ("/archive/NDXEMMA-A/Instrument/data/cycle_24_1/EMMA-A123.nxs", "EMMA-A"),
+        ("/some/dir/MAR25581.nxs", "MARI"),
+        ("/some/dir/TSC25234.nxs", "TOSCA"),
+        ("/some/dir/OSIRIS00012345.nxs", "OSIRIS"),
+        ("/some/dir/enginx00241391.nxs", "ENGINX"),
+        ("/some/dir/nexus.nxs", None),
+    ],
+)
+def test_instrument_from_path(path, instrument):
+    """
+    Test the instrument is derived from the archive directory, or else the filename
+    :param path: The nexus file path
+    :param instrument: The expected instrument
+    :return: None
+    """
+    assert instrument_from_path(Path(path)) == instrument
+
+
 def test_get_sibling_nexus_files():
     """
     Test that nexus files from within the same directory are returned
@@ -171,6 +273,19 @@ def test_get_sibling_nexus_files():
         assert sibling_files == [Path(temp_dir, "2.nxs")]
 
 
+def test_get_sibling_nexus_files_records_siblings_in_stat_cache():
+    """
+    Test listed siblings are known to exist without being stat'd
+    :return: None
+    """
+    with TemporaryDirectory() as temp_dir:
+        Path(temp_dir, "1.nxs").touch()
+        Path(temp_dir, "2.nxs").touch()
+        get_sibling_nexus_files(Path(temp_dir, "1.nxs"))
+        assert _stat_cache.exists(Path(temp_dir, "2.nxs"))
+        assert _stat_cache.hits == 1
+
+
 def test_get_cycle_from_string_empty_path():
     """Test if the function raises an IngestError for an empty path"""
     path = Path()
@@ -0,0 +1,201 @@
+"""
+Metadata cache tests
+"""
+
+import os
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+from rundetection.ingestion.ingest import ingest
+from rundetection.ingestion.metadata_cache import MemoryMetadataCache, MetadataCache, get_metadata_cache
+from rundetection.job_requests import JobRequest
+
+# Allows test to be run via pycharm play button or from project root
+TEST_DATA_PATH = Path("../test_data") if Path("../test_data").exists() else Path("test", "test_data")
+NEXUS_FILE = TEST_DATA_PATH / "e2e_data/1510111/ENGINX00241391.nxs"
+
+
+@pytest.fixture()
+def nexus_file(tmp_path: Path) -> Path:
+    path = tmp_path / "run.nxs"
+    path.write_bytes(b"nexus")
+    return path
+
+
+@pytest.fixture()
+def job_request(nexus_file: Path) -> JobRequest:
+    return JobRequest(
+        1, "inst", "title", "num", nexus_file, "start", "end", 2, 3, "users", additional_values={"ei": [1.0]}
+    )
+
+
+def test_get_returns_cached_job_request(tmp_path: Path, nexus_file: Path, job_request: JobRequest) -> None:
+    """
+    Test a cached job request is returned while the file is unchanged
+    :return: None
+    """
+    cache = MetadataCache(tmp_path / "cache")
+    cache.put(nexus_file, nexus_file.stat(), job_request)
+
+    assert cache.get(nexus_file, nexus_file.stat()) == job_request
+
+
+def test_get_returns_copy(tmp_path: Path, nexus_file: Path, job_request: JobRequest) -> None:
+    """
+    Test each hit builds a new job request, so rules can mutate what they are given
+    :return: None
+    """
+    cache = MetadataCache(tmp_path / "cache")
+    cache.put(nexus_file, nexus_file.stat(), job_request)
+
+    cached = cache.get(nexus_file, nexus_file.stat())
+    assert cached is not None
+    cached.additional_values["ei"].append(2.0)
+    assert cache.get(nexus_file, nexus_file.stat()) == job_request
+
+
+def test_get_misses_unknown_file(tmp_path: Path, nexus_file: Path) -> None:
+    """
+    Test None is returned for a file that has not been cached
+    :return: None
+    """
+    assert MetadataCache(tmp_path / "cache").get(nexus_file, nexus_file.stat()) is None
+
+
+def test_get_misses_changed_file(tmp_path: Path, nexus_file: Path, job_request: JobRequest) -> None:
+    """
+    Test a stale entry is not returned once the file's size or mtime change
+    :return: None
+    """
+    cache = MetadataCache(tmp_path / "cache")
+    cache.put(nexus_file, nexus_file.stat(), job_request)
+    nexus_file.write_bytes(b"rewritten nexus")
+    os.utime(nexus_file, ns=(0, 0))
+
+    assert cache.get(nexus_file, nexus_file.stat()) is None
+
+
+def test_cache_persists_across_instances(tmp_path: Path, nexus_file: Path, job_request: JobRequest) -> None:
+    """
+    Test entries survive the cache being reopened, e.g. by a restarted pod
+    :return: None
+    """
+    MetadataCache(tmp_path / "cache").put(nexus_file, nexus_file.stat(), job_request)
+
+    assert MetadataCache(tmp_path / "cache").get(nexus_file, nexus_file.stat()) == job_request
+
+
+@patch("rundetection.ingestion.metadata_cache.METADATA_CACHE_DIR", "")
+@patch("rundetection.ingestion.metadata_cache._metadata_cache", None)
+def test_get_metadata_cache_disabled_by_default() -> None:
+    """
+    Test no cache is used unless a directory is configured
+    :return: None
+    """
+    assert get_metadata_cache() is None
+
+
+def test_ingest_uses_cache(tmp_path: Path) -> None:
+    """
+    Test a second ingest of the same file does not open it again
+    :return: None
+    """
+    with (
+        patch("rundetection.ingestion.ingest.get_metadata_cache", return_value=MetadataCache(tmp_path)),
+        patch("rundetection.ingestion.ingest.get_memory_metadata_cache", return_value=None),
+    ):
+        first = ingest(NEXUS_FILE)
+        with patch("rundetection.ingestion.ingest.File") as mock_file:
+            second = ingest(NEXUS_FILE)
+
+    mock_file.assert_not_called()
+    assert second == first
+
+
+def test_memory_cache_returns_copies(nexus_file: Path, job_request: JobRequest) -> None:
+    """
+    Test the memory cache copies job requests in and out, so rules can mutate what they are given
+    :return: None
+    """
+    cache = MemoryMetadataCache(max_size=2, ttl=60)
+    cache.put(nexus_file, nexus_file.stat(), job_request)
+    job_request.additional_values["ei"].append(2.0)
+
+    cached = cache.get(nexus_file, nexus_file.stat())
+    assert cached is not None
+    assert cached.additional_values == {"ei": [1.0]}
+    cached.will_reduce = False
+    assert cache.get(nexus_file, nexus_file.stat()).will_reduce
+
+
+def test_memory_cache_counts_hits_and_misses(nexus_file: Path, job_request: JobRequest) -> None:
+    """
+    Test the hit and miss counters
+    :return: None
+    """
+    cache = MemoryMetadataCache(max_size=2, ttl=60)
+    cache.get(nexus_file, nexus_file.stat())
+    cache.put(nexus_file, nexus_file.stat(), job_request)
+    cache.get(nexus_file, nexus_file.stat())
+    cache.get(nexus_file, nexus_file.stat())
+
+    assert (cache.hits, cache.misses) == (2, 1)
+
+
+def test_memory_cache_evicts_least_recently_used(tmp_path: Path, job_request: JobRequest) -> None:
+    """
+    Test the least recently used entry is evicted once the cache is full
+    :return: None
+    """
+    cache = MemoryMetadataCache(max_size=2, ttl=60)
+    paths = [tmp_path / f"{run}.nxs" for run in range(3)]
+    for path in paths:
+        path.touch()
+    cache.put(paths[0], paths[0].stat(), job_request)
+    cache.put(paths[1], paths[1].stat(), job_request)
+    cache.get(paths[0], paths[0].stat())
+    cache.put(paths[2], paths[2].stat(), job_request)
+
+    assert cache.get(paths[1], paths[1].stat()) is None
+    assert cache.get(paths[0], paths[0].stat()) is not None
+
+
+def test_memory_cache_expires_entries(nexus_file: Path, job_request: JobRequest) -> None:
+    """
+    Test entries are not returned once their TTL has passed
+    :return: None
+    """
+    cache = MemoryMetadataCache(max_size=2, ttl=60)
+    with patch("rundetection.ingestion.metadata_cache.time.monotonic", return_value=0):
+        cache.put(nexus_file, nexus_file.stat(), job_request)
+    with patch("rundetection.ingestion.metadata_cache.time.monotonic", return_value=61):
+        assert cache.get(nexus_file, nexus_file.stat()) is None
+    assert len(cache) == 0
+
+
+def test_memory_cache_misses_changed_file(nexus_file: Path, job_request: JobRequest) -> None:
+    """
+    Test an entry is dropped once the file's size or mtime change
+    :return: None
+    """
+    cache = MemoryMetadataCache(max_size=2, ttl=60)
+    cache.put(nexus_file, nexus_file.stat(), job_request)
+    nexus_file.write_bytes(b"rewritten nexus")
+
+    assert cache.get(nexus_file, nexus_file.stat()) is None
+
+
+def test_ingest_fills_memory_cache_from_metadata_cache(tmp_path: Path) -> None:
+    """
+    Test a hit in the persistent cache is also cached in memory
+    :return: None
+    """
+    memory_cache = MemoryMetadataCache(max_size=2, ttl=60)
+    with patch("rundetection.ingestion.ingest.get_metadata_cache", return_value=MetadataCache(tmp_path)):
+        ingest(NEXUS_FILE)
+        with patch("rundetection.ingestion.ingest.get_memory_metadata_cache", return_value=memory_cache):
+            ingest(NEXUS_FILE)
+
+    assert len(memory_cache) == 1
@@ -0,0 +1,92 @@
+"""
+Read plan tests
+"""
+
+from unittest.mock import MagicMock
+
+import numpy as np
+import pytest
+from h5py import File  # type: ignore
+
+from rundetection.exceptions import IngestError
+from rundetection.ingestion.read_plan import Field, ReadPlan, bounds, first_int, first_str
+
+ENTRY = {
+    "run_number": (12,),
+    "title": (b"title",),
+    "selog": {"freq6": {"value_log": {"value": (6.0,)}}, "phase6": {"value": (1221.0,)}},
+    "tof": (3.0, 1.0, 2.0),
+}
+
+
+def test_read_decodes_fields():
+    """
+    Test each field is read from its path and decoded
+    :return: None
+    """
+    plan = ReadPlan(
+        [
+            Field("run_number", "run_number", first_int),
+            Field("title", "title", first_str),
+            Field("freq6", "selog/freq6/value_log/value"),
+            Field("phase6", "selog/phase6/value"),
+            Field("tof", "tof", bounds),
+        ]
+    )
+
+    assert plan.read(ENTRY) == {
+        "run_number": 12,
+        "title": "title",
+        "freq6": 6.0,
+        "phase6": 1221.0,
+        "tof": (1.0, 3.0),
+    }
+
+
+def test_read_resolves_shared_groups_once():
+    """
+    Test a group shared by several fields is only looked up once
+    :return: None
+    """
+    entry = MagicMock()
+    plan = ReadPlan([Field("phase6", "selog/phase6/value"), Field("phase10", "selog/phase10/value")])
+
+    plan.read(entry)
+
+    entry.get.assert_called_once_with("selog")
+
+
+def test_read_uses_defaults_for_missing_datasets():
+    """
+    Test optional fields take their default when their dataset, or a group on its path, is missing
+    :return: None
+    """
+    plan = ReadPlan([Field("sam_mass", "sam_mass", default=0.0), Field("freq10", "missing/freq10", default=None)])
+
+    assert plan.read(ENTRY) == {"sam_mass": 0.0, "freq10": None}
+
+
+def test_read_raises_when_missing_required_value_used():
+    """
+    Test a missing required field only raises once its value is used
+    :return: None
+    """
+    plan = ReadPlan([Field("run_number", "run_number", first_int), Field("freq10", "selog/freq10/value")])
+
+    values = plan.read(ENTRY)
+
+    assert values["run_number"] == 12  # noqa: PLR2004
+    with pytest.raises(IngestError, match="selog/freq10/value"):
+        values["freq10"]
+    with pytest.raises(KeyError):
+        values["unknown"]
+
+
+def test_bounds_reads_h5py_dataset():
+    """
+    Test the bounds of a h5py dataset are read without iterating it in python
+    :return: None
+    """
+    with File("bounds.nxs", "w", driver="core", backing_store=False) as file:
+        dataset = file.create_dataset("time_of_flight", data=np.linspace(19500.0, 1000.0, 2001, dtype=np.float32))
+        assert bounds(dataset) == (1000.0, 19500.0)
@@ -0,0 +1,125 @@
+"""
+Run index tests
+"""
+
+import os
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+from rundetection.ingestion.run_index import RunIndex
+from rundetection.job_requests import JobRequest
+
+
+def _job_request(path: Path) -> JobRequest:
+    return JobRequest(1, "inst", path.stem.rstrip("0123456789"), "sd", path, "start", "end", 1, 1, "users")
+
+
+@pytest.fixture()
+def mock_ingest():
+    with patch("rundetection.ingestion.run_index.ingest", side_effect=_job_request) as mock_ingest:
+        yield mock_ingest
+
+
+def _touch(directory: Path, *names: str) -> list[Path]:
+    paths = [directory / name for name in names]
+    for path in paths:
+        path.touch()
+    return paths
+
+
+def _run_group(job_request: JobRequest) -> str:
+    return job_request.experiment_title
+
+
+def test_get_related_runs_groups_directory(tmp_path: Path, mock_ingest) -> None:
+    """
+    Test the other runs in the same group are returned, and files that are not nexus files are ignored
+    :return: None
+    """
+    a1, a2, _ = _touch(tmp_path, "a1.nxs", "a2.nxs", "b1.nxs")
+    (tmp_path / "a3.log").touch()
+
+    assert RunIndex(_run_group).get_related_runs(_job_request(a1)) == [a2]
+
+
+def test_get_related_runs_ingests_each_file_once(tmp_path: Path, mock_ingest) -> None:
+    """
+    Test unchanged directories are not rescanned and only new files are ingested
+    :return: None
+    """
+    a1, a2 = _touch(tmp_path, "a1.nxs", "a2.nxs")
+    index = RunIndex(_run_group)
+    index.get_related_runs(_job_request(a1))
+    index.get_related_runs(_job_request(a2))
+    assert mock_ingest.call_count == 2  # noqa: PLR2004
+
+    (a3,) = _touch(tmp_path, "a3.nxs")
+    os.utime(tmp_path, ns=(0, 0))
+
+    assert index.get_related_runs(_job_request(a3)) == [a1, a2]
+    mock_ingest.assert_called_with(a3)
+    assert mock_ingest.call_count == 3  # noqa: PLR2004
+
+
+def test_get_related_runs_drops_removed_files(tmp_path: Path, mock_ingest) -> None:
+    """
+    Test files removed from the directory are dropped from the index on the next scan
+    :return: None
+    """
+    a1, a2 = _touch(tmp_path, "a1.nxs", "a2.nxs")
+    index = RunIndex(_run_group)
+    index.get_related_runs(_job_request(a1))
+    a2.unlink()
+    os.utime(tmp_path, ns=(0, 0))
+
+    assert index.get_related_runs(_job_request(a1)) == []
+
+
+def test_get_related_runs_retries_scan_after_ingest_error(tmp_path: Path, mock_ingest) -> None:
+    """
+    Test a failed scan is retried rather than leaving the directory partly indexed
+    :return: None
+    """
+    a1, a2 = _touch(tmp_path, "a1.nxs", "a2.nxs")
+    index = RunIndex(_run_group)
+    mock_ingest.side_effect = OSError
+    with pytest.raises(OSError):  # noqa: PT011
+        index.get_related_runs(_job_request(a1))
+    mock_ingest.side_effect = _job_request
+
+    assert index.get_related_runs(_job_request(a1)) == [a2]
+
+
+def test_get_related_runs_evicts_least_recently_used_directory(tmp_path: Path, mock_ingest) -> None:
+    """
+    Test only the most recently used directories are kept
+    :return: None
+    """
+    first, second = tmp_path / "first", tmp_path / "second"
+    first.mkdir()
+    second.mkdir()
+    (a1,) = _touch(first, "a1.nxs")
+    (b1,) = _touch(second, "b1.nxs")
+    index = RunIndex(_run_group, max_directories=1)
+    index.get_related_runs(_job_request(a1))
+    index.get_related_runs(_job_request(b1))
+    index.get_related_runs(_job_request(a1))
+
+    assert mock_ingest.call_count == 3  # noqa: PLR2004
+
+
+def test_get_related_runs_lists_directory_from_archive_index(tmp_path: Path, mock_ingest) -> None:
+    """
+    Test the directory is listed from the archive index when it is current
+    :return: None
+    """
+    (a1,) = _touch(tmp_path, "a1.nxs")
+    a2 = tmp_path / "a2.nxs"
+    with patch("rundetection.ingestion.ingest.get_archive_index") as mock_get_archive_index:
+        mock_get_archive_index.return_value.get_sibling_nexus_files.return_value = [a2]
+
+        assert RunIndex(_run_group).get_related_runs(_job_request(a1)) == [a2]
+
+    mock_get_archive_index.return_value.get_sibling_nexus_files.assert_called_once_with(a1)
@@ -0,0 +1,192 @@
+"""
+Run series tracker tests
+"""
+
+import threading
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+from rundetection.exceptions import IngestError
+from rundetection.ingestion.filenames import FilenameScheme
+from rundetection.ingestion.run_series import RunSeriesTracker
+
+SCHEME = FilenameScheme("RUN", "RUN", padding=0)
+
+
+@pytest.fixture()
+def titles() -> dict[Path, str]:
+    """
+    The titles of the runs in the archive
+    :return: The titles by path
+    """
+    return {}
+
+
+@pytest.fixture()
+def read_title(titles):
+    """
+    Patch the archive to contain the runs in titles
+    :return: The get_run_title mock
+    """
+    with (
+        patch("rundetection.ingestion.run_series.get_run_title", side_effect=titles.__getitem__) as mock_title,
+        patch("rundetection.ingestion.run_series.nexus_file_exists", side_effect=titles.__contains__),
+    ):
+        yield mock_title
+
+
+def _add_runs(titles: dict[Path, str], title: str, *run_numbers: int) -> None:
+    for run_number in run_numbers:
+        titles[Path(f"/archive/RUN{run_number}.nxs")] = title
+
+
+def _stitch(tracker: RunSeriesTracker, titles: dict[Path, str], run_number: int) -> list[int]:
+    path = Path(f"/archive/RUN{run_number}.nxs")
+    return tracker.get_runs_to_stitch(path, run_number, titles[path])
+
+
+@pytest.fixture()
+def tracker() -> RunSeriesTracker:
+    return RunSeriesTracker(SCHEME, str.__eq__)
+
+
+def test_cold_start_walks_back_to_the_series_start(tracker, titles, read_title) -> None:
+    """
+    Test the runs are walked back until a run with a different title
+    :return: None
+    """
+    _add_runs(titles, "other", 1)
+    _add_runs(titles, "series", 2, 3, 4)
+
+    assert _stitch(tracker, titles, 4) == [4, 3, 2]
+    assert read_title.call_count == 4  # noqa: PLR2004
+
+
+def test_next_run_extends_the_series_without_walking_back(tracker, titles, read_title) -> None:
+    """
+    Test the next run reuses the titles read for the previous run, reading only its own
+    :return: None
+    """
+    _add_runs(titles, "other", 1)
+    _add_runs(titles, "series", 2, 3, 4, 5)
+    _stitch(tracker, titles, 4)
+    read_title.reset_mock()
+
+    assert _stitch(tracker, titles, 5) == [5, 4, 3, 2]
+    assert read_title.call_count == 1
+
+
+def test_next_run_with_a_new_title_ends_the_series(tracker, titles, read_title) -> None:
+    """
+    Test a run with a different title starts a new series
+    :return: None
+    """
+    _add_runs(titles, "series", 1, 2)
+    _add_runs(titles, "new", 3)
+    _stitch(tracker, titles, 2)
+
+    assert _stitch(tracker, titles, 3) == [3]
+
+
+def test_gap_walks_the_archive(tracker, titles, read_title) -> None:
+    """
+    Test a run that does not follow the previous one walks the archive again
+    :return: None
+    """
+    _add_runs(titles, "series", 1, 2, 3, 4)
+    _stitch(tracker, titles, 2)
+    read_title.reset_mock()
+
+    assert _stitch(tracker, titles, 4) == [4, 3, 2, 1]
+    assert read_title.call_count == 4  # noqa: PLR2004
+
+
+def test_missing_boundary_run_is_probed_again(tracker, titles, read_title) -> None:
+    """
+    Test a run that had no file when the series was walked is included once it has been written
+    :return: None
+    """
+    _add_runs(titles, "series", 2, 3)
+    assert _stitch(tracker, titles, 3) == [3, 2]
+
+    _add_runs(titles, "series", 1, 4)
+    assert _stitch(tracker, titles, 4) == [4, 3, 2, 1]
+
+
+def test_titles_compared_against_the_new_run() -> None:
+    """
+    Test earlier titles are compared against each new run's title, as similarity need not be transitive
+    :return: None
+    """
+    tracker = RunSeriesTracker(SCHEME, lambda title, other: abs(len(title) - len(other)) <= 1)
+    with (
+        patch("rundetection.ingestion.run_series.get_run_title", side_effect=lambda path: "a" * int(path.stem[3:])),
+        patch("rundetection.ingestion.run_series.nexus_file_exists", return_value=True),
+    ):
+        assert tracker.get_runs_to_stitch(Path("/archive/RUN2.nxs"), 2, "aa") == [2, 1]
+        assert tracker.get_runs_to_stitch(Path("/archive/RUN3.nxs"), 3, "aaa") == [3, 2]
+
+
+def test_walk_stops_at_max_lookback(titles, read_title) -> None:
+    """
+    Test a series longer than the maximum lookback is cut short
+    :return: None
+    """
+    tracker = RunSeriesTracker(SCHEME, str.__eq__, max_lookback=3)
+    _add_runs(titles, "series", *range(1, 11))
+
+    assert _stitch(tracker, titles, 10) == [10, 9, 8]
+
+
+def test_titles_prefetched_concurrently() -> None:
+    """
+    Test the titles of earlier runs are read at the same time
+    :return: None
+    """
+    barrier = threading.Barrier(2, timeout=5)
+
+    def get_run_title(path: Path) -> str:
+        barrier.wait()
+        return "series"
+
+    tracker = RunSeriesTracker(SCHEME, str.__eq__, prefetch=2, max_lookback=4)
+    with (
+        patch("rundetection.ingestion.run_series.get_run_title", side_effect=get_run_title),
+        patch("rundetection.ingestion.run_series.nexus_file_exists", return_value=True),
+    ):
+        assert tracker.get_runs_to_stitch(Path("/archive/RUN4.nxs"), 4, "series") == [4, 3, 2, 1]
+
+
+def test_prefetched_errors_past_the_series_are_discarded(titles) -> None:
+    """
+    Test a read that fails past the end of the series does not fail the walk
+    :return: None
+    """
+
+    def get_run_title(path: Path) -> str:
+        if path.name == "RUN1.nxs":
+            raise IngestError("corrupt")
+        return titles[path]
+
+    _add_runs(titles, "series", 3, 4)
+    _add_runs(titles, "other", 1, 2)
+    tracker = RunSeriesTracker(SCHEME, str.__eq__, prefetch=4)
+    with (
+        patch("rundetection.ingestion.run_series.get_run_title", side_effect=get_run_title),
+        patch("rundetection.ingestion.run_series.nexus_file_exists", side_effect=titles.__contains__),
+    ):
+        assert _stitch(tracker, titles, 4) == [4, 3]
+
+
+def test_no_prefetch_reads_in_turn(titles, read_title) -> None:
+    """
+    Test no runs past the end of the series are read without prefetching
+    :return: None
+    """
+    _add_runs(titles, "other", 1, 2)
+    _add_runs(titles, "series", 3, 4)
+
+    assert _stitch(RunSeriesTracker(SCHEME, str.__eq__, prefetch=1), titles, 4) == [4, 3]
+    assert read_title.call_count == 3  # noqa: PLR2004
@@ -0,0 +1,129 @@
+"""
+Stat cache tests
+"""
+
+import os
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+from rundetection.ingestion.stat_cache import StatCache, path_exists
+
+
+@pytest.fixture()
+def stat_cache() -> StatCache:
+    return StatCache(max_size=8, ttl=60, negative_ttl=60)
+
+
+def test_exists_caches_existing_paths(tmp_path: Path, stat_cache: StatCache) -> None:
+    """
+    Test a path that exists is only stat'd once
+    :return: None
+    """
+    path = tmp_path / "MAR1.nxs"
+    path.touch()
+
+    assert stat_cache.exists(path)
+    path.unlink()
+    assert stat_cache.exists(path)
+    assert (stat_cache.hits, stat_cache.misses) == (1, 1)
+
+
+def test_exists_caches_missing_paths_while_directory_unchanged(tmp_path: Path, stat_cache: StatCache) -> None:
+    """
+    Test a missing path is answered from the cache until its directory changes
+    :return: None
+    """
+    path = tmp_path / "MAR1.nxs"
+    os.utime(tmp_path, ns=(0, 0))
+
+    assert not stat_cache.exists(path)
+    assert not stat_cache.exists(path)
+    assert stat_cache.negative_hits == 1
+
+    path.touch()
+    os.utime(tmp_path, ns=(1, 1))
+    assert stat_cache.exists(path)
+    assert stat_cache.misses == 2  # noqa: PLR2004
+
+
+def test_negative_entries_expire(tmp_path: Path) -> None:
+    """
+    Test missing paths are looked up again once the negative TTL has passed
+    :return: None
+    """
+    stat_cache = StatCache(max_size=8, ttl=60, negative_ttl=0)
+    path = tmp_path / "MAR1.nxs"
+
+    stat_cache.exists(path)
+    stat_cache.exists(path)
+    assert (stat_cache.negative_hits, stat_cache.misses) == (0, 2)
+
+
+def test_stat_returns_stat(tmp_path: Path, stat_cache: StatCache) -> None:
+    """
+    Test the stat of existing paths is returned, and None for missing paths
+    :return: None
+    """
+    path = tmp_path / "MAR1.nxs"
+    path.write_bytes(b"data")
+
+    stat = stat_cache.stat(path)
+    assert stat is not None
+    assert stat.st_size == 4  # noqa: PLR2004
+    assert stat_cache.stat(tmp_path / "MAR2.nxs") is None
+
+
+def test_listed_paths_exist_without_stat(tmp_path: Path, stat_cache: StatCache) -> None:
+    """
+    Test listed paths are known to exist, but are stat'd when their stat is needed
+    :return: None
+    """
+    path = tmp_path / "MAR1.nxs"
+    path.touch()
+    stat_cache.add_listed([path])
+
+    assert stat_cache.exists(path)
+    assert stat_cache.stat(path) is not None
+    assert (stat_cache.hits, stat_cache.misses) == (1, 1)
+
+
+def test_least_recently_used_evicted(tmp_path: Path) -> None:
+    """
+    Test the cache is bounded
+    :return: None
+    """
+    stat_cache = StatCache(max_size=2, ttl=60, negative_ttl=60)
+    for name in ("a", "b", "c"):
+        stat_cache.exists(tmp_path / name)
+    assert len(stat_cache) == 2  # noqa: PLR2004
+
+
+def test_hit_rate(tmp_path: Path, stat_cache: StatCache) -> None:
+    """
+    Test the hit rate counts positive and negative hits
+    :return: None
+    """
+    assert stat_cache.hit_rate == 0
+    tmp_path.joinpath("a").touch()
+    for _ in range(2):
+        stat_cache.exists(tmp_path / "a")
+        stat_cache.exists(tmp_path / "b")
+    assert stat_cache.hit_rate == 0.5  # noqa: PLR2004
+
+    stat_cache.clear()
+    assert (len(stat_cache), stat_cache.hits, stat_cache.negative_hits, stat_cache.misses) == (0, 0, 0, 0)
+
+
+def test_path_exists_without_cache(tmp_path: Path) -> None:
+    """
+    Test the filesystem is checked directly when the cache is disabled
+    :return: None
+    """
+    with (
+        patch("rundetection.ingestion.stat_cache.STAT_CACHE_SIZE", 0),
+        patch("rundetection.ingestion.stat_cache._stat_cache") as mock_stat_cache,
+    ):
+        assert path_exists(tmp_path)
+    mock_stat_cache.exists.assert_not_called()
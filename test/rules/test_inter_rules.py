@@ -4,52 +4,42 @@ Tests for inter specific rules
 
 import unittest
 from pathlib import Path
+from tempfile import TemporaryDirectory
 from unittest.mock import patch
 
 from rundetection.ingestion.ingest import JobRequest
 from rundetection.rules.inter_rules import InterStitchRule
 
 
-@patch("rundetection.rules.inter_rules.get_sibling_runs")
-def test_verify(mock_get_siblings):
+def _job_request(title: str, path: Path) -> JobRequest:
+    return JobRequest(1, "inst", title, "sd", path, "start time", "end time", 1, 1, "users")
+
+
+@patch("rundetection.ingestion.run_index.ingest")
+def test_verify(mock_ingest):
     """
     Tests that additional files from the same run are added to the additional values, while ignoring unrelated
-    :param mock_get_siblings: mocked function
+    :param mock_ingest: mocked function
     :return: (None)
     """
-    job_request = JobRequest(
-        1,
-        "inst",
-        "D2O/air h-DODAB ML Proteolip Thu post 300mM NaCl  th=2.3",
-        "sd",
-        Path("/archive/foo"),
-        "start time",
-        "end time",
-        1,
-        1,
-        "users",
-    )
-    related_job_request = JobRequest(
-        1,
-        "inst",
-        "D2O/air h-DODAB ML Proteolip Thu post 300mM NaCl  th=2.4",
-        "sd",
-        Path("/archive/foo/related.nxs"),
-        "start time",
-        "end time",
-        1,
-        1,
-        "users",
-    )
-    unrelated_job_request = JobRequest(
-        1, "inst", "ost 300mM NaCl  th=2.3", "sd", Path("/archive/foo"), "start time", "end time", 1, 1, "users"
-    )
-    mock_get_siblings.return_value = [related_job_request, unrelated_job_request]
-    rule = InterStitchRule(True)
-
-    rule.verify(job_request)
-    assert str(related_job_request.filepath) in job_request.additional_values["additional_files"]
-    assert str(unrelated_job_request.filepath) not in job_request.additional_values["additional_files"]
+    with TemporaryDirectory() as temp_dir:
+        job_request = _job_request("D2O/air h-DODAB ML Proteolip Thu post 300mM NaCl  th=2.3", Path(temp_dir, "1.nxs"))
+        related_job_request = _job_request(
+            "D2O/air h-DODAB ML Proteolip Thu post 300mM NaCl  th=2.4", Path(temp_dir, "related.nxs")
+        )
+        unrelated_job_request = _job_request("ost 300mM NaCl  th=2.3", Path(temp_dir, "unrelated.nxs"))
+        for request in (job_request, related_job_request, unrelated_job_request):
+            request.filepath.touch()
+        mock_ingest.side_effect = lambda path: {
+            related_job_request.filepath: related_job_request,
+            unrelated_job_request.filepath: unrelated_job_request,
+            job_request.filepath: job_request,
+        }[path]
+        rule = InterStitchRule(True)
+
+        rule.verify(job_request)
+
+    assert job_request.additional_values["additional_files"] == [str(related_job_request.filepath)]
 
 
 if __name__ == "__main__":
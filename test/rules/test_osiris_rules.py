@@ -14,6 +14,7 @@ from rundetection.rules.osiris_rules import (
     OsirisPanadiumRule,
     OsirisReductionModeRule,
     OsirisStitchRule,
+    ToleranceTable,
     is_y_within_5_percent_of_x,
 )
 
@@ -68,6 +69,26 @@ def test_is_y_within_5_percent_of_x(x, y, expected):
     assert is_y_within_5_percent_of_x(x, y) is expected
 
 
+def test_tolerance_table_matches_is_y_within_5_percent_of_x():
+    """Test the table bounds agree with is_y_within_5_percent_of_x, including negative references"""
+    references = [0, 1, 100, -100, 19000]
+    values = [0, 1, 0.95, 1.05, 94.9, 95, 105, 105.1, -95, -105, -94.9, -105.1, 18050, 19950, 19951]
+    table = ToleranceTable([(reference,) for reference in references])
+    matches = table.matches([(value,) for value in values])
+    for row, value in enumerate(values):
+        for column, reference in enumerate(references):
+            assert matches[row, column] == is_y_within_5_percent_of_x(value, reference)
+
+
+def test_tolerance_table_first_match():
+    """Test the first matching row is returned for each run, and -1 when none match"""
+    table = ToleranceTable([(10, 20), (10, 21), (30, 40)])
+    assert table.first_match((10, 21)) == 0
+    assert table.first_match((30, 40)) == 2  # noqa: PLR2004
+    assert table.first_match((10, 40)) == -1
+    assert list(table.first_match([(10, 21), (10, 40), (30, 40)])) == [0, -1, 2]
+
+
 def test_osiris_panadium_rule(job_request):
     """
     Test that the panadium number is set via the specification
@@ -217,6 +238,25 @@ def test_determine_analyser_valid_values(
     )
 
 
+def test_determine_analysers_batch():
+    """Test the analysers of a batch of runs are determined together, with 0 where undetermined"""
+    analysers = OsirisAnalyserRule.determine_analysers(
+        [
+            (51500, 71500, 45900, 65900),
+            (10000, 20000, 10000, 20000),
+            (22500, 42500, 19000.03, 39000),
+        ]
+    )
+    assert list(analysers) == [2, 0, 4]
+
+
+def test_mode_tables_batch():
+    """Test a batch of runs' phases are matched against the spectroscopy and diffraction tables together"""
+    phases = list(OsirisReductionModeRule.SPECTROSCOPY_PHASES[:2])
+    phases.append((-1, -1))
+    assert list(OsirisReductionModeRule.SPECTROSCOPY_TABLE.matches(phases).any(axis=-1)) == [True, True, False]
+
+
 def test_determine_analyser_raises_when_invalid_values(analyser_rule):
     """Test raises when invalid tcb given"""
     with pytest.raises(RuleViolationError):
@@ -292,10 +332,13 @@ def test_verify_should_stitch(job_request: JobRequest) -> None:
     """
     with (
         patch(
-            "rundetection.rules.osiris_rules.get_run_title",
-            side_effect=[job_request.experiment_title, "Test experiment  run 2", "different random title"],
+            "rundetection.ingestion.run_series.get_run_title",
+            side_effect=lambda path: {
+                job_request.filepath.name: job_request.experiment_title,
+                "OSIRIS99.nxs": "Test experiment  run 2",
+            }.get(path.name, "different random title"),
         ),
-        patch("rundetection.rules.osiris_rules.Path.exists", return_value=True),
+        patch("rundetection.ingestion.run_series.nexus_file_exists", return_value=True),
     ):
         rule = OsirisStitchRule(True)
         rule.verify(job_request)
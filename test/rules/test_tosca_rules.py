@@ -62,10 +62,13 @@ def test_verify_should_stitch(job_request):
     """
     with (
         patch(
-            "rundetection.rules.tosca_rules.get_run_title",
-            side_effect=[job_request.experiment_title, "experiment title run 2", "different experiment"],
+            "rundetection.ingestion.run_series.get_run_title",
+            side_effect=lambda path: {
+                job_request.filepath.name: job_request.experiment_title,
+                "TSC12344.nxs": "experiment title run 2",
+            }.get(path.name, "different experiment"),
         ),
-        patch("rundetection.rules.tosca_rules.Path.exists", return_value=True),
+        patch("rundetection.ingestion.run_series.nexus_file_exists", return_value=True),
     ):
         rule = ToscaStitchRule(True)
         rule.verify(job_request)
@@ -0,0 +1,184 @@
+"""
+Tests for the asyncio run detection engine
+"""
+
+import asyncio
+from concurrent.futures.process import BrokenProcessPool
+from unittest.mock import MagicMock, Mock, patch
+
+import pytest
+from pika.spec import Basic
+
+from rundetection.async_engine import AsyncRunDetection, start_async_run_detection
+from rundetection.exceptions import NotificationError, ReductionMetadataError
+
+
+def _engine(job_requests):
+    """
+    Build an engine whose publishes are confirmed straight away
+    :param job_requests: The job requests detect should return
+    :return: The engine and its mock publish channel
+    """
+    engine = AsyncRunDetection(executor=None)
+    engine._publish_channel = MagicMock()
+    engine._closed = asyncio.get_running_loop().create_future()
+
+    def confirm(*_):
+        engine._on_confirm(Mock(method=Basic.Ack(delivery_tag=engine._publish_count)))
+
+    engine._publish_channel.basic_publish.side_effect = confirm
+    patcher = patch("rundetection.async_engine.detect", return_value=job_requests)
+    return engine, patcher
+
+
+def test_handle_message_publishes_then_acks():
+    """
+    Test notifications are published and the message acked once confirmed
+    :return: None
+    """
+
+    async def run():
+        request = Mock(run_number=1, to_json_string=Mock(return_value="{}"))
+        engine, patcher = _engine([request])
+        channel = MagicMock()
+        with patcher, patch.object(asyncio.get_running_loop(), "run_in_executor", new=_run_inline):
+            await engine.handle_message(channel, 7, b"some/path/nexus.nxs")
+        engine._publish_channel.basic_publish.assert_called_once_with("scheduled-jobs", "", b"{}")
+        channel.basic_ack.assert_called_once_with(7)
+
+    asyncio.run(run())
+
+
+async def _run_inline(_executor, fn, *args):
+    return fn(*args)
+
+
+@pytest.mark.parametrize(("error", "acked"), [(ReductionMetadataError, True), (RuntimeError, False)])
+def test_handle_message_errors(error, acked):
+    """
+    Test metadata errors are acked and other errors are nacked
+    :param error: The error detect raises
+    :param acked: Whether the message should be acked
+    :return: None
+    """
+
+    async def run():
+        engine, patcher = _engine([])
+        channel = MagicMock()
+        with patcher as mock_detect, patch.object(asyncio.get_running_loop(), "run_in_executor", new=_run_inline):
+            mock_detect.side_effect = error
+            await engine.handle_message(channel, 7, b"some/path/nexus.nxs")
+        if acked:
+            channel.basic_ack.assert_called_once_with(7)
+        else:
+            channel.basic_nack.assert_called_once_with(7)
+            channel.basic_ack.assert_not_called()
+
+    asyncio.run(run())
+
+
+def test_handle_message_backs_off_before_nacking_a_repeated_failure():
+    """
+    Test a message that fails again is only nacked after its backoff
+    :return: None
+    """
+
+    async def run():
+        engine, patcher = _engine([])
+        channel = MagicMock()
+        with (
+            patcher as mock_detect,
+            patch.object(asyncio.get_running_loop(), "run_in_executor", new=_run_inline),
+            patch("rundetection.async_engine.asyncio.sleep") as mock_sleep,
+        ):
+            mock_detect.side_effect = RuntimeError
+            await engine.handle_message(channel, 7, b"some/path/nexus.nxs")
+            mock_sleep.assert_not_called()
+            await engine.handle_message(channel, 8, b"some/path/nexus.nxs")
+        mock_sleep.assert_called_once_with(0.5)
+        assert channel.basic_nack.call_count == 2  # noqa: PLR2004
+
+    asyncio.run(run())
+
+
+def test_handle_message_broken_pool_stops_engine():
+    """
+    Test a broken ingest worker pool stops the engine, leaving the message to be redelivered
+    :return: None
+    """
+
+    async def run():
+        engine, patcher = _engine([])
+        channel = MagicMock()
+        with patcher as mock_detect, patch.object(asyncio.get_running_loop(), "run_in_executor", new=_run_inline):
+            mock_detect.side_effect = BrokenProcessPool
+            await engine.handle_message(channel, 7, b"some/path/nexus.nxs")
+        with pytest.raises(BrokenProcessPool):
+            engine._closed.result()
+        channel.basic_ack.assert_not_called()
+        channel.basic_nack.assert_not_called()
+
+    asyncio.run(run())
+
+
+def test_on_confirm_multiple_and_nack():
+    """
+    Test multiple acks resolve every earlier publish, and nacks fail the publish
+    :return: None
+    """
+
+    async def run():
+        engine = AsyncRunDetection(executor=None)
+        engine._publish_channel = MagicMock()
+        first, second, third = engine.publish(b"1"), engine.publish(b"2"), engine.publish(b"3")
+
+        engine._on_confirm(Mock(method=Basic.Ack(delivery_tag=2, multiple=True)))
+        engine._on_confirm(Mock(method=Basic.Nack(delivery_tag=3)))
+
+        assert first.result() is None
+        assert second.result() is None
+        with pytest.raises(NotificationError):
+            third.result()
+
+    asyncio.run(run())
+
+
+def test_on_closed_fails_outstanding_publishes():
+    """
+    Test closing the connection fails unconfirmed publishes and stops the engine
+    :return: None
+    """
+
+    async def run():
+        engine = AsyncRunDetection(executor=None)
+        engine._publish_channel = MagicMock()
+        engine._closed = asyncio.get_running_loop().create_future()
+        publish = engine.publish(b"1")
+
+        engine._on_closed(None, ConnectionError("gone"))
+
+        with pytest.raises(NotificationError):
+            publish.result()
+        with pytest.raises(ConnectionError):
+            engine._closed.result()
+
+    asyncio.run(run())
+
+
+def test_restart_creates_new_ingest_pool():
+    """
+    Test each restart of the engine gets a new ingest worker pool, as a broken pool cannot be reused
+    :return: None
+    """
+    with (
+        pytest.raises(InterruptedError),
+        patch("rundetection.async_engine.load_specifications"),
+        patch("rundetection.async_engine.create_ingest_executor") as mock_create_executor,
+        patch("rundetection.async_engine.AsyncRunDetection"),
+        patch("rundetection.async_engine.asyncio.run", side_effect=BrokenProcessPool),
+        patch("rundetection.async_engine.time.sleep", side_effect=[None, InterruptedError]),
+    ):
+        start_async_run_detection()
+
+    assert mock_create_executor.call_count == 2  # noqa: PLR2004
+    assert mock_create_executor.return_value.__exit__.call_count == 2  # noqa: PLR2004
@@ -3,31 +3,37 @@ Tests for run detection module
 """
 
 import logging
+import os
 import re
 import time
 import unittest
+from concurrent.futures import Future
 from pathlib import Path
 from queue import SimpleQueue
 from unittest.mock import MagicMock, Mock, patch
 
 import pytest
 
-from rundetection.exceptions import ReductionMetadataError
+from rundetection.exceptions import ReductionMetadataError, SpecificationError
 from rundetection.ingestion.ingest import JobRequest
 from rundetection.run_detection import (
-    get_channel,
+    Consumer,
+    NackBackoff,
+    ack_messages,
+    create_ingest_executor,
+    detect,
+    main,
     process_message,
-    process_messages,
     process_notifications,
-    producer,
     start_run_detection,
     verify_archive_access,
     write_readiness_probe_file,
 )
+from rundetection.specifications import SpecificationRegistry, get_reload_generation
 
 
 @patch("rundetection.run_detection.ingest")
-@patch("rundetection.run_detection.InstrumentSpecification")
+@patch("rundetection.run_detection.get_specification")
 def test_process_message(
     mock_instrument_spec,
     mock_ingest,
@@ -65,7 +71,7 @@ def test_process_message(
 
 
 @patch("rundetection.run_detection.ingest")
-@patch("rundetection.run_detection.InstrumentSpecification")
+@patch("rundetection.run_detection.get_specification")
 def test_process_message_no_notification(mock_instrument_spec, mock_ingest):
     """
     Test process message does not update notification queue if spec fails to verify
@@ -99,92 +105,243 @@ def test_process_message_no_notification(mock_instrument_spec, mock_ingest):
     assert notification_queue.empty()
 
 
+def _deliver(consumer, delivery_tag, body=b"message_body"):
+    consumer.on_message(delivery_tag, body)
+
+
+@patch("rundetection.run_detection.ingest")
+@patch("rundetection.run_detection.is_instrument_enabled", return_value=False)
+def test_process_message_skips_disabled_instrument(mock_is_enabled, mock_ingest):
+    """
+    Test files of disabled instruments are skipped without being ingested
+    :param mock_is_enabled: Mock is_instrument_enabled
+    :param mock_ingest: Mock ingest function
+    :return: None
+    """
+    notification_queue = SimpleQueue()
+
+    process_message("/archive/NDXALF/Instrument/data/cycle_24_1/ALF82301.nxs", notification_queue)
+
+    mock_is_enabled.assert_called_once_with("ALF")
+    mock_ingest.assert_not_called()
+    assert notification_queue.empty()
+
+
 @patch("rundetection.run_detection.process_message")
-def test_process_messages(mock_process):
+def test_consumer_on_message_publishes_and_acks(mock_process):
     """
-    Test each message is processed and acked
-    :param mock_process: Mock process messages function
+    Test a delivered message is processed, published and acked once the batch is full
+    :param mock_process: Mock process message function
     :return: None
     """
-    channel = MagicMock()
-    method_frame = MagicMock()
-    body = b"message_body"
-    channel.consume.return_value = [(method_frame, None, body)]
+    transport = MagicMock()
+    consumer = Consumer(transport, batch_size=1)
+    mock_process.side_effect = lambda _, queue: queue.put(Mock(to_json_string=Mock(return_value="{}")))
+
+    _deliver(consumer, 1)
 
-    notification_queue = Mock()
+    assert mock_process.call_args.args[0] == "message_body"
+    transport.publish.assert_called_once_with("scheduled-jobs", b"{}")
+    transport.ack.assert_called_once_with(1, multiple=True)
 
-    process_messages(channel, notification_queue)
 
-    channel.consume.assert_called_once()
-    mock_process.assert_called_once_with(body.decode(), notification_queue)
-    channel.basic_ack.assert_called_once_with(method_frame.delivery_tag)
+@patch("rundetection.run_detection.process_message")
+def test_consumer_batches_until_flushed(mock_process):
+    """
+    Test messages are not acked until the batch is full
+    :param mock_process: Mock process message function
+    :return: None
+    """
+    transport = MagicMock()
+    consumer = Consumer(transport, batch_size=3)
+
+    _deliver(consumer, 1)
+    _deliver(consumer, 2)
+    transport.ack.assert_not_called()
+    _deliver(consumer, 3)
+
+    assert mock_process.call_count == 3  # noqa: PLR2004
+    transport.ack.assert_called_once_with(3, multiple=True)
 
 
 @patch("rundetection.run_detection.process_message")
-def test_process_messages_raises_exception_nacks(mock_process):
+def test_consumer_flush_acks_partial_batch(mock_process):
     """
-    Test messages are still acked after exception in processing
-    :param mock_process: Mock Process messages function
+    Test flushing acks a partially filled batch, and does nothing when the batch is empty
+    :param mock_process: Mock process message function
     :return: None
     """
-    channel = MagicMock()
-    method_frame = MagicMock()
-    body = b"message_body"
-    channel.consume.return_value = [(method_frame, None, body)]
-    notification_queue = SimpleQueue()
+    transport = MagicMock()
+    consumer = Consumer(transport, batch_size=3)
+    _deliver(consumer, 1)
+
+    consumer.flush()
+    consumer.flush()
+
+    mock_process.assert_called_once()
+    transport.ack.assert_called_once_with(1, multiple=True)
+
+
+@patch("rundetection.run_detection.process_message")
+def test_consumer_exception_nacks(mock_process):
+    """
+    Test messages are nacked after exception in processing
+    :param mock_process: Mock Process message function
+    :return: None
+    """
+    transport = MagicMock()
+    consumer = Consumer(transport, batch_size=1)
     mock_process.side_effect = RuntimeError
 
-    process_messages(channel, notification_queue)
+    _deliver(consumer, 1)
 
-    channel.consume.assert_called_once()
-    mock_process.assert_called_once_with(body.decode(), notification_queue)
-    channel.basic_nack.assert_called_once_with(method_frame.delivery_tag)
+    transport.nack.assert_called_once_with(1)
+    transport.ack.assert_not_called()
 
 
 @patch("rundetection.run_detection.process_message")
-def test_process_messages_raises_metadataerror_still_acks(mock_process):
+def test_consumer_backs_off_before_nacking_a_repeated_failure(mock_process):
     """
-    Test messages are still acked after exception in processing
-    :param mock_process: Mock Process messages function
+    Test a message that fails again is nacked after its backoff, and that the messages acked meanwhile are acked one by
+    one so the failed message is not acked with them
+    :param mock_process: Mock Process message function
     :return: None
     """
-    channel = MagicMock()
-    method_frame = MagicMock()
-    body = b"message_body"
-    channel.consume.return_value = [(method_frame, None, body)]
-    notification_queue = SimpleQueue()
+    transport = MagicMock()
+    consumer = Consumer(transport, batch_size=1)
+    mock_process.side_effect = RuntimeError
+    _deliver(consumer, 1)
+    _deliver(consumer, 2)
+
+    transport.nack.assert_called_once_with(1)
+    delay, nack = transport.call_later.call_args.args
+    assert delay == 0.5  # noqa: PLR2004
+
+    mock_process.side_effect = None
+    _deliver(consumer, 3, b"other_body")
+    transport.ack.assert_called_once_with(3)
+
+    nack()
+    transport.nack.assert_called_with(2)
+    _deliver(consumer, 4, b"other_body")
+    transport.ack.assert_called_with(4, multiple=True)
+
+
+def test_nack_backoff():
+    """
+    Test the backoff doubles with each repeated failure up to the maximum, and is reset once the message succeeds
+    :return: None
+    """
+    backoff = NackBackoff(initial=1, maximum=3)
+
+    assert [backoff.failed(b"body") for _ in range(4)] == [0, 1, 2, 3]
+    assert backoff.failed(b"other") == 0
+    backoff.succeeded(b"body")
+    assert backoff.failed(b"body") == 0
+
+
+@patch("rundetection.run_detection.process_message")
+def test_consumer_metadataerror_still_acks(mock_process):
+    """
+    Test messages are still acked after a metadata error in processing
+    :param mock_process: Mock Process message function
+    :return: None
+    """
+    transport = MagicMock()
+    consumer = Consumer(transport, batch_size=1)
     mock_process.side_effect = ReductionMetadataError
 
-    process_messages(channel, notification_queue)
+    _deliver(consumer, 1)
+
+    transport.ack.assert_called_once_with(1, multiple=True)
+
+
+@patch("rundetection.run_detection.process_message")
+def test_detect(mock_process):
+    """
+    Test detect returns every job request process_message queued
+    :param mock_process: Mock process_message
+    :return: None
+    """
+    mock_process.side_effect = lambda _, queue: [queue.put(1), queue.put(2)]
+
+    assert detect("some/path/nexus.nxs") == [1, 2]
+    assert isinstance(mock_process.call_args.args[1], SimpleQueue)
+
+
+def test_consumer_with_executor_handles_results_in_delivery_order():
+    """
+    Test results from the ingest pool are published and acked in delivery order, even when a later message finishes
+    first, and that failures are nacked in turn
+    :return: None
+    """
+    futures = [Future(), Future(), Future()]
+    executor = Mock(submit=Mock(side_effect=futures))
+    transport = MagicMock()
+    transport.call_threadsafe.side_effect = lambda callback: callback()
+    consumer = Consumer(transport, batch_size=10, executor=executor)
+    for tag in (1, 2, 3):
+        _deliver(consumer, tag)
+
+    futures[2].set_exception(RuntimeError)
+    futures[1].set_result([Mock(to_json_string=Mock(return_value="2"))])
+    transport.nack.assert_not_called()
+    futures[0].set_result([Mock(to_json_string=Mock(return_value="1"))])
+    consumer.flush()
+
+    executor.submit.assert_called_with(detect, "message_body")
+    assert [call.args[1] for call in transport.publish.call_args_list] == [b"1", b"2"]
+    transport.nack.assert_called_once_with(3)
+    transport.ack.assert_called_once_with(2, multiple=True)
+
+
+@patch("rundetection.run_detection.write_readiness_probe_file")
+def test_consumer_run(mock_write_probe):
+    """
+    Test the consumer registers its callback, starts the heartbeat timer and blocks on the transport for events
+    :param mock_write_probe: Mock readiness probe writer
+    :return: None
+    """
+    transport = MagicMock()
+    transport.process_events.side_effect = [None, InterruptedError]
+    consumer = Consumer(transport, heartbeat_interval=5)
+
+    with pytest.raises(InterruptedError):
+        consumer.run()
 
-    channel.consume.assert_called_once()
-    mock_process.assert_called_once_with(body.decode(), notification_queue)
-    channel.basic_ack.assert_called_once_with(method_frame.delivery_tag)
+    transport.consume.assert_called_once_with("watched-files", consumer.on_message)
+    mock_write_probe.assert_called_once()
+    transport.call_later.assert_called_once_with(5, consumer._heartbeat)
+    assert transport.process_events.call_count == 2  # noqa: PLR2004
 
 
-def test_process_messages_does_not_ack_attribute_error():
+def test_ack_messages():
     """
-    Test messages are not acked after AttributeError in processing. As this should only occur when no message is
-    consumed.
-    :param mock_process: Mock Process messages function
+    Test the batch is acked with multiple set
     :return: None
     """
-    channel = MagicMock()
-    channel.consume.return_value = [(None, None, None)]
+    transport = MagicMock()
 
-    notification_queue = Mock()
+    ack_messages(transport, 3)
 
-    with patch("rundetection.run_detection.process_message"):
-        process_messages(channel, notification_queue)
+    transport.ack.assert_called_once_with(3, multiple=True)
 
-    channel.consume.assert_called_once()
-    channel.basic_ack.assert_not_called()
 
+def test_ack_messages_nothing_to_ack():
+    """
+    Test nothing is acked when there is no delivery tag
+    :return: None
+    """
+    transport = MagicMock()
+
+    ack_messages(transport, None)
 
-@patch("rundetection.run_detection.producer")
-def test_process_notifications(mock_producer):
+    transport.ack.assert_not_called()
+
+
+def test_process_notifications():
     """
-    Tests messages in the notification queue are produced by the producer
+    Tests messages in the notification queue are published through the transport
     :param mock_byte: Mock bytearray class
     :return: None
     """
@@ -200,14 +357,13 @@ def test_process_notifications(mock_producer):
     notification_queue.put(detected_run_1)
     notification_queue.put(detected_run_2)
 
-    channel = MagicMock()
-    mock_producer.return_value.__enter__.return_value = channel
+    transport = MagicMock()
 
     # Call function
-    process_notifications(notification_queue)
+    process_notifications(notification_queue, transport)
 
-    channel.basic_publish.assert_any_call("scheduled-jobs", "", b'{"run_number": "1"}')
-    channel.basic_publish.assert_any_call("scheduled-jobs", "", b'{"run_number": "2"}')
+    transport.publish.assert_any_call("scheduled-jobs", b'{"run_number": "1"}')
+    transport.publish.assert_any_call("scheduled-jobs", b'{"run_number": "2"}')
 
     # Assert the queue is empty
     assert notification_queue.empty()
@@ -218,94 +374,189 @@ def test_start_run_detection():
     Mock run detection start up
     :return:  None
     """
-    mock_channel = Mock()
+    with (
+        pytest.raises(InterruptedError),
+        patch("rundetection.run_detection.PikaTransport") as mock_transport,
+        patch("rundetection.run_detection.Consumer", **{"return_value.run.side_effect": RuntimeError}) as mock_consumer,
+        patch("rundetection.run_detection.time.sleep", side_effect=InterruptedError),
+        patch("rundetection.run_detection.load_specifications") as mock_load_specifications,
+    ):
+        start_run_detection()
 
+    mock_load_specifications.assert_called_once()
+    mock_transport.assert_called_once_with("watched-files", 0)
+    mock_consumer.assert_called_once_with(mock_transport.return_value, executor=None)
+    mock_transport.return_value.close.assert_called_once()
+
+
+@patch("rundetection.run_detection.INGEST_WORKERS", 2)
+def test_start_run_detection_with_ingest_workers():
+    """
+    Test the archive index is left to the ingest workers when there are any
+    :return: None
+    """
     with (
         pytest.raises(InterruptedError),
-        patch("rundetection.run_detection.get_channel", return_value=mock_channel) as mock_get_channel,
-        patch("rundetection.run_detection.process_messages") as mock_proc_messages,
-        patch("rundetection.run_detection.process_notifications") as mock_proc_notifications,
-        patch("rundetection.run_detection.SimpleQueue") as mock_queue,
+        patch("rundetection.run_detection.PikaTransport"),
+        patch("rundetection.run_detection.Consumer", **{"return_value.run.side_effect": RuntimeError}) as mock_consumer,
         patch("rundetection.run_detection.time.sleep", side_effect=InterruptedError),
+        patch("rundetection.run_detection.load_specifications"),
+        patch("rundetection.run_detection.create_ingest_executor") as mock_create_executor,
+        patch("rundetection.run_detection.start_archive_index") as mock_start_index,
     ):
         start_run_detection()
 
-    mock_get_channel.assert_called_once_with("watched-files", "watched-files")
+    mock_create_executor.assert_called_once_with(2)
+    mock_start_index.assert_not_called()
+    assert mock_consumer.call_args.kwargs["executor"] == mock_create_executor.return_value
+    mock_create_executor.return_value.shutdown.assert_called_once_with(wait=False, cancel_futures=True)
+
+
+def _worker_reload_generation() -> int:
+    return get_reload_generation().value
+
+
+def test_ingest_workers_share_reload_generation():
+    """
+    Test a reload requested in the consumer, e.g. on SIGHUP, is seen by the ingest workers, which do not receive it
+    :return: None
+    """
+    with create_ingest_executor(1) as executor:
+        executor.submit(os.getpid).result(timeout=60)
+        SpecificationRegistry().request_reload()
+
+        assert executor.submit(_worker_reload_generation).result(timeout=60) == get_reload_generation().value
+
 
-    mock_proc_messages.assert_called_with(mock_channel, mock_queue.return_value)
-    mock_proc_notifications.assert_called_with(mock_queue.return_value)
+def test_create_ingest_executor():
+    """
+    Test ingest workers are separate, spawned processes
+    :return: None
+    """
+    with create_ingest_executor(1) as executor:
+        assert executor.submit(os.getpid).result(timeout=60) != os.getpid()
+        assert executor._mp_context.get_start_method() == "spawn"
 
 
-@patch("rundetection.run_detection.Path")
-def test_verify_archive_access_accessible(mock_path, caplog):
+@patch("rundetection.run_detection.path_exists", return_value=True)
+def test_verify_archive_access_accessible(mock_path_exists, caplog):
     """
     Test logging when archive is accessible
-    :param mock_path: mock Path class
+    :param mock_path_exists: mock path_exists function
     :param caplog: log capture fixture
     :return: None
     """
-    mock_path.return_value.exists.return_value = True
     with caplog.at_level(logging.INFO):
         verify_archive_access()
 
         assert "The archive has been mounted correctly, and can be accessed." in caplog.messages
+    mock_path_exists.assert_called_once_with(Path("/archive", "NDXALF"))
 
 
-@patch("rundetection.run_detection.Path")
-def test_verify_archive_access_not_accessible(mock_path, caplog):
+@patch("rundetection.run_detection.path_exists", return_value=False)
+def test_verify_archive_access_not_accessible(mock_path_exists, caplog):
     """
     Test logging when archive not accessible
-    :param mock_path: Mock path class
+    :param mock_path_exists: Mock path_exists function
     :param caplog: Log capture fixture
     :return: None
     """
-    mock_path.return_value.exists.return_value = False
     with caplog.at_level(logging.INFO):
         verify_archive_access()
 
         assert "The archive has not been mounted correctly, and cannot be accessed." in caplog.text
 
 
-@patch("rundetection.run_detection.PlainCredentials")
-@patch("rundetection.run_detection.ConnectionParameters")
-@patch("rundetection.run_detection.BlockingConnection")
-def test_get_channel(mock_blocking_connection, mock_connection_parameters, mock_plain_credentials):
-    """Test channel is created and returned"""
-    mock_channel = MagicMock()
-    mock_blocking_connection.return_value.channel.return_value = mock_channel
+@patch("rundetection.run_detection.load_specifications")
+@patch("rundetection.run_detection.verify_archive_access")
+@patch("rundetection.run_detection.start_run_detection")
+def test_main_default_engine(mock_start, mock_verify, mock_load):
+    """
+    Test the blocking engine is started by default
+    :param mock_start: Mock blocking engine start
+    :param mock_verify: Mock archive check
+    :param mock_load: Mock load_specifications
+    :return: None
+    """
+    main([])
 
-    exchange_name = "test_exchange"
-    queue_name = "test_queue"
+    mock_load.assert_called_once()
+    mock_verify.assert_called_once()
+    mock_start.assert_called_once()
 
-    # Call function
-    channel = get_channel(exchange_name, queue_name)
 
-    # Assert
-    mock_plain_credentials.assert_called_once_with(username="guest", password="guest")  # noqa: S106
-    mock_connection_parameters.assert_called_once_with(
-        "localhost", 5672, credentials=mock_plain_credentials.return_value
-    )
-    mock_blocking_connection.assert_called_once_with(mock_connection_parameters.return_value)
+@patch("rundetection.run_detection.load_specifications")
+@patch("rundetection.run_detection.verify_archive_access")
+@patch("rundetection.async_engine.start_async_run_detection")
+def test_main_asyncio_engine(mock_start, mock_verify, mock_load):
+    """
+    Test the asyncio engine is started when requested
+    :param mock_start: Mock asyncio engine start
+    :param mock_verify: Mock archive check
+    :param mock_load: Mock load_specifications
+    :return: None
+    """
+    main(["--engine", "asyncio"])
+
+    mock_load.assert_called_once()
+    mock_verify.assert_called_once()
+    mock_start.assert_called_once()
+
+
+@patch("rundetection.run_detection.load_specifications")
+@patch("rundetection.run_detection.verify_archive_access")
+@patch("rundetection.supervisor.Supervisor")
+def test_main_prefork(mock_supervisor, mock_verify, mock_load):
+    """
+    Test the supervisor is started with the blocking engine when more than one process is requested
+    :param mock_supervisor: Mock Supervisor class
+    :param mock_verify: Mock archive check
+    :param mock_load: Mock load_specifications
+    :return: None
+    """
+    main(["--processes", "4"])
 
-    mock_channel.exchange_declare.assert_called_once_with(exchange_name, exchange_type="direct", durable=True)
-    mock_channel.queue_declare.assert_called_once_with(queue_name, durable=True, arguments={"x-queue-type": "quorum"})
-    mock_channel.queue_bind.assert_called_once_with(queue_name, exchange_name, routing_key="")
+    mock_load.assert_called_once()
+    mock_verify.assert_called_once()
+    mock_supervisor.assert_called_once_with(4, start_run_detection)
+    mock_supervisor.return_value.run.assert_called_once()
 
-    assert channel == mock_channel
 
+@patch("rundetection.run_detection.verify_archive_access")
+@patch("rundetection.run_detection.start_run_detection")
+@patch("rundetection.run_detection.load_specifications")
+def test_main_check_specifications(mock_load, mock_start, mock_verify):
+    """
+    Test the specifications are validated without starting a consumer
+    :param mock_load: Mock load_specifications
+    :param mock_start: Mock blocking engine start
+    :param mock_verify: Mock archive check
+    :return: None
+    """
+    main(["--check-specifications"])
+
+    mock_load.assert_called_once()
+    mock_start.assert_not_called()
+    mock_verify.assert_not_called()
 
-@patch("rundetection.run_detection.get_channel")  # Replace with actual module name
-def test_producer(mock_get_channel):
-    """Test the producer context manager"""
-    mock_channel = MagicMock()
-    mock_get_channel.return_value = mock_channel
 
-    with producer() as channel:
-        mock_get_channel.assert_called_once_with("scheduled-jobs", "scheduled-jobs")
-        assert channel == mock_channel
+@patch("rundetection.run_detection.verify_archive_access")
+@patch("rundetection.run_detection.start_run_detection")
+@patch("rundetection.run_detection.load_specifications", side_effect=SpecificationError)
+def test_main_fails_on_invalid_specifications(mock_load, mock_start, mock_verify):
+    """
+    Test no consumer is started when a specification is invalid
+    :param mock_load: Mock load_specifications
+    :param mock_start: Mock blocking engine start
+    :param mock_verify: Mock archive check
+    :return: None
+    """
+    with pytest.raises(SpecificationError):
+        main([])
 
-    mock_channel.close.assert_called_once()
-    mock_channel.connection.close.assert_called_once()
+    mock_load.assert_called_once()
+    mock_start.assert_not_called()
+    mock_verify.assert_not_called()
 
 
 def test_write_readiness_probe_file():
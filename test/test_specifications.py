@@ -2,18 +2,33 @@
 Specification unit test module
 """
 
+import logging
 import os
+import signal
 from pathlib import Path
 from unittest.mock import Mock, patch
 
 import pytest
 from _pytest.logging import LogCaptureFixture
 
-from rundetection.exceptions import RuleViolationError
+from rundetection.exceptions import RuleViolationError, SpecificationError
 from rundetection.ingestion.ingest import JobRequest
 from rundetection.rules.common_rules import EnabledRule
-from rundetection.rules.mari_rules import MariStitchRule
-from rundetection.specifications import InstrumentSpecification
+from rundetection.rules.mari_rules import MariMaskFileRule, MariStitchRule, MariWBVANRule
+from rundetection.rules.osiris_rules import (
+    OsirisAnalyserRule,
+    OsirisCalibrationRule,
+    OsirisPanadiumRule,
+    OsirisReductionModeRule,
+    OsirisStitchRule,
+)
+from rundetection.specifications import (
+    InstrumentSpecification,
+    SpecificationRegistry,
+    is_instrument_enabled,
+    load_specifications,
+    order_rules,
+)
 
 
 @pytest.fixture()
@@ -124,8 +139,8 @@ def test_specification_rule_loading(job_request) -> None:
 
     assert isinstance(mari_specification._rules[0], EnabledRule)
     assert mari_specification._rules[0]._value
-    assert isinstance(mari_specification._rules[1], MariStitchRule)
-    assert mari_specification._rules[1]._value
+    assert isinstance(mari_specification._rules[-1], MariStitchRule)
+    assert mari_specification._rules[-1]._value
 
     assert isinstance(chronus_specification._rules[0], EnabledRule)
     assert chronus_specification._rules[0]._value is False
@@ -141,3 +156,232 @@ def test_specification_file_missing(caplog: LogCaptureFixture):
         InstrumentSpecification("foo")
 
     assert "No specification for file: foo" in caplog.text
+
+
+@pytest.mark.usefixtures("_working_directory_fix")
+@pytest.mark.parametrize(
+    ("instrument", "enabled"), [("mari", True), ("OSIRIS", True), ("alf", False), ("unknown", None)]
+)
+def test_is_instrument_enabled(instrument, enabled) -> None:
+    """
+    Test enabled instruments are recognised from their specifications
+    :param instrument: The instrument
+    :param enabled: The expected result
+    :return: None
+    """
+    assert is_instrument_enabled(instrument) is enabled
+
+
+@pytest.mark.usefixtures("_working_directory_fix")
+def test_is_instrument_enabled_unknown_is_quiet(caplog) -> None:
+    """
+    Test an instrument without a specification is not logged as an error, as it is checked for every message
+    :return: None
+    """
+    with caplog.at_level(logging.ERROR):
+        assert is_instrument_enabled("HRP") is None
+
+    assert not caplog.records
+
+
+def test_is_instrument_enabled_cached_until_specification_changes(tmp_path, monkeypatch) -> None:
+    """
+    Test the specification is only reread once it changes
+    :return: None
+    """
+    monkeypatch.setattr("rundetection.specifications.SPECIFICATIONS_DIRECTORY", tmp_path)
+    spec_file = tmp_path / "foo_specification.json"
+    spec_file.write_text('{"enabled": false}')
+    assert is_instrument_enabled("foo") is False
+
+    spec_file.write_text('{"enabled": true}')
+    os.utime(spec_file, ns=(0, 0))
+    assert is_instrument_enabled("foo") is True
+
+    with patch("rundetection.specifications.json.load") as mock_load:
+        assert is_instrument_enabled("foo") is True
+    mock_load.assert_not_called()
+
+
+@pytest.fixture()
+def specifications_directory(tmp_path, monkeypatch) -> Path:
+    directory = tmp_path
+    monkeypatch.setattr("rundetection.specifications.SPECIFICATIONS_DIRECTORY", directory)
+    (directory / "foo_specification.json").write_text('{"enabled": true}')
+    (directory / "bar_specification.json").write_text('{"enabled": false}')
+    return directory
+
+
+def test_registry_load_compiles_every_specification(specifications_directory) -> None:
+    """
+    Test every specification is compiled on load, and returned without being reread
+    :return: None
+    """
+    registry = SpecificationRegistry()
+    registry.load()
+
+    with patch("rundetection.specifications.InstrumentSpecification") as mock_specification:
+        assert registry.get("FOO").enabled
+        assert not registry.get("bar").enabled
+    mock_specification.assert_not_called()
+
+
+def test_registry_recompiles_changed_specification(specifications_directory) -> None:
+    """
+    Test a specification is recompiled once its file changes
+    :return: None
+    """
+    registry = SpecificationRegistry()
+    first = registry.get("foo")
+    (specifications_directory / "foo_specification.json").write_text('{"enabled": false}')
+    os.utime(specifications_directory / "foo_specification.json", ns=(0, 0))
+
+    second = registry.get("foo")
+
+    assert second is not first
+    assert not second.enabled
+
+
+def test_registry_reloads_on_request(specifications_directory) -> None:
+    """
+    Test every specification is recompiled once a reload is requested
+    :return: None
+    """
+    registry = SpecificationRegistry()
+    registry.load()
+    first = registry.get("foo")
+
+    registry.request_reload()
+
+    assert registry.get("foo") is not first
+
+
+def test_registry_missing_specification(specifications_directory) -> None:
+    """
+    Test a missing specification raises FileNotFoundError
+    :return: None
+    """
+    with pytest.raises(FileNotFoundError):
+        SpecificationRegistry().get("baz")
+
+
+@patch("rundetection.specifications.signal.signal")
+@patch("rundetection.specifications._registry")
+def test_load_specifications_reloads_on_sighup(mock_registry, mock_signal) -> None:
+    """
+    Test the specifications are loaded, and a reload is requested on SIGHUP
+    :return: None
+    """
+    load_specifications()
+
+    mock_registry.load.assert_called_once()
+    signum, handler = mock_signal.call_args.args
+    assert signum == signal.SIGHUP
+    handler(signum, None)
+    mock_registry.request_reload.assert_called_once()
+
+
+def test_registry_load_reports_every_invalid_specification(specifications_directory) -> None:
+    """
+    Test every invalid specification is reported together, and the previous specifications are kept
+    :return: None
+    """
+    registry = SpecificationRegistry()
+    registry.load()
+    (specifications_directory / "foo_specification.json").write_text('{"notarule": true}')
+    (specifications_directory / "bar_specification.json").write_text('{"enabled": "yes"}')
+    (specifications_directory / "baz_specification.json").write_text("{")
+
+    with pytest.raises(SpecificationError) as exc_info:
+        registry.load()
+
+    for name in ("foo", "bar", "baz"):
+        assert f"{name}_specification.json" in str(exc_info.value)
+    assert registry.get("bar").enabled is False
+
+
+def test_registry_keeps_previous_specification_when_recompile_fails(specifications_directory) -> None:
+    """
+    Test a specification edited into an invalid state does not replace the compiled one
+    :return: None
+    """
+    registry = SpecificationRegistry()
+    first = registry.get("foo")
+    (specifications_directory / "foo_specification.json").write_text('{"notarule": true}')
+    os.utime(specifications_directory / "foo_specification.json", ns=(0, 0))
+
+    assert registry.get("foo") is first
+
+
+@pytest.mark.usefixtures("_working_directory_fix")
+def test_repository_specifications_are_valid() -> None:
+    """
+    Test every specification shipped with the package compiles
+    :return: None
+    """
+    SpecificationRegistry().load()
+
+
+@pytest.mark.usefixtures("_working_directory_fix")
+def test_specification_orders_rules_cheapest_first() -> None:
+    """
+    Test expensive rules run last, after the rules whose values they copy or require
+    :return: None
+    """
+    assert [type(rule) for rule in InstrumentSpecification("osiris").rules] == [
+        EnabledRule,
+        OsirisCalibrationRule,
+        OsirisPanadiumRule,
+        OsirisReductionModeRule,
+        OsirisAnalyserRule,
+        OsirisStitchRule,
+    ]
+
+
+def test_order_rules_respects_requirements() -> None:
+    """
+    Test a rule runs after the rule providing a value it requires, even if that rule is more expensive
+    :return: None
+    """
+    analyser, mode = OsirisAnalyserRule(True), OsirisReductionModeRule(True)
+    mode.cost = 10
+
+    assert order_rules([analyser, mode]) == (mode, analyser)
+
+
+def test_order_rules_keeps_specification_order_for_equal_cost() -> None:
+    """
+    Test rules of equal cost keep their specification order
+    :return: None
+    """
+    rules = [MariWBVANRule(1), EnabledRule(True), MariMaskFileRule("mask")]
+
+    assert order_rules(rules) == tuple(rules)
+
+
+def test_order_rules_raises_on_cycle() -> None:
+    """
+    Test cyclic dependencies are reported
+    :return: None
+    """
+    first, second = Mock(cost=0, requires={"b"}, provides={"a"}), Mock(cost=0, requires={"a"}, provides={"b"})
+    first.copies_request = second.copies_request = False
+
+    with pytest.raises(SpecificationError, match="cyclic"):
+        order_rules([first, second])
+
+
+def test_verify_stops_before_expensive_rules(job_request) -> None:
+    """
+    Test a cheap rule vetoing the run stops the expensive rules being verified
+    :param job_request: JobRequest fixture
+    :return: None
+    """
+    stitch = MariStitchRule(True)
+    with patch.object(MariStitchRule, "verify") as mock_verify:
+        specification = InstrumentSpecification.__new__(InstrumentSpecification)
+        specification._rules = order_rules([stitch, EnabledRule(False)])
+        specification.verify(job_request)
+
+    mock_verify.assert_not_called()
+    assert job_request.will_reduce is False
@@ -0,0 +1,133 @@
+"""
+Tests for the prefork supervisor
+"""
+
+import os
+import time
+from unittest.mock import MagicMock, Mock, patch
+
+import pytest
+
+from rundetection import run_detection
+from rundetection.supervisor import Supervisor, _run_child, child_probe_path
+
+
+def _ingest_in_worker_pool() -> None:
+    with run_detection.create_ingest_executor(run_detection.INGEST_WORKERS) as executor:
+        assert executor.submit(os.getpid).result(timeout=30) != os.getpid()
+
+
+def test_run_child_sets_probe_file():
+    """
+    Test a child writes its readiness probe to its own file
+    :return: None
+    """
+    target = Mock(side_effect=lambda: os.environ["READINESS_PROBE_FILE"])
+
+    with patch.dict(os.environ):
+        _run_child(3, target)
+        assert os.environ["READINESS_PROBE_FILE"] == "/tmp/heartbeat-3"  # noqa: S108
+
+    target.assert_called_once()
+
+
+@patch("rundetection.supervisor.Process")
+def test_restart_dead_children(mock_process):
+    """
+    Test every child is started, and that only a dead child is restarted
+    :param mock_process: Mock Process class
+    :return: None
+    """
+    supervisor = Supervisor(2, Mock())
+    supervisor.restart_dead_children()
+    assert mock_process.call_count == 2  # noqa: PLR2004
+
+    alive, dead = MagicMock(), MagicMock()
+    alive.is_alive.return_value = True
+    dead.is_alive.return_value = False
+    supervisor._children = [alive, dead]
+    supervisor._started_at = [0.0, 0.0]
+    supervisor.restart_dead_children()
+
+    assert mock_process.call_count == 3  # noqa: PLR2004
+    dead.close.assert_called_once()
+    assert supervisor._children[1] == mock_process.return_value
+
+
+@patch("rundetection.supervisor.Process")
+def test_restart_waits_for_restart_delay(mock_process):
+    """
+    Test a child that died straight after starting is not restarted immediately
+    :param mock_process: Mock Process class
+    :return: None
+    """
+    supervisor = Supervisor(1, Mock())
+    dead = MagicMock()
+    dead.is_alive.return_value = False
+    supervisor._children = [dead]
+    supervisor._started_at = [time.monotonic()]
+
+    supervisor.restart_dead_children()
+
+    mock_process.assert_not_called()
+
+
+@pytest.mark.parametrize(("ages", "ready"), [([0, 0], True), ([0, 60], False), ([0, None], False)])
+def test_children_ready(tmp_path, ages, ready):
+    """
+    Test the pod is only ready while every child has a fresh readiness probe
+    :param tmp_path: Temporary directory fixture
+    :param ages: The age in seconds of each child's probe, None for a missing probe
+    :param ready: The expected readiness
+    :return: None
+    """
+    for index, age in enumerate(ages):
+        if age is not None:
+            path = tmp_path / f"heartbeat-{index}"
+            path.touch()
+            os.utime(path, (time.time() - age, time.time() - age))
+
+    supervisor = Supervisor(len(ages), Mock(), heartbeat_interval=5)
+    with patch("rundetection.supervisor.child_probe_path", side_effect=lambda index: tmp_path / f"heartbeat-{index}"):
+        assert supervisor.children_ready() is ready
+
+
+def test_child_probe_path():
+    """
+    Test the child probe path
+    :return: None
+    """
+    assert str(child_probe_path(0)) == "/tmp/heartbeat-0"  # noqa: S108
+
+
+@patch("rundetection.supervisor.os.kill")
+def test_forward_signals_running_children(mock_kill):
+    """
+    Test a signal, e.g. SIGHUP, is forwarded to every running child
+    :param mock_kill: Mock os.kill
+    :return: None
+    """
+    supervisor = Supervisor(2, Mock())
+    alive, dead = MagicMock(pid=10), MagicMock(pid=11)
+    alive.is_alive.return_value = True
+    dead.is_alive.return_value = False
+    supervisor._children = [alive, dead]
+
+    supervisor._forward(1, None)
+
+    mock_kill.assert_called_once_with(10, 1)
+
+
+@patch("rundetection.run_detection.INGEST_WORKERS", 2)
+def test_child_can_start_ingest_workers():
+    """
+    Test a child can start its own ingest worker processes
+    :return: None
+    """
+    supervisor = Supervisor(1, _ingest_in_worker_pool)
+    supervisor._start_child(0)
+    child = supervisor._children[0]
+    assert child is not None
+    child.join(timeout=60)
+
+    assert child.exitcode == 0
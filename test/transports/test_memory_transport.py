@@ -0,0 +1,122 @@
+"""
+Tests for the in memory transport
+"""
+
+import json
+import threading
+from unittest.mock import Mock, patch
+
+from rundetection.run_detection import Consumer
+from rundetection.transports.memory_transport import InMemoryTransport
+
+
+def test_consume_ack_and_publish():
+    """
+    Test messages are delivered to the consumer, acked and published to the egress queue
+    :return: None
+    """
+    transport = InMemoryTransport()
+    transport.put("ingress", b"1")
+    transport.put("ingress", b"2")
+    on_message = Mock()
+    transport.consume("ingress", on_message)
+
+    transport.process_events()
+    transport.ack(2, multiple=True)
+    transport.publish("egress", b"out")
+
+    assert [call.args for call in on_message.call_args_list] == [(1, b"1"), (2, b"2")]
+    assert transport.unacked == {}
+    assert list(transport.queues["egress"]) == [b"out"]
+
+
+def test_nack_requeues_at_front():
+    """
+    Test a nacked message is redelivered before the rest of the queue
+    :return: None
+    """
+    transport = InMemoryTransport(prefetch_count=1)
+    transport.put("ingress", b"1")
+    transport.put("ingress", b"2")
+    on_message = Mock()
+    transport.consume("ingress", on_message)
+
+    transport.process_events()
+    transport.nack(1)
+    transport.process_events()
+
+    assert [call.args for call in on_message.call_args_list] == [(1, b"1"), (2, b"1")]
+
+
+def test_prefetch_limits_deliveries():
+    """
+    Test no more than prefetch_count messages are unacked at once
+    :return: None
+    """
+    transport = InMemoryTransport(prefetch_count=2)
+    for body in (b"1", b"2", b"3"):
+        transport.put("ingress", body)
+    on_message = Mock()
+    transport.consume("ingress", on_message)
+
+    transport.process_events()
+
+    assert on_message.call_count == 2  # noqa: PLR2004
+    assert list(transport.queues["ingress"]) == [b"3"]
+
+
+def test_process_events_wakes_for_threadsafe_callback():
+    """
+    Test a callback from another thread wakes a blocked process_events
+    :return: None
+    """
+    transport = InMemoryTransport()
+    callback = Mock()
+    threading.Timer(0.05, transport.call_threadsafe, args=(callback,)).start()
+
+    transport.process_events()
+
+    callback.assert_called_once()
+
+
+def test_call_later_and_close():
+    """
+    Test timers fire once due, and closing returns unacked messages to their queue in order
+    :return: None
+    """
+    transport = InMemoryTransport()
+    timer = Mock()
+    transport.call_later(0.01, timer)
+    transport.put("ingress", b"1")
+    transport.put("ingress", b"2")
+    transport.consume("ingress", Mock())
+    transport.process_events()
+
+    transport.process_events()
+    transport.close()
+
+    timer.assert_called_once()
+    assert list(transport.queues["ingress"]) == [b"1", b"2"]
+
+
+@patch("rundetection.run_detection.write_readiness_probe_file")
+def test_consumer_pipeline_without_broker(mock_write_probe):
+    """
+    Test the whole blocking pipeline runs over the in memory transport, stopping once the ingress queue is drained
+    :param mock_write_probe: Mock readiness probe writer
+    :return: None
+    """
+    transport = InMemoryTransport()
+    nexus_file = "test/test_data/e2e_data/NDXTOSCA/Instrument/data/cycle_19_4/TSC25234.nxs"
+    transport.put("watched-files", nexus_file.encode())
+    transport.put("watched-files", b"not/a/nexus/file.txt")
+    consumer = Consumer(transport, batch_size=1)
+    transport.on_idle(consumer.stop)
+
+    with patch.object(transport, "nack", side_effect=lambda tag: transport.ack(tag)):  # drop, rather than requeue
+        consumer.run()
+
+    published = [json.loads(body) for body in transport.queues["scheduled-jobs"]]
+    assert [request["run_number"] for request in published] == [25234]
+    assert transport.unacked == {}
+    mock_write_probe.assert_called_once()
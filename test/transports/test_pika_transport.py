@@ -0,0 +1,123 @@
+"""
+Tests for the pika transport
+"""
+
+from unittest.mock import MagicMock, Mock, patch
+
+import pytest
+from pika.exceptions import AMQPConnectionError
+
+from rundetection.transports.pika_transport import PikaTransport, Producer, get_channel
+
+
+@patch("rundetection.transports.pika_transport.PlainCredentials")
+@patch("rundetection.transports.pika_transport.ConnectionParameters")
+@patch("rundetection.transports.pika_transport.BlockingConnection")
+def test_get_channel(mock_blocking_connection, mock_connection_parameters, mock_plain_credentials):
+    """Test channel is created and returned"""
+    mock_channel = MagicMock()
+    mock_blocking_connection.return_value.channel.return_value = mock_channel
+
+    exchange_name = "test_exchange"
+    queue_name = "test_queue"
+
+    # Call function
+    channel = get_channel(exchange_name, queue_name)
+
+    # Assert
+    mock_plain_credentials.assert_called_once_with(username="guest", password="guest")  # noqa: S106
+    mock_connection_parameters.assert_called_once_with(
+        "localhost", 5672, credentials=mock_plain_credentials.return_value
+    )
+    mock_blocking_connection.assert_called_once_with(mock_connection_parameters.return_value)
+
+    mock_channel.exchange_declare.assert_called_once_with(exchange_name, exchange_type="direct", durable=True)
+    mock_channel.queue_declare.assert_called_once_with(queue_name, durable=True, arguments={"x-queue-type": "quorum"})
+    mock_channel.queue_bind.assert_called_once_with(queue_name, exchange_name, routing_key="")
+
+    assert channel == mock_channel
+
+
+@patch("rundetection.transports.pika_transport._open_channel")
+def test_producer_reuses_channel_and_declares_once(mock_open_channel):
+    """Test the producer opens one channel and declares the exchange once across many publishes"""
+    channel = mock_open_channel.return_value
+    producer = Producer(pool_size=1)
+
+    producer.publish("scheduled-jobs", b"1")
+    producer.publish("scheduled-jobs", b"2")
+
+    mock_open_channel.assert_called_once()
+    channel.exchange_declare.assert_called_once_with("scheduled-jobs", exchange_type="direct", durable=True)
+    channel.queue_declare.assert_called_once_with("scheduled-jobs", durable=True, arguments={"x-queue-type": "quorum"})
+    channel.basic_publish.assert_any_call("scheduled-jobs", "", b"1")
+    channel.basic_publish.assert_any_call("scheduled-jobs", "", b"2")
+
+
+@patch("rundetection.transports.pika_transport._open_channel")
+def test_producer_reconnects_on_failure(mock_open_channel):
+    """Test the producer reopens the channel and redeclares when a publish fails"""
+    broken_channel = MagicMock()
+    broken_channel.basic_publish.side_effect = AMQPConnectionError
+    new_channel = MagicMock()
+    mock_open_channel.side_effect = [broken_channel, new_channel]
+    producer = Producer(pool_size=1)
+
+    producer.publish("scheduled-jobs", b"1")
+
+    broken_channel.connection.close.assert_called_once()
+    new_channel.exchange_declare.assert_called_once()
+    new_channel.basic_publish.assert_called_once_with("scheduled-jobs", "", b"1")
+
+
+@patch("rundetection.transports.pika_transport._open_channel")
+def test_producer_raises_after_repeated_failure(mock_open_channel):
+    """Test the producer gives up after the retry also fails"""
+    mock_open_channel.return_value.basic_publish.side_effect = AMQPConnectionError
+    producer = Producer(pool_size=1)
+
+    with pytest.raises(AMQPConnectionError):
+        producer.publish("scheduled-jobs", b"1")
+
+    assert mock_open_channel.call_count == 2  # noqa: PLR2004
+
+
+@patch("rundetection.transports.pika_transport._open_channel")
+def test_producer_close(mock_open_channel):
+    """Test closing the producer closes the pooled channel and connection"""
+    channel = mock_open_channel.return_value
+    producer = Producer(pool_size=1)
+    producer.publish("scheduled-jobs", b"1")
+
+    producer.close()
+
+    channel.close.assert_called_once()
+    channel.connection.close.assert_called_once()
+
+
+@patch("rundetection.transports.pika_transport.get_channel")
+def test_pika_transport(mock_get_channel):
+    """Test the transport consumes, acks and schedules on its channel and publishes through its producer"""
+    channel = mock_get_channel.return_value
+    producer = MagicMock()
+    transport = PikaTransport("watched-files", 10, producer=producer)
+    on_message = Mock()
+
+    transport.consume("watched-files", on_message)
+    on_delivery = channel.basic_consume.call_args.args[1]
+    on_delivery(channel, Mock(delivery_tag=4), None, b"body")
+    transport.ack(4, multiple=True)
+    transport.nack(5)
+    transport.publish("scheduled-jobs", b"body")
+    transport.process_events()
+    transport.close()
+
+    mock_get_channel.assert_called_once_with("watched-files", "watched-files")
+    channel.basic_qos.assert_called_once_with(prefetch_count=10)
+    on_message.assert_called_once_with(4, b"body")
+    channel.basic_ack.assert_called_once_with(4, multiple=True)
+    channel.basic_nack.assert_called_once_with(5)
+    producer.publish.assert_called_once_with("scheduled-jobs", b"body")
+    channel.connection.process_data_events.assert_called_once_with(time_limit=None)
+    producer.close.assert_called_once()
+    channel.close.assert_called_once()